@@ -26,17 +26,26 @@ This can be used to do HackInScience exercises without a web browser:
 """
 import argparse
 import getpass
+import os
 from pathlib import Path
 import json
 import configparser
 import sys
 from textwrap import indent
+from urllib.parse import urlencode
 
 import tabulate
 import requests
 from websocket import create_connection
 
-__version__ = "0.2"
+__version__ = "0.3"
+
+API = "https://www.hackinscience.org/api/exercises/"
+CACHE_FILE = (
+    Path(os.environ.get("XDG_CACHE_HOME", "~/.cache")).expanduser()
+    / "hkis"
+    / "exercises.json"
+)
 
 
 def parse_args():
@@ -54,7 +63,9 @@ def parse_args():
 
     check_parser = subparsers.add_parser("check")
     check_parser.set_defaults(func=hkis_check)
-    check_parser.add_argument("exercise_path", type=Path, help="File to check")
+    check_parser.add_argument(
+        "exercise_path", type=Path, nargs="+", help="Files to check"
+    )
 
     args = parser.parse_args()
     if not hasattr(args, "func"):
@@ -81,22 +92,65 @@ def hkis_login(config, session):
         config.write(configfile)
 
 
+def get_exercises(session, **params):
+    """Iterate over exercises, following the pagination."""
+    endpoint = API
+    while endpoint:
+        response = session.get(endpoint, params=params).json()
+        yield from response["results"]
+        endpoint = response.get("next")
+        params = {}  # Already in the next link.
+
+
+def get_index(session):
+    """Ids and titles of all exercises.
+
+    They are cached on disk, each page being revalidated using its ETag,
+    so it costs a few 304 Not Modified responses when nothing changed.
+    """
+    try:
+        cache = json.loads(CACHE_FILE.read_text(encoding="UTF-8"))
+    except (FileNotFoundError, ValueError):
+        cache = {}
+    new_cache = {}
+    exercises = []
+    endpoint = API + "?" + urlencode({"fields": "id,title", "limit": 1000})
+    while endpoint:
+        headers = {}
+        if endpoint in cache:
+            headers["If-None-Match"] = cache[endpoint]["etag"]
+        response = session.get(endpoint, headers=headers)
+        if response.status_code == 304:
+            new_cache[endpoint] = cache[endpoint]
+        else:
+            response.raise_for_status()
+            new_cache[endpoint] = {
+                "etag": response.headers.get("ETag"),
+                "page": response.json(),
+            }
+        exercises.extend(new_cache[endpoint]["page"]["results"])
+        endpoint = new_cache[endpoint]["page"]["next"]
+    CACHE_FILE.parent.mkdir(parents=True, exist_ok=True)
+    CACHE_FILE.write_text(json.dumps(new_cache), encoding="UTF-8")
+    return exercises
+
+
 def hkis_list(config, session):
     table = []
-    exercises = session.get("https://www.hackinscience.org/api/exercises/").json()
-    for exercise in exercises["results"]:
+    for exercise in get_index(session):
         table.append([exercise["title"]])
     print(tabulate.tabulate(table))
 
 
 def find_exercise(session, name):
-    exercises = session.get("https://www.hackinscience.org/api/exercises/").json()
-    for exercise in exercises["results"]:
-        if name == exercise["title"]:
-            full_exercise = session.get(exercise["url"]).json()
-            full_exercise["id"] = full_exercise["url"].split("/")[-2]
-            return full_exercise
-    raise ValueError("Cannot find exercise " + name)
+    index = {exercise["title"]: exercise["id"] for exercise in get_index(session)}
+    if name not in index:
+        raise ValueError("Cannot find exercise " + name)
+    return next(
+        get_exercises(
+            session, ids=index[name], fields="id,slug,title,wording_en,initial_solution"
+        )
+    )
 
 
 def hkis_get(config, session, name):
@@ -115,26 +169,62 @@ def hkis_get(config, session, name):
     )
 
 
+def check_files(to_check, on_progress):
+    """Submit (exercise_id, source_code) pairs over a single websocket,
+    yield (index, correction message) as they are corrected.
+    """
+    ws = create_connection("wss://www.hackinscience.org/ws/answers/")
+    try:
+        pending = {}  # Answers not yet acknowledged by the server.
+        for i, (exercise_id, source_code) in enumerate(to_check):
+            ws.send(json.dumps({"type": "subscribe", "exercise": exercise_id}))
+            ws.send(
+                json.dumps(
+                    {
+                        "type": "answer",
+                        "exercise": exercise_id,
+                        "source_code": source_code,
+                    }
+                )
+            )
+            pending.setdefault((exercise_id, source_code), []).append(i)
+        answers = {}  # Answer id to index in to_check.
+        remaining = len(to_check)
+        while remaining:
+            on_progress()
+            result = json.loads(ws.recv())
+            if result.get("type") != "answer.update":
+                continue  # Checker output, we only show the final result.
+            if result["id"] not in answers:
+                key = (result["exercise"], result["source_code"])
+                if not pending.get(key):
+                    continue  # Sent from another tab.
+                answers[result["id"]] = pending[key].pop(0)
+            if result["is_corrected"]:
+                remaining -= 1
+                yield answers[result["id"]], result["correction_message"]
+    finally:
+        ws.close()
+
+
 def hkis_check(config, session, exercise_path):
     def dot():
         print(".", end="")
         sys.stdout.flush()
 
-    source_code = exercise_path.read_text(encoding="UTF-8")
-    title = source_code.splitlines()[0].lstrip("#").strip()
-    exercise = find_exercise(session, title)
-    endpoint = f"wss://www.hackinscience.org/ws/exercises/{exercise['id']}/"
-    dot()
-    ws = create_connection(endpoint)
+    index = {exercise["title"]: exercise["id"] for exercise in get_index(session)}
+    to_check = []
+    for path in exercise_path:
+        source_code = path.read_text(encoding="UTF-8")
+        title = source_code.splitlines()[0].lstrip("#").strip()
+        if title not in index:
+            raise ValueError("Cannot find exercise " + title)
+        to_check.append((index[title], source_code))
     dot()
-    ws.send(json.dumps({"type": "answer", "source_code": source_code}))
-    while True:
-        dot()
-        result = json.loads(ws.recv())
-        if result["is_corrected"]:
-            print("\n", result["correction_message"])
-            break
-    ws.close()
+    for i, message in check_files(to_check, on_progress=dot):
+        if len(exercise_path) > 1:
+            print("\n", f"{exercise_path[i]}:", sep="")
+        print("\n", message)
 
 
 def main():
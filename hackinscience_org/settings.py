@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/2.0/ref/settings/
 """
 
+import sys
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -191,6 +192,18 @@ CHANNEL_LAYERS = {
     }
 }
 
+# Shared by the web and correction processes: in-flight counters and
+# check durations choosing correction lanes, the correction cache, the
+# stats of the lanes_stats, correction_cache_stats and consumers_stats
+# commands, and exercise navigation invalidation all rely on it (see
+# hkis.checks).
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.redis.RedisCache",
+        "LOCATION": "redis://127.0.0.1:6379/1",
+    }
+}
+
 SECURE_PROXY_SSL_HEADER = ("HTTP_X_FORWARDED_PROTOCOL", "https")
 
 LOCALE_PATHS = [BASE_DIR / "locale"]
@@ -198,6 +211,63 @@ LOCALE_PATHS = [BASE_DIR / "locale"]
 CELERY_BROKER_URL = "redis://localhost:6379/0"
 CELERY_RESULT_BACKEND = CELERY_BROKER_URL
 
+# Number of sandboxes each correction worker process keeps spawned in
+# advance, per language (0 to start a sandbox per answer), and how
+# many answers a sandbox can check before being replaced.
+HKIS_SANDBOX_POOL_SIZE = 2
+HKIS_SANDBOX_MAX_USES = 1
+
+# Set to a duration, in seconds, to replace the checker by a stand-in
+# always accepting answers after this delay, for load tests (see
+# `./manage.py load_test`). Don't use it in production.
+HKIS_STAND_IN_CHECKER = None
+
+# After an edit of its check, an exercise is flagged when its checks
+# get this much costlier (CPU time, wall time, peak RSS), compared over
+# at least HKIS_CHECK_COST_MIN_RUNS checks before and after the edit.
+HKIS_CHECK_COST_REGRESSION_RATIO = 1.5
+HKIS_CHECK_COST_MIN_RUNS = 20
+
+# An answer sent to correction is not sent again while queued, and
+# for up to HKIS_CORRECTION_TIMEOUT seconds once a worker picked it,
+# which should be longer than a check can last.
+HKIS_CORRECTION_TIMEOUT = 120
+
+# Checker output is streamed to the student while checking, by
+# messages sent at most every HKIS_PROGRESS_INTERVAL seconds, up to
+# HKIS_PROGRESS_MAX_SIZE bytes.
+HKIS_PROGRESS_INTERVAL = 0.5
+HKIS_PROGRESS_MAX_SIZE = 16_384
+
+# Correction lanes (see hkis.tasks.LANES): answers of exercises
+# usually checked in less than HKIS_FAST_LANE_MAX_DURATION seconds go
+# to the fast lane, answers of users or teams already having too many
+# answers in the queue go to the overflow lane.
+CELERY_TASK_DEFAULT_QUEUE = "default"
+HKIS_FAST_LANE_MAX_DURATION = 2
+HKIS_MAX_IN_FLIGHT_PER_USER = 2
+HKIS_MAX_IN_FLIGHT_PER_TEAM = 10
+
+# Ran by the bot started with `./manage.py correction_bot --beat`.
+CELERY_BEAT_SCHEDULE = {
+    "rollup-exercise-stats": {
+        "task": "hkis.tasks.rollup_exercise_stats_task",
+        "schedule": 3600,
+        "options": {"queue": "bulk"},
+    },
+}
+# Days counted again by each hourly rollup of the exercise stats, so
+# answers corrected late are counted (see ExerciseDailyStats).
+HKIS_ROLLUP_DAYS = 3
+
+# Answers sent to the correction bot from the admin are split between
+# HKIS_RECORRECTION_CONCURRENCY tasks, saving results by batches.
+HKIS_RECORRECTION_CONCURRENCY = 8
+HKIS_RECORRECTION_BATCH_SIZE = 100
+
+# How long results of deterministic checks are cached.
+HKIS_CORRECTION_CACHE_TIMEOUT = 86_400
+
 GIT_HEAD = "master"  # Changed in production to the current commit hash, can be used for static file invalidation.
 
 DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
@@ -206,3 +276,8 @@ try:
     from .local_settings import *
 except ImportError:
     pass
+
+if sys.argv[1:2] == ["test"]:
+    # Tests run in a single process, without Redis.
+    CACHES = {"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
+    SILENCED_SYSTEM_CHECKS = ["hkis.W001"]
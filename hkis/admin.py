@@ -2,6 +2,9 @@ from django import forms
 from django.db.models import Q
 from django.core.exceptions import FieldError
 from django.contrib import admin
+from django.contrib.admin.views.main import ChangeList
+from django.urls import reverse
+from django.utils.html import format_html, format_html_join
 from django.utils.translation import gettext_lazy as _
 from django_ace import AceWidget
 
@@ -10,11 +13,15 @@ from modeltranslation.admin import TranslationAdmin
 from hkis.models import (
     Answer,
     Category,
+    CorrectionJob,
+    CorrectionTiming,
     Exercise,
+    ExerciseDailyStats,
     Membership,
     Page,
     Team,
     UserInfo,
+    TIMING_BUCKETS,
 )
 
 
@@ -38,6 +45,7 @@ class AdminExerciseForm(forms.ModelForm):
             "slug",
             "pre_check_py",
             "check_py",
+            "check_is_deterministic",
             "is_published",
             "wording",
             "initial_solution",
@@ -102,6 +110,10 @@ class ExerciseAdmin(TranslationAdmin):
         "initial_solution",
         "pre_check_py",
         "check_py",
+        "check_is_deterministic",
+        "check_edited_at",
+        "check_cost_regression",
+        "correction_timings",
     )
     form = AdminExerciseForm
     list_display = (
@@ -110,17 +122,26 @@ class ExerciseAdmin(TranslationAdmin):
         "formatted_position",
         "category",
         "points",
-        "monthly_tries",
-        "monthly_successes",
-        "monthly_success_ratio",
+        "user_days_tried",
+        "user_days_solved",
+        "user_days_success_ratio",
+        "weekly_tries",
+        "quarterly_tries",
+        "check_cost",
         "is_published",
     )
     ordering = ("-is_published", "position")
-    readonly_fields = ("id", "created_at")
+    readonly_fields = (
+        "id",
+        "created_at",
+        "check_edited_at",
+        "check_cost_regression",
+        "correction_timings",
+    )
 
     def get_queryset(self, request):
         """If not superuser, one can only see own exercises."""
-        queryset = super().get_queryset(request).with_monthly_stats()
+        queryset = super().get_queryset(request).with_monthly_stats().with_check_costs()
         if request.user.is_superuser:
             return queryset
         return queryset.filter(author=request.user)
@@ -145,26 +166,99 @@ class ExerciseAdmin(TranslationAdmin):
     def formatted_position(self, obj):  # pylint: disable=no-self-use
         return f"{obj.position:.2f}"
 
-    def monthly_tries(self, obj):  # pylint: disable=no-self-use
+    @admin.display(description="user-days tried (30 days)")
+    def user_days_tried(self, obj):  # pylint: disable=no-self-use
         return (
-            f"{obj.last_month_tries} ({obj.last_month_tries - obj.prev_month_tries:+})"
+            f"{obj.last_month_user_days_tried} "
+            f"({obj.last_month_user_days_tried - obj.prev_month_user_days_tried:+})"
         )
 
-    def monthly_successes(self, obj):  # pylint: disable=no-self-use
+    @admin.display(description="user-days solved (30 days)")
+    def user_days_solved(self, obj):  # pylint: disable=no-self-use
         return (
-            f"{obj.last_month_successes} "
-            f"({obj.last_month_successes - obj.prev_month_successes:+})"
+            f"{obj.last_month_user_days_solved} "
+            f"({obj.last_month_user_days_solved - obj.prev_month_user_days_solved:+})"
         )
 
     def exercise(self, obj):
         return f"{obj.page.slug}/{obj.slug}"
 
-    def monthly_success_ratio(self, obj):  # pylint: disable=no-self-use
+    def get_changelist(self, request, **kwargs):
+        return ExerciseChangeList
+
+    @admin.display(description="user-days tried per week (13 weeks)")
+    def weekly_tries(self, obj):  # pylint: disable=no-self-use
+        return sparkline(getattr(obj, "weekly_tries", []))
+
+    @admin.display(description="user-days tried per quarter (2 years)")
+    def quarterly_tries(self, obj):  # pylint: disable=no-self-use
+        return sparkline(getattr(obj, "quarterly_tries", []))
+
+    @admin.display(description="check cost (30 days)")
+    def check_cost(self, obj):  # pylint: disable=no-self-use
+        if not obj.check_runs:
+            return "ø"
+        cost = (
+            f"{obj.check_cpu_time or 0:.2f}s CPU, {obj.check_wall_time:.2f}s, "
+            f"{(obj.check_max_rss or 0) / 1024:.0f}MiB, "
+            f"{obj.check_timeouts / obj.check_runs:.0%} timeouts"
+        )
+        if obj.check_cost_regression:
+            return format_html(
+                '<span title="Since the last edit: {}">⚠ {}</span>',
+                obj.check_cost_regression,
+                cost,
+            )
+        return cost
+
+    @admin.display(description="Correction timings (last 1000)")
+    def correction_timings(self, obj):  # pylint: disable=no-self-use
+        """Histogram of the time spent in each correction stage."""
+        if obj.pk is None:
+            return "ø"
+        histograms = CorrectionTiming.objects.filter(exercise=obj).histograms()
+        if not any(histograms["total"]["buckets"]):
+            return "ø"
+        columns = [f"≤ {format_duration(bucket)}" for bucket in TIMING_BUCKETS]
+        columns += [f"> {format_duration(TIMING_BUCKETS[-1])}", "p50", "p90"]
+        return format_html(
+            "<table><thead><tr><th>stage</th>{}</tr></thead><tbody>{}</tbody></table>",
+            format_html_join("", "<th>{}</th>", ((column,) for column in columns)),
+            format_html_join(
+                "",
+                "<tr><th>{}</th>{}</tr>",
+                (
+                    (
+                        stage,
+                        format_html_join(
+                            "",
+                            "<td>{}</td>",
+                            (
+                                (cell,)
+                                for cell in histogram["buckets"]
+                                + [
+                                    format_duration(histogram["p50"]),
+                                    format_duration(histogram["p90"]),
+                                ]
+                            ),
+                        ),
+                    )
+                    for stage, histogram in histograms.items()
+                ),
+            ),
+        )
+
+    @admin.display(description="success ratio of user-days (30 days)")
+    def user_days_success_ratio(self, obj):  # pylint: disable=no-self-use
         last_month_ratio = prev_month_ratio = None
-        if obj.last_month_successes:
-            last_month_ratio = obj.last_month_successes / obj.last_month_tries
-        if obj.prev_month_successes:
-            prev_month_ratio = obj.prev_month_successes / obj.prev_month_tries
+        if obj.last_month_user_days_solved:
+            last_month_ratio = (
+                obj.last_month_user_days_solved / obj.last_month_user_days_tried
+            )
+        if obj.prev_month_user_days_solved:
+            prev_month_ratio = (
+                obj.prev_month_user_days_solved / obj.prev_month_user_days_tried
+            )
         if prev_month_ratio is not None and last_month_ratio is not None:
             return (
                 f"{last_month_ratio:.0%} "
@@ -175,6 +269,42 @@ class ExerciseAdmin(TranslationAdmin):
         return "ø"
 
 
+class ExerciseChangeList(ChangeList):
+    def get_results(self, request):
+        """Attach the series of the sparklines to the exercises of the
+        page, using a query per series.
+        """
+        super().get_results(request)
+        ids = [exercise.pk for exercise in self.result_list]
+        weekly = ExerciseDailyStats.objects.series(ids, "week", 13)
+        quarterly = ExerciseDailyStats.objects.series(ids, "quarter", 8)
+        for exercise in self.result_list:
+            exercise.weekly_tries = weekly[exercise.pk]
+            exercise.quarterly_tries = quarterly[exercise.pk]
+
+
+SPARKS = "▁▂▃▄▅▆▇█"
+
+
+def sparkline(values) -> str:
+    if not any(values):
+        return "ø"
+    top = max(values)
+    return format_html(
+        '<span title="{}">{}</span>',
+        ", ".join(str(value) for value in values),
+        "".join(SPARKS[round(value / top * (len(SPARKS) - 1))] for value in values),
+    )
+
+
+def format_duration(seconds) -> str:
+    if seconds is None:
+        return "ø"
+    if seconds < 1:
+        return f"{seconds * 1000:.0f}ms"
+    return f"{seconds:.1f}s"
+
+
 class PageAdmin(TranslationAdmin):
     form = PageForm
     list_display = ("slug", "title")
@@ -198,11 +328,18 @@ class TeamAdmin(admin.ModelAdmin):
 
 
 @admin.action(description="Send to correction bot")
-def send_to_correction_bot(
-    modeladmin, request, queryset
-):  # pylint: disable=unused-argument
-    for answer in queryset:
-        answer.send_to_correction_bot()
+def send_to_correction_bot(modeladmin, request, queryset):
+    job = CorrectionJob.start(
+        list(queryset.values_list("id", flat=True)), user=request.user
+    )
+    modeladmin.message_user(
+        request,
+        format_html(
+            'Sent {} answers to the correction bot, see <a href="{}">progress</a>.',
+            job.total,
+            reverse("admin:hkis_correctionjob_change", args=(job.id,)),
+        ),
+    )
 
 
 class TeamFilter(admin.SimpleListFilter):
@@ -297,10 +434,17 @@ class UserInfoAdmin(admin.ModelAdmin):
     search_fields = ("user__username", "user__teams__name")
 
     def rank(self, obj):  # pylint: disable=no-self-use
-        try:
-            return UserInfo.with_rank.get(pk=obj.pk).rank
-        except UserInfo.DoesNotExist:
+        if obj.rank is None:
             return "(not ranked)"
+        return obj.rank
+
+
+class CorrectionJobAdmin(admin.ModelAdmin):
+    list_display = ("created_at", "created_by", "progress", "finished_at")
+    readonly_fields = ("created_by", "created_at", "finished_at", "total", "done")
+
+    def has_add_permission(self, request):  # pylint: disable=no-self-use
+        return False
 
 
 class CategoryAdmin(TranslationAdmin):
@@ -312,4 +456,5 @@ admin.site.register(Exercise, ExerciseAdmin)
 admin.site.register(UserInfo, UserInfoAdmin)
 admin.site.register(Team, TeamAdmin)
 admin.site.register(Category, CategoryAdmin)
+admin.site.register(CorrectionJob, CorrectionJobAdmin)
 admin.site.register(Page, PageAdmin)
@@ -1,6 +1,14 @@
+import hashlib
+
 from asgiref.sync import async_to_sync
 from channels.layers import get_channel_layer
 from django.contrib.auth.models import Group
+from django.db import transaction
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.dateparse import parse_datetime
+from django.utils.http import http_date, quote_etag
+from django.utils.timezone import is_naive, make_aware
+from django.utils.translation import get_language
 import django_filters
 from rest_framework import (
     viewsets,
@@ -10,8 +18,13 @@ from rest_framework import (
     permissions,
     filters,
 )
+from rest_framework.decorators import action
+from rest_framework.exceptions import NotFound, PermissionDenied
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import replace_query_param
 
 
+from hkis.consumers import answer_message, answers_group
 from hkis.models import Answer, Exercise, User, Category, Page, Team
 
 
@@ -36,6 +49,9 @@ class ExercisePermission(permissions.DjangoModelPermissions):
     def has_permission(self, request, view):
         if request.method in permissions.SAFE_METHODS:
             return True
+        if view.action == "bulk":
+            # Checked per exercise by ExerciseViewSet.bulk.
+            return request.user.is_authenticated
         return super().has_permission(request, view)
 
     def has_object_permission(self, request, view, obj):
@@ -130,6 +146,9 @@ class PublicAnswerSerializer(serializers.HyperlinkedModelSerializer):
 
 
 class ExerciseSerializer(serializers.HyperlinkedModelSerializer):
+    id = serializers.IntegerField(read_only=True)
+    updated_at = serializers.DateTimeField(read_only=True)
+
     class Meta:
         model = Exercise
         fields = "__all__"
@@ -196,18 +215,10 @@ class AnswerViewSet(viewsets.ModelViewSet):
     filterset_class = AnswerFilter
 
     def cb_new_answer(self, instance):  # pylint: disable=no-self-use
-        group = f"answers.{instance.user.id}.{instance.exercise.id}"
         channel_layer = get_channel_layer()
         async_to_sync(channel_layer.group_send)(
-            group,
-            {
-                "type": "correction",
-                "exercise": instance.exercise.id,
-                "correction_message": instance.correction_message,
-                "answer": instance.id,
-                "is_corrected": instance.is_corrected,
-                "is_valid": instance.is_valid,
-            },
+            answers_group(instance.user.id, instance.exercise.id),
+            answer_message(instance),
         )
 
     def get_queryset(self):
@@ -234,37 +245,240 @@ class ExerciseViewSet(viewsets.ModelViewSet):
     permission_classes = [ExercisePermission]
     queryset = Exercise.objects.all()
     serializer_class = ExerciseSerializer
+    list_fields = ("id", "url", "title", "wording", "is_published", "category")
+    # Only given to the exercise author, like the detail view.
+    private_fields = ("pre_check_py", "check_py", "check_is_deterministic")
+    max_limit = 1000
 
     def perform_create(self, serializer):
         serializer.save(author=self.request.user)
 
-    def list(self, request, *args, **kwargs):
-        """Non-paginating copy of super().list, which calls get_serializer
-        once per item.
+    @action(detail=False, methods=["post"])
+    def bulk(self, request):
+        """Create or update many exercises, in a single transaction.
+
+        Takes a list of exercises: those with an id are updated (like
+        a PUT), the others are created (like a POST). Nothing is saved
+        unless all of them are valid.
         """
-        queryset = list(self.filter_queryset(self.get_queryset()))
+        if not isinstance(request.data, list):
+            raise serializers.ValidationError("Expected a list of exercises.")
+        if len(request.data) > self.max_limit:
+            raise serializers.ValidationError(
+                f"Can't save more than {self.max_limit} exercises at once."
+            )
+        instances = Exercise.objects.in_bulk(
+            [self._get_bulk_id(item) for item in request.data]
+        )
+        to_save = [self._get_bulk_serializer(item, instances) for item in request.data]
+        if not all([serializer.is_valid() for serializer in to_save]):
+            return response.Response(
+                [serializer.errors for serializer in to_save], status=400
+            )
+        with transaction.atomic():
+            for serializer in to_save:
+                if serializer.instance is None:
+                    serializer.save(author=request.user)
+                else:
+                    serializer.save()
         return response.Response(
-            {
-                "count": len(queryset),
-                "results": [self._get_serializer_for(item).data for item in queryset],
-            }
+            [
+                ExerciseSerializer(
+                    serializer.instance,
+                    context=self.get_serializer_context(),
+                    fields=("id", "url", "updated_at"),
+                ).data
+                for serializer in to_save
+            ]
         )
 
-    def _get_serializer_for(self, instance):
-        """Only used by list, so we can specialize serializer per
-        instance. This is so exercises owner can see / edit their
-        check.
+    def _get_bulk_id(self, item):  # pylint: disable=no-self-use
+        if not isinstance(item, dict):
+            raise serializers.ValidationError("Expected a list of exercises.")
+        try:
+            return int(item.get("id") or 0)
+        except (TypeError, ValueError) as err:
+            raise serializers.ValidationError("Expected integer ids.") from err
+
+    def _get_bulk_serializer(self, item, instances):
+        """Serializer to create or update an exercise, if allowed to."""
+        instance = None
+        if self._get_bulk_id(item):
+            instance = instances.get(self._get_bulk_id(item))
+            if instance is None:
+                raise NotFound(f"No exercise with id {item['id']}.")
+            self.check_object_permissions(self.request, instance)
+        elif not self.request.user.has_perm("hkis.add_exercise"):
+            raise PermissionDenied()
+        return ExerciseSerializer(
+            instance, data=item, context=self.get_serializer_context()
+        )
+
+    def list(self, request, *args, **kwargs):
+        """Keyset paginated list, ordered by id.
+
+        Query parameters:
+        - after: only give exercises with an id greater than this one,
+          the `next` link is built using it.
+        - limit: page size, up to max_limit.
+        - ids: comma separated ids of the exercises to fetch.
+        - modified_since: only give exercises modified after this
+          ISO 8601 datetime.
+        - fields: comma separated fields to give, defaults to
+          list_fields, or all fields for exercises one is the author of.
+          The private_fields are only given to authors.
+
+        The response gives the `count` of exercises matching the
+        filters (all pages included), the `results`, and the `next`
+        link, and has an ETag so clients can revalidate a page cheaply.
         """
-        if self.action == "list":
-            return ExerciseSerializer(
-                instance,
-                context=self.get_serializer_context(),
-                fields=("url", "title", "wording", "is_published", "category"),
+        after = self._get_int_param("after", default=0)
+        limit = min(
+            self._get_int_param("limit", default=api_settings.PAGE_SIZE, minimum=1),
+            self.max_limit,
+        )
+        queryset = self.filter_queryset(self.get_queryset())
+        if "ids" in request.query_params:
+            ids = self._get_ids_param()
+            queryset = queryset.filter(id__in=ids)
+        if "modified_since" in request.query_params:
+            queryset = queryset.filter(updated_at__gt=self._get_datetime_param())
+        count = queryset.count()
+        page = list(queryset.filter(id__gt=after).order_by("id")[: limit + 1])
+        has_next = len(page) > limit
+        page = page[:limit]
+        next_url = None
+        if has_next:
+            next_url = replace_query_param(
+                request.build_absolute_uri(), "after", page[-1].id
             )
-        return ExerciseSerializer(
-            instance,
-            context=self.get_serializer_context(),
+        return self._conditional_response(
+            self._etag(page, request.get_full_path(), count),
+            lambda: response.Response(
+                {
+                    "count": count,
+                    "results": self._serialize_list(page),
+                    "next": next_url,
+                }
+            ),
+        )
+
+    def retrieve(self, request, *args, **kwargs):
+        exercise = self.get_object()
+        return self._conditional_response(
+            self._etag([exercise]),
+            lambda: response.Response(self.get_serializer(exercise).data),
+            last_modified=exercise.updated_at,
+        )
+
+    def _etag(self, exercises, *extra):
+        """Changes when the exercises, or fields updated without touching
+        updated_at (position, solved_by), or the viewer's rights, or the
+        language (wordings are translated) change.
+        """
+        user = self.request.user
+        viewer = "*" if user.is_superuser else user.id
+        version = repr(
+            (
+                viewer,
+                get_language(),
+                extra,
+                [
+                    (
+                        exercise.id,
+                        exercise.updated_at,
+                        exercise.position,
+                        exercise.solved_by,
+                    )
+                    for exercise in exercises
+                ],
+            )
+        )
+        return quote_etag(hashlib.sha256(version.encode()).hexdigest())
+
+    def _conditional_response(self, etag, get_response, last_modified=None):
+        """Reply 304 Not Modified if the client already has the content,
+        else call get_response.
+        """
+        timestamp = int(last_modified.timestamp()) if last_modified else None
+        conditional = get_conditional_response(
+            self.request, etag=etag, last_modified=timestamp
         )
+        if conditional is None:
+            conditional = get_response()
+        conditional["ETag"] = etag
+        patch_vary_headers(conditional, ["Accept-Language"])
+        if timestamp is not None:
+            conditional["Last-Modified"] = http_date(timestamp)
+        return conditional
+
+    def _get_int_param(self, name, default, minimum=0):
+        try:
+            value = int(self.request.query_params.get(name, default))
+        except ValueError as err:
+            raise serializers.ValidationError({name: "Expected an integer."}) from err
+        if value < minimum:
+            raise serializers.ValidationError(
+                {name: f"Expected an integer greater than or equal to {minimum}."}
+            )
+        return value
+
+    def _get_datetime_param(self):
+        try:
+            value = parse_datetime(self.request.query_params["modified_since"])
+        except ValueError:
+            value = None
+        if value is None:
+            raise serializers.ValidationError(
+                {"modified_since": "Expected an ISO 8601 datetime."}
+            )
+        if is_naive(value):
+            value = make_aware(value)
+        return value
+
+    def _get_ids_param(self):
+        try:
+            ids = {
+                int(exercise_id)
+                for exercise_id in self.request.query_params["ids"].split(",")
+                if exercise_id
+            }
+        except ValueError as err:
+            raise serializers.ValidationError(
+                {"ids": "Expected comma separated integers."}
+            ) from err
+        if len(ids) > self.max_limit:
+            raise serializers.ValidationError(
+                {"ids": f"Can't fetch more than {self.max_limit} exercises at once."}
+            )
+        return ids
+
+    def _serialize_list(self, page):
+        """Serialize a page one exercise at a time, using only two
+        serializers: one for exercises the user is the author of, one
+        for the others.
+        """
+        user = self.request.user
+        context = self.get_serializer_context()
+        fields = self.request.query_params.get("fields")
+        if fields:
+            selected = set(fields.split(","))
+            summary = ExerciseSerializer(
+                context=context, fields=selected - set(self.private_fields)
+            )
+            full = ExerciseSerializer(context=context, fields=selected)
+        else:
+            summary = ExerciseSerializer(context=context, fields=self.list_fields)
+            full = ExerciseSerializer(context=context)
+        results = []
+        for exercise in page:
+            serializer = summary
+            if user.is_superuser or (
+                user.is_authenticated and exercise.author_id == user.id
+            ):
+                serializer = full
+            results.append(serializer.to_representation(exercise))
+        return results
 
 
 class CanViewAnswer(permissions.DjangoModelPermissions):
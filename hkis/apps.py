@@ -3,3 +3,8 @@ from django.apps import AppConfig
 
 class WebsiteConfig(AppConfig):
     name = "hkis"
+
+    def ready(self):
+        # Registers the system checks.
+        # pylint: disable=import-outside-toplevel,unused-import
+        from hkis import checks  # noqa: F401
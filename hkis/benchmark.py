@@ -0,0 +1,243 @@
+"""Synthetic dataset and query budgets for the hot views.
+
+`./manage.py seed_benchmark` fills a database with a realistic amount
+of users, exercises and answers, then `./manage.py benchmark_views`
+measures the hot views against it, failing if one of them runs more
+queries than its budget in query_budgets.json.
+
+The same budgets are checked by the test suite (test_query_budget.py)
+against a tiny dataset: a view doing a query per row would need a
+budget depending on the dataset size, so it gets caught either way.
+"""
+
+import io
+import json
+import random
+import time
+from pathlib import Path
+from typing import Dict, List, NamedTuple
+
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.db import connection, models, transaction
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from hkis.models import (
+    Answer,
+    Category,
+    Exercise,
+    ExerciseStatus,
+    Membership,
+    Page,
+    Team,
+    UserInfo,
+)
+
+BUDGETS_FILE = Path(__file__).parent / "query_budgets.json"
+PREFIX = "bench"
+
+
+class Measure(NamedTuple):
+    status_code: int
+    queries: int
+    seconds: float
+
+
+def _batches(iterable, size):
+    batch = []
+    for item in iterable:
+        batch.append(item)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def seed(  # pylint: disable=too-many-arguments,too-many-locals
+    users=10_000,
+    exercises=500,
+    answers=1_000_000,
+    teams=100,
+    batch_size=10_000,
+    log=print,
+):
+    """Create a synthetic dataset, usernames, slugs and names all
+    starting with PREFIX, so it can live near real data.
+
+    The first user is staff of the first team, and solved the first
+    exercise, so every hot view has something to display for them.
+    """
+    rng = random.Random(42)
+    with transaction.atomic():
+        page, _ = Page.objects.get_or_create(
+            slug=PREFIX, defaults={"title": "Benchmark", "in_menu": True}
+        )
+        categories = Category.objects.bulk_create(
+            Category(title=f"{PREFIX} {i}", slug=f"{PREFIX}-{i}", position=i)
+            for i in range(10)
+        )
+        log(f"Creating {users} users...")
+        for batch in _batches(
+            (
+                User(username=f"{PREFIX}-{i}", password="!")
+                for i in range(users)  # "!" is an unusable password.
+            ),
+            batch_size,
+        ):
+            User.objects.bulk_create(batch)
+        user_ids = list(
+            User.objects.filter(username__startswith=f"{PREFIX}-")
+            .order_by("id")
+            .values_list("id", flat=True)
+        )
+        UserInfo.objects.bulk_create(
+            (UserInfo(user_id=user_id) for user_id in user_ids),
+            batch_size=batch_size,
+        )
+        log(f"Creating {exercises} exercises...")
+        Exercise.objects.bulk_create(
+            Exercise(
+                title=f"{PREFIX} {i}",
+                title_en=f"{PREFIX} {i}",
+                slug=f"{PREFIX}-{i}",
+                page=page,
+                category=categories[i * len(categories) // exercises],
+                is_published=True,
+                position=i,
+                check_py="import sys\nsys.exit(0)\n",
+                wording=f"Print `{i}`.\n\n## Advice\n\nUse `print`.",
+                wording_en=f"Print `{i}`.\n\n## Advice\n\nUse `print`.",
+            )
+            for i in range(exercises)
+        )
+        exercise_ids = list(
+            Exercise.objects.filter(page=page)
+            .order_by("id")
+            .values_list("id", flat=True)
+        )
+        log(f"Creating {answers} answers...")
+        first_answer = Answer(
+            user_id=user_ids[0],
+            exercise_id=exercise_ids[0],
+            source_code="print(0)",
+            is_corrected=True,
+            is_valid=True,
+            is_shared=True,
+            correction_message="Well done!",
+        )
+        for batch in _batches(
+            (
+                Answer(
+                    user_id=rng.choice(user_ids),
+                    exercise_id=rng.choice(exercise_ids),
+                    source_code=f"print({i})",
+                    is_corrected=True,
+                    is_valid=rng.random() < 0.6,
+                    is_shared=rng.random() < 0.1,
+                    correction_message="Well done!",
+                )
+                for i in range(answers - 1)
+            ),
+            batch_size,
+        ):
+            Answer.objects.bulk_create(batch)
+        first_answer.save()
+        log("Creating statuses...")
+        statuses = (
+            Answer.objects.filter(exercise_id__in=exercise_ids)
+            .values("user_id", "exercise_id")
+            .annotate(
+                attempts=models.Count("id"),
+                last_answer_id=models.Max("id"),
+                first_solved_at=models.Min(
+                    "created_at", filter=models.Q(is_valid=True)
+                ),
+            )
+            .order_by()
+        )
+        ExerciseStatus.objects.bulk_create(
+            (
+                ExerciseStatus(solved=status["first_solved_at"] is not None, **status)
+                for status in statuses.iterator()
+            ),
+            batch_size=batch_size,
+            ignore_conflicts=True,  # The first user's first answer made one.
+        )
+        log(f"Creating {teams} teams...")
+        Team.objects.bulk_create(
+            Team(name=f"{PREFIX}-{i}", slug=f"{PREFIX}-{i}") for i in range(teams)
+        )
+        team_ids = list(
+            Team.objects.filter(name__startswith=f"{PREFIX}-")
+            .order_by("id")
+            .values_list("id", flat=True)
+        )
+        Membership.objects.bulk_create(
+            (
+                Membership(
+                    user_id=user_id,
+                    team_id=team_ids[i % len(team_ids)],
+                    role=Membership.Role.STAFF
+                    if i < len(team_ids)
+                    else Membership.Role.MEMBER,
+                )
+                for i, user_id in enumerate(user_ids)
+            ),
+            batch_size=batch_size,
+        )
+    log("Computing stats...")
+    call_command("recompute_stats", stdout=io.StringIO())
+
+
+def hot_urls() -> Dict[str, str]:
+    """URLs of the hot views, as seen by the first seeded user."""
+    exercise = Exercise.objects.get(slug=f"{PREFIX}-0")
+    user = User.objects.get(username=f"{PREFIX}-0")
+    return {
+        "leaderboard": reverse("leaderboard"),
+        "page": reverse("page", args=[PREFIX]),
+        "exercise": reverse("exercise", args=[PREFIX, exercise.slug]),
+        "solutions": reverse("solutions", args=[PREFIX, exercise.slug]),
+        "team": reverse("team", args=[f"{PREFIX}-0"]),
+        "team_stats": reverse("team_stats", args=[f"{PREFIX}-0"]),
+        "profile": reverse("profile", args=[user.id]),
+        "api_exercises": "/api/exercises/",
+        "api_answers": "/api/answers/",
+    }
+
+
+def measure(client, url) -> Measure:
+    with CaptureQueriesContext(connection) as queries:
+        before = time.perf_counter()
+        response = client.get(url)
+        if response.streaming:
+            b"".join(response.streaming_content)
+        elapsed = time.perf_counter() - before
+    return Measure(response.status_code, len(queries), elapsed)
+
+
+def measure_all(client) -> Dict[str, Measure]:
+    """Measure each hot view as the first seeded user, warm (so
+    per-process caches, like the navigation index, are filled).
+    """
+    client.force_login(User.objects.get(username=f"{PREFIX}-0"))
+    results = {}
+    for name, url in hot_urls().items():
+        measure(client, url)
+        results[name] = measure(client, url)
+    return results
+
+
+def load_budgets() -> Dict[str, int]:
+    return json.loads(BUDGETS_FILE.read_text(encoding="UTF-8"))
+
+
+def over_budget(results: Dict[str, Measure], budgets: Dict[str, int]) -> List[str]:
+    """Describe views running more queries than their budget."""
+    return [
+        f"{name}: {result.queries} queries, budget is {budgets[name]}"
+        for name, result in results.items()
+        if result.queries > budgets.get(name, 0)
+    ]
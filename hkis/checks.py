@@ -0,0 +1,29 @@
+from django.conf import settings
+from django.core.checks import Warning as CheckWarning, register
+
+# Caches only seen by the process using them.
+PROCESS_LOCAL_CACHES = (
+    "django.core.cache.backends.locmem.LocMemCache",
+    "django.core.cache.backends.dummy.DummyCache",
+)
+
+
+@register()
+def check_shared_cache(**kwargs):  # pylint: disable=unused-argument
+    """Correction lanes, the correction cache, stats commands, and
+    navigation invalidation need a cache shared by all processes.
+    """
+    backend = settings.CACHES.get("default", {}).get("BACKEND")
+    if backend not in PROCESS_LOCAL_CACHES:
+        return []
+    return [
+        CheckWarning(
+            f"The default cache ({backend}) is not shared between processes.",
+            hint=(
+                "Web and correction processes count answers in flight, share "
+                "check durations, cached corrections, and stats through it: "
+                "use a Redis cache, see CACHES in hackinscience_org/settings.py."
+            ),
+            id="hkis.W001",
+        )
+    ]
@@ -1,15 +1,19 @@
 import asyncio
 import json
 import logging
-from typing import Optional
+import os
+import socket
+import sys
+from typing import Dict, List, Optional, Set
+from uuid import uuid4
+from weakref import WeakSet
 
 from channels.db import database_sync_to_async
 from channels.generic.websocket import AsyncJsonWebsocketConsumer
-from django.utils.timezone import now
+from django.core.cache import cache
 
-from hkis.tasks import check_answer
-from hkis.models import Answer, Exercise, User, UserInfo
-from hkis.utils import markdown_to_bootstrap
+from hkis.tasks import send_to_correction, span
+from hkis.models import Answer, Exercise, Team
 from hkis.serializers import AnswerSerializer
 
 logger = logging.getLogger(__name__)
@@ -20,6 +24,8 @@ logger = logging.getLogger(__name__)
 # - Group can group together multiple scopes, usefull to send a
 #   message to all browser tabs of a given user at once for example.
 
+CONSUMERS_PREFIX = "hkis:consumers:"
+
 
 @database_sync_to_async
 def db_flag_as_unhelpfull(user_id: int, answer_id: int):
@@ -34,64 +40,45 @@ def db_flag_as_unhelpfull(user_id: int, answer_id: int):
 
 @database_sync_to_async
 def db_create_answer(exercise_id: int, user_id: int, source_code):
-    answer = Exercise.objects.get(pk=exercise_id).answers.create(
-        source_code=source_code, user_id=user_id
+    return Answer.objects.create(
+        exercise_id=exercise_id, source_code=source_code, user_id=user_id
     )
-    return answer
 
 
 @database_sync_to_async
-def db_get_exercise(exercise_id: int) -> Exercise:
-    return Exercise.objects.get(id=exercise_id)
+def db_exercise_exists(exercise_id: int) -> bool:
+    return Exercise.objects.filter(id=exercise_id).exists()
 
 
 @database_sync_to_async
-def db_find_uncorrected(answer_id: int, user: User) -> Optional[dict]:
+def db_get_answer(answer_id: int, user) -> Optional[Answer]:
     try:
-        answer = Answer.objects.get(id=answer_id, user=user, is_corrected=False)
-        return {
-            "check_py": answer.exercise.check_py,
-            "pre_check_py": answer.exercise.pre_check_py,
-            "source_code": answer.source_code,
-            "id": answer.id,
-        }
+        answer = Answer.objects.select_related("exercise", "user").get(
+            id=answer_id, user=user
+        )
     except Answer.DoesNotExist:
         return None
+    if answer.render_correction_message():
+        answer.save(update_fields=["correction_message_html"])
+    return answer
 
 
 @database_sync_to_async
-def db_update_answer(answer_id: int, is_valid: bool, correction_message: str):
-    answer = Answer.objects.get(id=answer_id)
-    answer.correction_message = correction_message
-    answer.is_corrected = True
-    answer.is_valid = is_valid
-    answer.corrected_at = now()
-    answer.save()
-    rank = None
-    if answer.is_valid and answer.user_id:
-        exercise = answer.exercise
-        exercise.solved_by += 1
-        exercise.save()
-        userinfo, _ = UserInfo.objects.get_or_create(user=answer.user)
-        userinfo.recompute_points()
-        userinfo.save()
-        try:
-            rank = UserInfo.with_rank.get(user=userinfo.user).rank
-        except UserInfo.DoesNotExist:
-            rank = None
-            # In case of show_in_leaderboard=False
-        for team in answer.user.teams.all():
-            team.recompute_rank()
-    return answer, rank
+def db_get_team_ids(user_id: int) -> List[int]:
+    return list(
+        Team.objects.filter(membership__user_id=user_id).values_list("id", flat=True)
+    )
+
+
+def answers_group(user_id: int, exercise_id: int) -> str:
+    """Group of all the tabs of a user on an exercise."""
+    return f"answers.{user_id}.{exercise_id}"
 
 
-def answer_message(answer: Answer, rank: int = None) -> dict:
+def answer_message(answer: Answer, rank: Optional[int] = None) -> dict:
     message = AnswerSerializer(answer).data
     if rank:
         message["user_rank"] = rank
-    message["correction_message_html"] = markdown_to_bootstrap(
-        message["correction_message"]
-    )
     message["type"] = "answer.update"
     return message
 
@@ -102,26 +89,131 @@ def log(message, *args):
     logger.info("WebSocket %s", message)
 
 
-class ExerciseConsumer(AsyncJsonWebsocketConsumer):
+_consumers: "WeakSet[AnswersConsumer]" = WeakSet()
+
+# Each process publishes its stats every CONSUMERS_STATS_INTERVAL
+# seconds, in the first free of CONSUMERS_SLOTS cache keys, which
+# expire unless refreshed, so dead processes vanish by themselves.
+CONSUMERS_SLOTS = 256
+CONSUMERS_STATS_INTERVAL = 10
+_slot: Optional[int] = None
+_publisher: "Optional[asyncio.Task[None]]" = None
+
+
+def slot_key(slot: int) -> str:
+    return f"{CONSUMERS_PREFIX}slot:{slot}"
+
+
+def footprint(consumer) -> int:
+    """Approximate (shallow) memory used by a consumer, in bytes."""
+    attributes = vars(consumer)
+    return sys.getsizeof(consumer) + sum(
+        sys.getsizeof(value) for value in (attributes, *attributes.values())
+    )
+
+
+def consumers_stats() -> Dict[str, Dict[str, int]]:
+    """Connections, groups and memory footprint of the consumers of
+    this process, per consumer class.
+    """
+    stats: Dict[str, Dict[str, int]] = {}
+    for consumer in _consumers:
+        class_stats = stats.setdefault(
+            type(consumer).__name__, {"connections": 0, "groups": 0, "bytes": 0}
+        )
+        class_stats["connections"] += 1
+        class_stats["groups"] += len(consumer.followed)
+        class_stats["bytes"] += footprint(consumer)
+    return stats
+
+
+async def publish_consumers_stats():
+    """Publish the stats of this process, for the consumers_stats command."""
+    global _slot  # pylint: disable=global-statement
+    value = {
+        "process": f"{socket.gethostname()}:{os.getpid()}",
+        "stats": consumers_stats(),
+    }
+    timeout = 3 * CONSUMERS_STATS_INTERVAL
+    if _slot is not None and await cache.atouch(slot_key(_slot), timeout):
+        await cache.aset(slot_key(_slot), value, timeout)
+        return
+    _slot = None  # Expired, maybe taken by another process since.
+    for slot in range(CONSUMERS_SLOTS):
+        if await cache.aadd(slot_key(slot), value, timeout):
+            _slot = slot
+            return
+
+
+async def publish_consumers_stats_periodically():
+    while True:
+        await publish_consumers_stats()
+        await asyncio.sleep(CONSUMERS_STATS_INTERVAL)
+
+
+def start_publishing_consumers_stats():
+    """Start publishing stats, once per event loop."""
+    global _publisher  # pylint: disable=global-statement
+    loop = asyncio.get_running_loop()
+    if _publisher is None or _publisher.done() or _publisher.get_loop() is not loop:
+        _publisher = loop.create_task(publish_consumers_stats_periodically())
+
+
+def published_consumers_stats() -> List[dict]:
+    """Stats published by all processes (see publish_consumers_stats)."""
+    published = cache.get_many([slot_key(slot) for slot in range(CONSUMERS_SLOTS)])
+    return sorted(published.values(), key=lambda value: value["process"])
+
+
+class AnswersConsumer(AsyncJsonWebsocketConsumer):
+    """Receive answers, send back their corrections.
+
+    Subclasses tell which exercise a message is about.
+    """
+
     def __init__(self, *args, **kwargs):
         self.settings = {}
-        self.exercise: Optional[Exercise] = None
+        # Exercise id to the group we joined to follow answers on it.
+        self.followed: Dict[int, str] = {}
+        self.team_ids: List[int] = []
+        # Nobody else can follow anonymous answers.
+        self.anonymous_group = f"answers.anonymous.{uuid4().hex}"
         super().__init__(*args, **kwargs)
 
+    def get_exercise_id(self, content) -> int:
+        raise NotImplementedError
+
     async def connect(self):
         log("connect")
-        self.exercise = await db_get_exercise(
-            self.scope["url_route"]["kwargs"]["exercise_id"]
-        )
+        if self.scope["user"].is_authenticated:
+            self.team_ids = await db_get_team_ids(self.scope["user"].id)
         log("accept")
         await self.accept()
+        _consumers.add(self)
+        start_publishing_consumers_stats()
 
     async def disconnect(self, code):
         logger.info("WebSocket disconnect (code=%s)", code)
+        for group in set(self.followed.values()):
+            await self.channel_layer.group_discard(group, self.channel_name)
+        _consumers.discard(self)
+
+    async def join(self, exercise_id: int) -> str:
+        """Follow answers on an exercise, return the group name."""
+        if exercise_id not in self.followed:
+            if self.scope["user"].is_authenticated:
+                group = answers_group(self.scope["user"].id, exercise_id)
+            else:
+                group = self.anonymous_group
+            await self.channel_layer.group_add(group, self.channel_name)
+            self.followed[exercise_id] = group
+        return self.followed[exercise_id]
 
     async def receive_json(self, content, **kwargs):
         if content["type"] == "answer":
-            asyncio.create_task(self.answer(content["source_code"]))
+            asyncio.create_task(
+                self.answer(self.get_exercise_id(content), content["source_code"])
+            )
         elif content["type"] == "is_unhelpfull":
             asyncio.create_task(self.flag_as_unhelpfull(content["answer_id"]))
         elif content["type"] == "recorrect":
@@ -131,6 +223,14 @@ class ExerciseConsumer(AsyncJsonWebsocketConsumer):
         else:
             log("Unknown message received", json.dumps(content))
 
+    async def answer_update(self, event):
+        """Sent to the group by the correction workers and the API."""
+        await self.send_json(event)
+
+    async def answer_progress(self, event):
+        """Checker output, sent by the workers while checking."""
+        await self.send_json(event)
+
     async def flag_as_unhelpfull(self, answer_id: str):
         try:
             answer_id_int = int(answer_id)
@@ -141,38 +241,102 @@ class ExerciseConsumer(AsyncJsonWebsocketConsumer):
             await self.send_json(answer_message(answer))
 
     async def recorrect(self, answer):
-        log("Restarting correction for an answer")
-        uncorrected = await db_find_uncorrected(answer["id"], self.scope["user"])
-        if not uncorrected:
+        answer = await db_get_answer(answer["id"], self.scope["user"])
+        if not answer:
             return
-        log("Send answer to moulinette")
-        is_valid, message = await check_answer(
-            {
-                "check": uncorrected["check_py"],
-                "pre_check": uncorrected["pre_check_py"],
-                "source_code": uncorrected["source_code"],
-                "language": self.settings.get("LANGUAGE_CODE", "en"),
-            }
-        )
-        log("Got result from moulinette")
-        answer, rank = await db_update_answer(uncorrected["id"], is_valid, message)
-        await self.send_json(answer_message(answer, rank))
+        if answer.is_corrected:
+            log("Answer corrected while disconnected")
+            await self.send_json(answer_message(answer))
+            return
+        log("Restarting correction for an answer")
+        await self.send_to_moulinette(answer)
 
-    async def answer(self, source_code):
+    async def answer(self, exercise_id: int, source_code):
         log("Receive answer from browser")
-        answer = await db_create_answer(
-            self.exercise.id, self.scope["user"].id, source_code
-        )
+        spans: Dict[str, float] = {}
+        with span(spans, "create"):
+            answer = await db_create_answer(
+                exercise_id, self.scope["user"].id, source_code
+            )
         await self.send_json(answer_message(answer))
-        log("Send answer to moulinette")
-        is_valid, message = await check_answer(
-            {
-                "check": answer.exercise.check_py,
-                "pre_check": answer.exercise.pre_check_py,
-                "source_code": source_code,
-                "language": self.settings.get("LANGUAGE_CODE", "en"),
-            }
-        )
-        log("Got result from moulinette")
-        answer, rank = await db_update_answer(answer.id, is_valid, message)
-        await self.send_json(answer_message(answer, rank))
+        await self.send_to_moulinette(answer, spans)
+
+    async def send_to_moulinette(self, answer: Answer, spans=None):
+        if await send_to_correction(
+            answer.id,
+            answer.exercise_id,
+            self.settings.get("LANGUAGE_CODE", "en"),
+            await self.join(answer.exercise_id),
+            answer.user_id,
+            self.team_ids,
+            spans,
+        ):
+            log("Sent answer to moulinette")
+        else:
+            log("Answer already in moulinette")
+
+
+class ExerciseConsumer(AnswersConsumer):
+    """One websocket per exercise, given in the URL."""
+
+    def __init__(self, *args, **kwargs):
+        self.exercise_id: Optional[int] = None
+        super().__init__(*args, **kwargs)
+
+    def get_exercise_id(self, content) -> int:
+        assert self.exercise_id
+        return self.exercise_id
+
+    async def connect(self):
+        exercise_id = int(self.scope["url_route"]["kwargs"]["exercise_id"])
+        if not await db_exercise_exists(exercise_id):
+            await self.close()
+            return
+        self.exercise_id = exercise_id
+        await self.join(exercise_id)
+        await super().connect()
+
+
+class MultiplexConsumer(AnswersConsumer):
+    """A single websocket for all exercises, messages giving the
+    exercise they're about (only needed for "answer" and "subscribe").
+    """
+
+    def __init__(self, *args, **kwargs):
+        self.known_exercises: Set[int] = set()
+        super().__init__(*args, **kwargs)
+
+    def get_exercise_id(self, content) -> int:
+        exercise_id = content.get("exercise")
+        if exercise_id not in self.known_exercises:
+            raise ValueError(f"Not subscribed to exercise {exercise_id}.")
+        return exercise_id
+
+    async def receive_json(self, content, **kwargs):
+        if content.get("type") == "subscribe":
+            await self.subscribe(content.get("exercise"))
+            return
+        try:
+            await super().receive_json(content, **kwargs)
+        except ValueError as err:
+            await self.send_json({"type": "error", "message": str(err)})
+
+    async def subscribe(self, exercise_id):
+        """Follow answers on an exercise, even from other tabs."""
+        try:
+            exercise_id = int(exercise_id)
+        except (TypeError, ValueError):
+            await self.send_json(
+                {"type": "error", "message": f"Invalid exercise {exercise_id!r}."}
+            )
+            return
+        if exercise_id in self.known_exercises:
+            return
+        if not await db_exercise_exists(exercise_id):
+            await self.send_json(
+                {"type": "error", "message": f"No exercise {exercise_id}."}
+            )
+            return
+        self.known_exercises.add(exercise_id)
+        await self.join(exercise_id)
+        await self.send_json({"type": "subscribed", "exercise": exercise_id})
@@ -0,0 +1,368 @@
+"""Load test of the websocket correction path.
+
+`./manage.py load_test` opens N websockets on `ws/exercises/<id>/`,
+sends answers at a given rate, and measures the time from sending an
+answer to receiving its correction.
+
+By default everything runs in this process: the consumers (as Daphne
+would run them), an in-memory channel layer, an in-memory "broker"
+handing corrections to a given number of worker threads (as Celery
+would), and a stand-in checker (see HKIS_STAND_IN_CHECKER), so no
+Redis, no Celery, and no firejail are needed. As answers are really
+stored, use a throwaway database.
+
+With --url, it connects to a running Daphne instead, to measure the
+real thing (run its bots with HKIS_STAND_IN_CHECKER to leave firejail
+out), anonymously.
+"""
+
+import asyncio
+import base64
+import bisect
+import itertools
+import json
+import os
+import statistics
+import struct
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional
+from unittest import mock
+from urllib.parse import urlparse
+
+from asgiref.sync import sync_to_async
+from channels.routing import URLRouter
+from channels.testing import WebsocketCommunicator
+from django.contrib.auth.models import AnonymousUser, User
+from django.test.utils import override_settings
+
+from hkis.benchmark import PREFIX
+from hkis.routing import websocket_urlpatterns
+from hkis.tasks import correct_answer_task
+
+BUCKETS_MS = (10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+IN_MEMORY_CHANNEL_LAYERS = {
+    "default": {"BACKEND": "channels.layers.InMemoryChannelLayer"}
+}
+# Everything runs in this process, so it can use a process-local cache.
+IN_MEMORY_CACHES = {
+    "default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}
+}
+
+
+class Histogram:
+    """Latencies, in seconds, and how many answers never got corrected."""
+
+    def __init__(self):
+        self.latencies: List[float] = []
+        self.timeouts = 0
+        self.skipped = 0  # Answers not sent, all connections being busy.
+
+    def add(self, seconds: float):
+        self.latencies.append(seconds)
+
+    def percentile(self, percent: int) -> float:
+        if len(self.latencies) < 2:
+            return self.latencies[0] if self.latencies else 0
+        return statistics.quantiles(self.latencies, n=100, method="inclusive")[
+            percent - 1
+        ]
+
+    def buckets(self) -> List[int]:
+        """Count of latencies under each of BUCKETS_MS, the last
+        one counting those above all of them.
+        """
+        counts = [0] * (len(BUCKETS_MS) + 1)
+        for latency in self.latencies:
+            counts[bisect.bisect_left(BUCKETS_MS, latency * 1000)] += 1
+        return counts
+
+    def render(self, duration: float, width=50) -> str:
+        lines = []
+        counts = self.buckets()
+        labels = [f"<= {ms}ms" for ms in BUCKETS_MS] + [f"> {BUCKETS_MS[-1]}ms"]
+        for label, count in zip(labels, counts):
+            bar = "#" * round(width * count / max(max(counts), 1))
+            lines.append(f"{label:>10} {count:7} {bar}")
+        lines.append(
+            f"corrected: {len(self.latencies)} "
+            f"({len(self.latencies) / duration:.1f}/s), "
+            f"timeouts: {self.timeouts}, skipped: {self.skipped}"
+        )
+        if self.latencies:
+            lines.append(
+                " ".join(
+                    f"p{percent}={self.percentile(percent) * 1000:.1f}ms"
+                    for percent in (50, 90, 99)
+                )
+                + f" max={max(self.latencies) * 1000:.1f}ms"
+            )
+        return "\n".join(lines)
+
+
+class CommunicatorClient:
+    """A websocket on the consumers of this process."""
+
+    def __init__(self, path: str, user=None):
+        self.communicator = WebsocketCommunicator(
+            URLRouter(websocket_urlpatterns), path
+        )
+        self.communicator.scope["user"] = user or AnonymousUser()
+
+    async def connect(self):
+        connected, _ = await self.communicator.connect()
+        if not connected:
+            raise ConnectionError(f"Can't connect to {self.communicator.scope}.")
+
+    async def send(self, message: dict):
+        await self.communicator.send_json_to(message)
+
+    async def receive(self) -> dict:
+        return await self.communicator.receive_json_from(timeout=None)
+
+    async def close(self):
+        await self.communicator.disconnect()
+
+
+class WebsocketClient:
+    """A websocket on a running server.
+
+    Just enough of RFC 6455 for JSON messages: autobahn can't be used
+    from here, as txaio is already bound to Twisted once daphne is
+    imported.
+    """
+
+    def __init__(self, url: str):
+        self.url = urlparse(url)
+        self.reader: Optional[asyncio.StreamReader] = None
+        self.writer: Optional[asyncio.StreamWriter] = None
+
+    async def connect(self):
+        self.reader, self.writer = await asyncio.open_connection(
+            self.url.hostname,
+            self.url.port or (443 if self.url.scheme == "wss" else 80),
+            ssl=self.url.scheme == "wss",
+        )
+        key = base64.b64encode(os.urandom(16)).decode()
+        self.writer.write(
+            (
+                f"GET {self.url.path} HTTP/1.1\r\n"
+                f"Host: {self.url.netloc}\r\n"
+                "Upgrade: websocket\r\n"
+                "Connection: Upgrade\r\n"
+                f"Sec-WebSocket-Key: {key}\r\n"
+                "Sec-WebSocket-Version: 13\r\n\r\n"
+            ).encode("ASCII")
+        )
+        response = await self.reader.readuntil(b"\r\n\r\n")
+        if b" 101 " not in response.split(b"\r\n", 1)[0]:
+            raise ConnectionError(response.split(b"\r\n", 1)[0].decode())
+
+    def send_frame(self, opcode: int, payload: bytes):
+        assert self.writer
+        header = bytes([0x80 | opcode])
+        if len(payload) < 126:
+            header += bytes([0x80 | len(payload)])
+        elif len(payload) < 2**16:
+            header += bytes([0x80 | 126]) + struct.pack("!H", len(payload))
+        else:
+            header += bytes([0x80 | 127]) + struct.pack("!Q", len(payload))
+        mask = os.urandom(4)  # Clients have to mask what they send.
+        self.writer.write(
+            header + mask + bytes(byte ^ mask[i % 4] for i, byte in enumerate(payload))
+        )
+
+    async def send(self, message: dict):
+        self.send_frame(0x1, json.dumps(message).encode("UTF-8"))
+
+    async def receive(self) -> dict:
+        assert self.reader
+        message = b""
+        while True:
+            first, second = await self.reader.readexactly(2)
+            length = second & 0x7F
+            if length == 126:
+                (length,) = struct.unpack("!H", await self.reader.readexactly(2))
+            elif length == 127:
+                (length,) = struct.unpack("!Q", await self.reader.readexactly(8))
+            payload = await self.reader.readexactly(length)
+            opcode = first & 0x0F
+            if opcode == 0x8:
+                raise ConnectionError("Closed by the server.")
+            if opcode == 0x9:
+                self.send_frame(0xA, payload)  # Pong
+            elif opcode in (0x0, 0x1, 0x2):
+                message += payload
+                if first & 0x80:  # Final fragment
+                    return json.loads(message)
+
+    async def close(self):
+        assert self.writer
+        self.send_frame(0x8, struct.pack("!H", 1000))
+        self.writer.close()
+
+
+class InMemoryBroker:
+    """Stands for Celery: correct_answer_task.apply_async queues the
+    task, workers threads run them.
+    """
+
+    def __init__(self, workers: int):
+        self.workers = workers
+        self.queue: "asyncio.Queue[tuple]" = asyncio.Queue()
+        self.loop = asyncio.get_running_loop()
+
+    def apply_async(self, args=(), kwargs=None, **options):
+        """Called from an executor thread by send_to_correction."""
+        del options  # Queue (lane): a single queue here.
+        self.loop.call_soon_threadsafe(self.queue.put_nowait, (args, kwargs or {}))
+
+    async def work(self):
+        task = sync_to_async(correct_answer_task, thread_sensitive=False)
+        while True:
+            args, kwargs = await self.queue.get()
+            try:
+                await task(*args, **kwargs)
+            finally:
+                self.queue.task_done()
+
+    def start(self) -> List["asyncio.Task[None]"]:
+        # sync_to_async(thread_sensitive=False) uses the default executor.
+        self.loop.set_default_executor(ThreadPoolExecutor(self.workers + 4))
+        return [asyncio.create_task(self.work()) for _ in range(self.workers)]
+
+
+async def wait_correction(client, source_code: str):
+    """Wait for the correction of the answer we sent as source_code."""
+    answer_id = None
+    while True:
+        message = await client.receive()
+        if message.get("type") != "answer.update":
+            continue  # Checker output.
+        if answer_id is None and message["source_code"] == source_code:
+            answer_id = message["id"]
+        if message["id"] == answer_id and message["is_corrected"]:
+            return message
+
+
+async def session(  # pylint: disable=too-many-arguments
+    client, exercise_id, tokens, histogram, timeout, numbers
+):
+    """Send an answer each time we get a token, until we get None."""
+    while await tokens.get() is not None:
+        # Each answer is distinct, so the correction cache can't help.
+        source_code = f"print({next(numbers)})"
+        before = time.perf_counter()
+        await client.send(
+            {"type": "answer", "exercise": exercise_id, "source_code": source_code}
+        )
+        try:
+            await asyncio.wait_for(wait_correction(client, source_code), timeout)
+        except asyncio.TimeoutError:
+            histogram.timeouts += 1
+        else:
+            histogram.add(time.perf_counter() - before)
+
+
+async def run(  # pylint: disable=too-many-arguments
+    clients, exercise_id: int, rate: float, duration: float, timeout: float
+) -> Histogram:
+    """Send rate answers per second for duration seconds, spread over
+    clients, each client waiting for its correction before sending
+    another one.
+    """
+    histogram = Histogram()
+    await asyncio.gather(*[client.connect() for client in clients])
+    tokens: "asyncio.Queue[Optional[bool]]" = asyncio.Queue(maxsize=len(clients))
+    numbers = itertools.count()
+    sessions = [
+        asyncio.create_task(
+            session(client, exercise_id, tokens, histogram, timeout, numbers)
+        )
+        for client in clients
+    ]
+    start = time.perf_counter()
+    for i in itertools.count():
+        # Scheduled from the start, so a late token doesn't shift the next ones.
+        delay = start + i / rate - time.perf_counter()
+        if i / rate >= duration:
+            break
+        if delay > 0:
+            await asyncio.sleep(delay)
+        try:
+            tokens.put_nowait(True)
+        except asyncio.QueueFull:
+            histogram.skipped += 1
+    for _ in clients:
+        await tokens.put(None)
+    await asyncio.gather(*sessions)
+    await asyncio.gather(*[client.close() for client in clients])
+    return histogram
+
+
+def users(count: int) -> list:
+    """Seeded users (see seed_benchmark), or anonymous ones if there
+    are not enough of them.
+    """
+    seeded = list(User.objects.filter(username__startswith=f"{PREFIX}-")[:count])
+    if len(seeded) < count:
+        return [None] * count
+    return seeded
+
+
+def load_test_in_process(  # pylint: disable=too-many-arguments
+    connections: int,
+    rate: float,
+    duration: float,
+    exercise_id: int,
+    workers: int,
+    checker_duration: float,
+    timeout: float,
+) -> Histogram:
+    async def scenario():
+        broker = InMemoryBroker(workers)
+        with mock.patch.object(correct_answer_task, "apply_async", broker.apply_async):
+            workers_tasks = broker.start()
+            try:
+                return await run(
+                    [
+                        CommunicatorClient(f"/ws/exercises/{exercise_id}/", user)
+                        for user in await sync_to_async(users)(connections)
+                    ],
+                    exercise_id,
+                    rate,
+                    duration,
+                    timeout,
+                )
+            finally:
+                for task in workers_tasks:
+                    task.cancel()
+
+    with override_settings(
+        CHANNEL_LAYERS=IN_MEMORY_CHANNEL_LAYERS,
+        CACHES=IN_MEMORY_CACHES,
+        HKIS_STAND_IN_CHECKER=checker_duration,
+        HKIS_CORRECTION_TIMEOUT=timeout,
+    ):
+        return asyncio.run(scenario())
+
+
+def load_test_remote(  # pylint: disable=too-many-arguments
+    url: str,
+    connections: int,
+    rate: float,
+    duration: float,
+    exercise_id: int,
+    timeout: float,
+) -> Histogram:
+    endpoint = f"{url.rstrip('/')}/ws/exercises/{exercise_id}/"
+    return asyncio.run(
+        run(
+            [WebsocketClient(endpoint) for _ in range(connections)],
+            exercise_id,
+            rate,
+            duration,
+            timeout,
+        )
+    )
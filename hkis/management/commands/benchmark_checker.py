@@ -0,0 +1,57 @@
+from contextlib import ExitStack
+import statistics
+import time
+from unittest import mock
+
+from django.core.management.base import BaseCommand
+from hkis.tasks import SandboxPool, cold_check
+
+CHECK_PY = """
+try:
+    import correction_helper
+except ImportError:
+    pass
+print(open("solution").read())
+"""
+
+
+def no_firejail(tmpdir, *command):  # pylint: disable=unused-argument
+    return list(command)
+
+
+class Command(BaseCommand):
+    help = "Compare cold checks and pre-spawned sandbox pool latencies."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--count", type=int, default=50)
+        parser.add_argument(
+            "--no-sandbox",
+            action="store_true",
+            help="Don't use firejail, to measure the interpreter startup alone.",
+        )
+
+    def handle(self, *args, **options):
+        answer = {"check": CHECK_PY, "source_code": "42", "language": "en"}
+        with ExitStack() as stack:
+            if options["no_sandbox"]:
+                stack.enter_context(
+                    mock.patch("hkis.tasks.firejail_command", no_firejail)
+                )
+            pool = SandboxPool(size=2)
+            stack.callback(pool.close)
+            pool.check(answer)  # Warm up the pool.
+            for name, check in ("cold", cold_check), ("pool", pool.check):
+                latencies = []
+                for _ in range(options["count"]):
+                    before = time.perf_counter()
+                    check(answer)
+                    latencies.append(time.perf_counter() - before)
+                    time.sleep(0.3)  # Think time, letting the pool warm up.
+                self.report(name, latencies)
+
+    def report(self, name, latencies):
+        percentiles = statistics.quantiles(latencies, n=100)
+        self.stdout.write(
+            f"{name}: p50={percentiles[49] * 1000:.1f}ms "
+            f"p99={percentiles[98] * 1000:.1f}ms"
+        )
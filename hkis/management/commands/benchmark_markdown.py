@@ -0,0 +1,60 @@
+import time
+from functools import partial
+
+import bleach
+import markdown
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from markdown.extensions.codehilite import CodeHiliteExtension
+
+from hkis.models import Exercise, Page, RenderedMarkdown
+from hkis.utils import ALLOWED_ATTRIBUTES, ALLOWED_TAGS, _set_target, render_markdown
+
+
+def render_from_scratch(text):
+    """markdown_to_bootstrap before Markdown and Cleaner instances were reused."""
+    return bleach.sanitizer.Cleaner(
+        tags=getattr(settings, "ALLOWED_TAGS", ALLOWED_TAGS),
+        attributes=getattr(settings, "ALLOWED_ATTRIBUTES", ALLOWED_ATTRIBUTES),
+        filters=[
+            partial(
+                bleach.linkifier.LinkifyFilter,
+                callbacks=[_set_target],
+                skip_tags=["pre"],
+                parse_email=False,
+            ),
+        ],
+    ).clean(
+        markdown.markdown(
+            text,
+            extensions=[
+                "fenced_code",
+                CodeHiliteExtension(guess_lang=False),
+                "admonition",
+            ],
+        ),
+    )
+
+
+class Command(BaseCommand):
+    help = "Compare cold render costs of all exercise wordings and page bodies."
+
+    def handle(self, *args, **options):
+        texts = list(Exercise.objects.values_list("wording", flat=True))
+        texts += list(Page.objects.values_list("body", flat=True))
+        if not texts:
+            self.stderr.write("Nothing to render.")
+            return
+        RenderedMarkdown.objects.store(texts)
+        for name, render in (
+            ("from scratch", lambda texts: [render_from_scratch(t) for t in texts]),
+            ("reusing instances", lambda texts: [render_markdown(t) for t in texts]),
+            ("stored", RenderedMarkdown.objects.render),
+        ):
+            before = time.perf_counter()
+            render(texts)
+            elapsed = time.perf_counter() - before
+            self.stdout.write(
+                f"{name}: {elapsed * 1000:.1f}ms for {len(texts)} texts "
+                f"({elapsed / len(texts) * 1000:.2f}ms per text)"
+            )
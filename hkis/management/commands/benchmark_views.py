@@ -0,0 +1,46 @@
+import json
+import sys
+
+from django.core.management.base import BaseCommand
+from django.test import Client
+from django.test.utils import override_settings
+
+from hkis.benchmark import BUDGETS_FILE, load_budgets, measure_all, over_budget
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure queries and time of the hot views on a seeded database "
+        "(see seed_benchmark), failing on query budget regressions."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--update",
+            action="store_true",
+            help=f"Store the measured query counts as budgets in {BUDGETS_FILE}.",
+        )
+
+    def handle(self, *args, **options):
+        with override_settings(ALLOWED_HOSTS=["*"], DEBUG=False):
+            results = measure_all(Client())
+        for name, result in results.items():
+            self.stdout.write(
+                f"{name}: HTTP {result.status_code}, {result.queries} queries, "
+                f"{result.seconds * 1000:.1f}ms"
+            )
+        if options["update"]:
+            BUDGETS_FILE.write_text(
+                json.dumps(
+                    {name: result.queries for name, result in results.items()},
+                    indent=4,
+                )
+                + "\n",
+                encoding="UTF-8",
+            )
+            return
+        regressions = over_budget(results, load_budgets())
+        for regression in regressions:
+            self.stderr.write(self.style.ERROR(regression))
+        if regressions:
+            sys.exit(1)
@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+from hkis.models import UserInfo
+
+
+class Command(BaseCommand):
+    help = "Verify incrementally maintained user points against a full recompute."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--fix", action="store_true", help="Store the recomputed points."
+        )
+        parser.add_argument("--tolerance", type=float, default=1e-6)
+
+    def handle(self, *args, **options):
+        drifting = 0
+        for userinfo, expected in UserInfo.objects.points_drift(options["tolerance"]):
+            drifting += 1
+            self.stdout.write(
+                f"{userinfo.user.username}: {userinfo.points} != {expected}"
+            )
+            if options["fix"]:
+                userinfo.points = expected
+                userinfo.save()
+        if drifting:
+            self.stdout.write(self.style.WARNING(f"{drifting} users drifting."))
+        else:
+            self.stdout.write(self.style.SUCCESS("All user points are consistent."))
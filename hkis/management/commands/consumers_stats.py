@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+from hkis.consumers import CONSUMERS_STATS_INTERVAL, published_consumers_stats
+
+
+class Command(BaseCommand):
+    help = (
+        "Display the open websockets and their memory footprint, per process, "
+        f"as published by each of them every {CONSUMERS_STATS_INTERVAL} seconds."
+    )
+
+    def handle(self, *args, **options):
+        for published in published_consumers_stats():
+            for consumer, counts in sorted(published["stats"].items()):
+                per_connection = counts["bytes"] // max(counts["connections"], 1)
+                self.stdout.write(
+                    f"{published['process']} {consumer}: "
+                    f"{counts['connections']} connections, "
+                    f"{counts['groups']} groups, "
+                    f"~{per_connection} bytes per connection"
+                )
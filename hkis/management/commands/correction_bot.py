@@ -1,9 +1,28 @@
 from django.core.management.base import BaseCommand
 import subprocess
 
+from hkis.tasks import LANES
+
 
 class Command(BaseCommand):
     help = "Run a correction bot process"
 
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--queues",
+            default=",".join(LANES),
+            help="Comma separated lanes to work on, like 'fast' to "
+            "dedicate a bot to the fast lane (defaults to all lanes).",
+        )
+        parser.add_argument(
+            "--beat",
+            action="store_true",
+            help="Also run the periodic tasks, like the exercise stats "
+            "rollup (a single bot should).",
+        )
+
     def handle(self, *args, **options):
-        subprocess.run(["celery", "-A", "hkis.tasks", "worker"])
+        command = ["celery", "-A", "hkis.tasks", "worker", "-Q", options["queues"]]
+        if options["beat"]:
+            command.append("--beat")
+        subprocess.run(command)
@@ -0,0 +1,20 @@
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from hkis.tasks import CORRECTION_CACHE_PREFIX, correction_cache_stats
+
+
+class Command(BaseCommand):
+    help = "Display the correction cache hit and miss counters."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--reset", action="store_true", help="Reset counters.")
+
+    def handle(self, *args, **options):
+        stats = correction_cache_stats()
+        total = stats["hits"] + stats["misses"]
+        ratio = f"{stats['hits'] / total:.0%}" if total else "ø"
+        self.stdout.write(
+            f"hits: {stats['hits']}, misses: {stats['misses']}, hit ratio: {ratio}"
+        )
+        if options["reset"]:
+            cache.delete_many([CORRECTION_CACHE_PREFIX + event for event in stats])
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+from hkis.tasks import lanes_stats
+
+
+class Command(BaseCommand):
+    help = "Display the number of waiting answers and the wait time per lane."
+
+    def handle(self, *args, **options):
+        for lane, stats in lanes_stats().items():
+            wait = "ø" if stats["wait"] is None else f"{stats['wait']:.1f}s"
+            self.stdout.write(f"{lane}: {stats['depth']} waiting, average wait: {wait}")
@@ -0,0 +1,81 @@
+import logging
+
+from django.core.management.base import BaseCommand, CommandError
+
+from hkis.loadtest import load_test_in_process, load_test_remote
+from hkis.models import Exercise
+
+
+class Command(BaseCommand):
+    help = (
+        "Open websockets on ws/exercises/<id>/, send answers at a given rate, "
+        "and show a histogram of the correction latencies. Runs the "
+        "consumers, an in-memory channel layer and broker, and a stand-in "
+        "checker in this process, unless --url is given. Stores answers: "
+        "use a throwaway database (see seed_benchmark for users)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--connections", type=int, default=100)
+        parser.add_argument(
+            "--rate", type=float, default=20, help="Answers sent per second."
+        )
+        parser.add_argument("--duration", type=float, default=30, help="In seconds.")
+        parser.add_argument(
+            "--exercise",
+            type=int,
+            help="Exercise id, defaults to the first one.",
+        )
+        parser.add_argument(
+            "--timeout",
+            type=float,
+            default=30,
+            help="Give up waiting for a correction after this many seconds.",
+        )
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=4,
+            help="Correction workers (in-process only).",
+        )
+        parser.add_argument(
+            "--checker-duration",
+            type=float,
+            default=0.1,
+            help="Seconds taken by the stand-in checker (in-process only).",
+        )
+        parser.add_argument(
+            "--url",
+            help="Load test a running server instead, like ws://localhost:8000",
+        )
+
+    def handle(self, *args, **options):
+        exercise_id = options["exercise"]
+        if exercise_id is None and not options["url"]:
+            exercise_id = (
+                Exercise.objects.order_by("id").values_list("id", flat=True).first()
+            )
+        if exercise_id is None:
+            raise CommandError("No exercise to send answers to, give --exercise.")
+        if options["verbosity"] < 2:
+            logging.getLogger("hkis.consumers").setLevel(logging.WARNING)
+        if options["url"]:
+            histogram = load_test_remote(
+                options["url"],
+                options["connections"],
+                options["rate"],
+                options["duration"],
+                exercise_id,
+                options["timeout"],
+            )
+        else:
+            histogram = load_test_in_process(
+                options["connections"],
+                options["rate"],
+                options["duration"],
+                exercise_id,
+                options["workers"],
+                options["checker_duration"],
+                options["timeout"],
+            )
+        self.stdout.write(histogram.render(options["duration"]))
@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+from hkis.models import RenderedMarkdown
+
+
+class Command(BaseCommand):
+    help = "Delete stored markdown renders no wording or page body uses anymore."
+
+    def handle(self, *args, **options):
+        deleted, _ = RenderedMarkdown.objects.unreferenced().delete()
+        self.stdout.write(f"Deleted {deleted} renders.")
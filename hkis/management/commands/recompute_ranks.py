@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+from hkis.models import UserInfo
+
+
+class Command(BaseCommand):
+    help = "Rebuild the materialized leaderboard ranks."
+
+    def handle(self, *args, **options):
+        updated = UserInfo.objects.recompute_ranks()
+        self.stdout.write(self.style.SUCCESS(f"Successfully updated {updated} ranks"))
@@ -1,15 +1,75 @@
 from django.core.management.base import BaseCommand
+from django.db import transaction
 from hkis.models import Team, UserInfo, Exercise
 
 
 class Command(BaseCommand):
     help = "Recompute all user stats"
 
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Only display what would change, without writing anything.",
+        )
+        parser.add_argument("--batch-size", type=int, default=1000)
+
     def handle(self, *args, **options):
-        self.stdout.write("Recomputing exercises solved_by...")
-        Exercise.objects.recompute_solved_by()
-        self.stdout.write("Recomputing teams scores...")
-        Team.objects.recompute_ranks()
-        self.stdout.write("Recomputing users points...")
-        UserInfo.objects.recompute_points()
-        self.stdout.write(self.style.SUCCESS("Successfully recomputed all stats"))
+        self.dry_run = options["dry_run"]
+        self.batch_size = options["batch_size"]
+        with transaction.atomic():
+            self.stdout.write("Recomputing exercises solved_by...")
+            self.update(
+                Exercise.objects.all(),
+                "solved_by",
+                Exercise.objects.compute_solved_by(),
+                default=0,
+            )
+            self.stdout.write("Recomputing users points...")
+            user_points = UserInfo.objects.compute_points()
+            self.update(
+                UserInfo.objects.all(),
+                "points",
+                {
+                    userinfo.pk: user_points.get(userinfo.user_id, 0.0)
+                    for userinfo in UserInfo.objects.only("pk", "user_id")
+                },
+                default=0.0,
+            )
+            if not self.dry_run:
+                self.stdout.write("Recomputing users ranks...")
+                UserInfo.objects.recompute_ranks(self.batch_size)
+            self.stdout.write("Recomputing teams scores...")
+            self.update(
+                Team.objects.all(),
+                "points",
+                Team.objects.compute_points(user_points),
+                default=0.0,
+            )
+        if self.dry_run:
+            self.stdout.write(self.style.SUCCESS("Dry run, nothing written."))
+        else:
+            self.stdout.write(self.style.SUCCESS("Successfully recomputed all stats"))
+
+    def update(self, queryset, field, values, default):
+        """Write values (a {pk: value} dict) to field, in batches, only
+        for rows where it changed.
+        """
+        to_update = []
+        for obj in queryset.only("pk", field):
+            new_value = values.get(obj.pk, default)
+            if getattr(obj, field) != new_value:
+                if self.dry_run:
+                    self.stdout.write(
+                        f"  {queryset.model.__name__} #{obj.pk}: "
+                        f"{field} {getattr(obj, field)} -> {new_value}"
+                    )
+                setattr(obj, field, new_value)
+                to_update.append(obj)
+        self.stdout.write(f"  {len(to_update)} {queryset.model.__name__} to update.")
+        if self.dry_run:
+            return
+        for start in range(0, len(to_update), self.batch_size):
+            end = min(start + self.batch_size, len(to_update))
+            queryset.model.objects.bulk_update(to_update[start:end], [field])
+            self.stdout.write(f"  {end}/{len(to_update)} updated.")
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+from hkis.models import RenderedMarkdown
+
+
+class Command(BaseCommand):
+    help = (
+        "Store the renders of wordings and page bodies not rendered yet, "
+        "like after an upgrade of the renderer."
+    )
+
+    def handle(self, *args, **options):
+        texts = RenderedMarkdown.objects.current_texts()
+        rendered = RenderedMarkdown.objects.store(texts)
+        self.stdout.write(f"Rendered {rendered} texts.")
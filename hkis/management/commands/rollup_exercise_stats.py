@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Min
+from django.utils.timezone import localdate
+
+from hkis.models import Answer, ExerciseDailyStats
+
+
+class Command(BaseCommand):
+    help = (
+        "Count the daily tries and successes of the exercises, over the last "
+        "HKIS_ROLLUP_DAYS days (ran hourly by `correction_bot --beat`)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--rebuild",
+            action="store_true",
+            help="Drop the rollup and count again from the first answer.",
+        )
+
+    def handle(self, *args, **options):
+        since = None
+        if options["rebuild"]:
+            first = Answer.objects.aggregate(Min("created_at"))["created_at__min"]
+            since = localdate(first) if first else localdate()
+            ExerciseDailyStats.objects.all().delete()
+        rows = ExerciseDailyStats.objects.rollup(since)
+        self.stdout.write(self.style.SUCCESS(f"Rolled up {rows} exercise days."))
@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+
+from hkis.benchmark import seed
+
+
+class Command(BaseCommand):
+    help = "Fill the database with a synthetic dataset, for benchmark_views."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=10_000)
+        parser.add_argument("--exercises", type=int, default=500)
+        parser.add_argument("--answers", type=int, default=1_000_000)
+        parser.add_argument("--teams", type=int, default=100)
+        parser.add_argument("--batch-size", type=int, default=10_000)
+
+    def handle(self, *args, **options):
+        seed(
+            users=options["users"],
+            exercises=options["exercises"],
+            answers=options["answers"],
+            teams=options["teams"],
+            batch_size=options["batch_size"],
+            log=self.stdout.write,
+        )
+        self.stdout.write(self.style.SUCCESS("Successfully seeded the database"))
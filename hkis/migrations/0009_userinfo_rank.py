@@ -0,0 +1,39 @@
+# Generated by Django 4.0.5 on 2026-10-18 09:12
+
+from django.db import migrations, models
+
+
+def compute_ranks(apps, schema_editor):
+    UserInfo = apps.get_model("hkis", "UserInfo")
+    to_update = []
+    rank = 0
+    previous_points = None
+    for userinfo in UserInfo.objects.filter(show_in_leaderboard=True).order_by(
+        "-points"
+    ):
+        if userinfo.points != previous_points:
+            rank += 1
+            previous_points = userinfo.points
+        userinfo.rank = rank
+        to_update.append(userinfo)
+    UserInfo.objects.bulk_update(to_update, ["rank"], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('hkis', '0008_rename_check_exercise_check_py_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='userinfo',
+            name='rank',
+            field=models.IntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='userinfo',
+            index=models.Index(fields=['rank'], name='hkis_userin_rank_add182_idx'),
+        ),
+        migrations.RunPython(compute_ranks, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.0.5 on 2026-10-18 09:25
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('hkis', '0009_userinfo_rank'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='exercise',
+            name='check_is_deterministic',
+            field=models.BooleanField(default=False),
+        ),
+    ]
@@ -0,0 +1,57 @@
+# Generated by Django 4.0.5 on 2026-10-18 09:35
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def backfill(apps, schema_editor):
+    Answer = apps.get_model("hkis", "Answer")
+    ExerciseStatus = apps.get_model("hkis", "ExerciseStatus")
+    statuses = (
+        Answer.objects.filter(user__isnull=False)
+        .values("user_id", "exercise_id")
+        .annotate(
+            attempts=models.Count("id"),
+            last_answer_id=models.Max("id"),
+            first_solved_at=models.Min(
+                "created_at", filter=models.Q(is_valid=True)
+            ),
+        )
+        .order_by()
+    )
+    ExerciseStatus.objects.bulk_create(
+        (
+            ExerciseStatus(solved=status["first_solved_at"] is not None, **status)
+            for status in statuses.iterator()
+        ),
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('hkis', '0011_correctionjob'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ExerciseStatus',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('solved', models.BooleanField(default=False)),
+                ('first_solved_at', models.DateTimeField(blank=True, null=True)),
+                ('attempts', models.PositiveIntegerField(default=0)),
+                ('exercise', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='statuses', to='hkis.exercise')),
+                ('last_answer', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='hkis.answer')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='exercisestatus',
+            constraint=models.UniqueConstraint(fields=('user', 'exercise'), name='unique_exercise_status'),
+        ),
+        migrations.RunPython(backfill, migrations.RunPython.noop),
+    ]
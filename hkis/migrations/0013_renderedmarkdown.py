@@ -0,0 +1,21 @@
+# Generated by Django 4.0.5 on 2026-10-18 09:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('hkis', '0012_exercisestatus'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RenderedMarkdown',
+            fields=[
+                ('digest', models.CharField(max_length=64, primary_key=True, serialize=False)),
+                ('html', models.TextField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+    ]
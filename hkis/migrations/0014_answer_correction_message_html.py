@@ -0,0 +1,18 @@
+# Generated by Django 4.0.5 on 2026-10-18 09:44
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('hkis', '0013_renderedmarkdown'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='answer',
+            name='correction_message_html',
+            field=models.TextField(blank=True, default='', editable=False),
+        ),
+    ]
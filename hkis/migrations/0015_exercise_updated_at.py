@@ -0,0 +1,24 @@
+# Generated by Django 4.0.5 on 2026-10-18 11:58
+
+from django.db import migrations, models
+
+
+def backfill_updated_at(apps, schema_editor):
+    Exercise = apps.get_model("hkis", "Exercise")
+    Exercise.objects.update(updated_at=models.F("created_at"))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('hkis', '0014_answer_correction_message_html'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='exercise',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.RunPython(backfill_updated_at, migrations.RunPython.noop),
+    ]
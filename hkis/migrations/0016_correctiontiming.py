@@ -0,0 +1,34 @@
+# Generated by Django 4.0.5 on 2026-10-18 10:13
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('hkis', '0015_exercise_updated_at'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CorrectionTiming',
+            fields=[
+                ('answer', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='timing', serialize=False, to='hkis.answer')),
+                ('recorded_at', models.DateTimeField(auto_now=True)),
+                ('create_time', models.FloatField(blank=True, null=True)),
+                ('queue_time', models.FloatField(blank=True, null=True)),
+                ('pre_check_time', models.FloatField(blank=True, null=True)),
+                ('sandbox_time', models.FloatField(blank=True, null=True)),
+                ('check_time', models.FloatField(blank=True, null=True)),
+                ('render_time', models.FloatField(blank=True, null=True)),
+                ('save_time', models.FloatField(blank=True, null=True)),
+                ('send_time', models.FloatField(blank=True, null=True)),
+                ('exercise', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='hkis.exercise')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='correctiontiming',
+            index=models.Index(fields=['exercise', '-recorded_at'], name='hkis_correc_exercis_fe87ea_idx'),
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 4.0.5 on 2026-10-18 10:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('hkis', '0016_correctiontiming'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='correctiontiming',
+            name='check_cpu_time',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='correctiontiming',
+            name='check_max_rss',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='correctiontiming',
+            name='timed_out',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddField(
+            model_name='exercise',
+            name='check_cost_regression',
+            field=models.CharField(blank=True, default='', editable=False, max_length=255),
+        ),
+        migrations.AddField(
+            model_name='exercise',
+            name='check_edited_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+    ]
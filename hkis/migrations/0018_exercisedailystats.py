@@ -0,0 +1,29 @@
+# Generated by Django 4.0.5 on 2026-10-18 10:20
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('hkis', '0017_check_costs'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ExerciseDailyStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('tries', models.PositiveIntegerField(default=0)),
+                ('successes', models.PositiveIntegerField(default=0)),
+                ('last_answer_id', models.BigIntegerField(default=0)),
+                ('exercise', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_stats', to='hkis.exercise')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='exercisedailystats',
+            constraint=models.UniqueConstraint(fields=('exercise', 'date'), name='unique_exercise_date'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.0.5 on 2026-10-18 10:53
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('hkis', '0018_exercisedailystats'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='correctiontiming',
+            name='recorded_at',
+            field=models.DateTimeField(auto_now_add=True),
+        ),
+    ]
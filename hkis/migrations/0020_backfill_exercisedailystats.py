@@ -0,0 +1,39 @@
+from django.db import migrations, models
+from django.db.models.functions import TruncDate
+
+
+def backfill(apps, schema_editor):
+    """Like `./manage.py rollup_exercise_stats --rebuild`, with the
+    historical models.
+    """
+    Answer = apps.get_model("hkis", "Answer")
+    ExerciseDailyStats = apps.get_model("hkis", "ExerciseDailyStats")
+    days = (
+        Answer.objects.filter(user__is_staff=False)
+        .annotate(date=TruncDate("created_at"))
+        .values("exercise_id", "date")
+        .annotate(
+            tries=models.Count("user", distinct=True),
+            successes=models.Count(
+                "user", filter=models.Q(is_valid=True), distinct=True
+            ),
+            last_answer_id=models.Max("id"),
+        )
+        .order_by()
+    )
+    ExerciseDailyStats.objects.all().delete()
+    ExerciseDailyStats.objects.bulk_create(
+        (ExerciseDailyStats(**day) for day in days.iterator()),
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('hkis', '0019_correctiontiming_first_correction'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill, migrations.RunPython.noop),
+    ]
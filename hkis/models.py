@@ -1,24 +1,49 @@
 import logging
+from bisect import bisect_left
+import time
+import datetime
 from datetime import timedelta
+from collections import defaultdict
+from typing import Dict, Iterable, List, NamedTuple, Optional
 
-from asgiref.sync import async_to_sync
+from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.core.exceptions import ValidationError
-from django.db import models, IntegrityError
-from django.db.models import Count, Value, Q, Min, Sum, F
-from django.db.models.signals import post_save
+from django.db import connection, models, IntegrityError, transaction
+from django.db.models import (
+    Avg,
+    Count,
+    F,
+    Max,
+    Min,
+    OuterRef,
+    Q,
+    Subquery,
+    Sum,
+    Value,
+)
+from django.db.models.signals import post_delete, post_save, pre_delete
 from django.db.models.expressions import Window
-from django.db.models.functions import DenseRank
+from django.db.models.functions import (
+    Coalesce,
+    DenseRank,
+    TruncDate,
+    TruncQuarter,
+    TruncWeek,
+)
 from django.dispatch import receiver
 from django.template.defaultfilters import truncatechars
 from django.urls import reverse
 from django.utils.text import Truncator
-from django.utils.timezone import now
+from django.utils.timezone import localdate, make_aware, now
 from django.utils.translation import gettext_lazy as _
 from django_extensions.db.fields import AutoSlugField
 
 from django_cte import CTEManager, With, CTEQuerySet
 
+from hkis import navigation
+from hkis.utils import markdown_digest, render_correction_message, render_markdown
+
 logger = logging.getLogger(__name__)
 
 
@@ -28,8 +53,12 @@ User = get_user_model()
 class UserInfoCTEQuerySet(CTEQuerySet):
     """QuerySet attached to the UserInfo.with_rank manager."""
 
-    def with_rank(self):
-        """Use a Common Table Expression to add rank to UserInfos.
+    def with_computed_rank(self):
+        """Use a Common Table Expression to compute the rank of UserInfos.
+
+        This is the reference for the materialized UserInfo.rank, use
+        it only to rebuild or to verify them, as it scans the whole
+        table.
 
         The resulting query looks like:
 
@@ -38,8 +67,8 @@ class UserInfoCTEQuerySet(CTEQuerySet):
                 FROM "hkis_userinfo")
             SELECT * FROM cte
 
-        The idea is with_rank() can be chained with filters without
-        modifying the window, generating queries like:
+        The idea is with_computed_rank() can be chained with filters
+        without modifying the window, generating queries like:
 
             WITH cte AS (
                 SELECT *, DENSE_RANK() OVER (ORDER BY hkis_userinfo.points DESC) AS r
@@ -48,12 +77,14 @@ class UserInfoCTEQuerySet(CTEQuerySet):
             WHERE ...
 
         Without a CTE,
-        `UserInfo.with_rank.filter(user__username="anyone")`
+        `UserInfo.with_rank.with_computed_rank().filter(user__username="anyone")`
         would always tell the user is ranked 1st (as the only one in its selection).
         """
         with_rank = With(
-            self.annotate(
-                rank=Window(order_by=F("points").desc(), expression=DenseRank())
+            self.model.objects.annotate(
+                computed_rank=Window(
+                    order_by=F("points").desc(), expression=DenseRank()
+                )
             ).filter(show_in_leaderboard=True)
         )
         return with_rank.queryset().with_cte(with_rank).select_related("user")
@@ -66,12 +97,75 @@ class UserInfoCTEQuerySet(CTEQuerySet):
 
 
 class UserInfoQuerySet(CTEQuerySet):
-    def recompute_points(self):  # pylint: disable=no-self-use
+    def compute_points(self):  # pylint: disable=no-self-use
+        """Compute the points of all users (as UserInfo.compute_points),
+        using a single query grouped by (user, exercise).
+
+        Returns a {user_id: points} dict, users without any solve are
+        omitted.
+        """
+        exercises = {
+            exercise.pk: exercise
+            for exercise in Exercise.objects.only("points", "created_at")
+        }
+        points: Dict[int, float] = defaultdict(float)
+        for user_id, exercise_id, first_try_at in (
+            Answer.objects.filter(user__isnull=False)
+            .values("user_id", "exercise_id")
+            .annotate(
+                first_try_at=Min("created_at"),
+                successes=Count("pk", filter=Q(is_valid=True)),
+            )
+            .filter(successes__gt=0)
+            .values_list("user_id", "exercise_id", "first_try_at")
+        ):
+            points[user_id] += exercises[exercise_id].points_for(first_try_at)
+        return points
+
+    def recompute_points(self, batch_size=1000):
         """Recompute all user points, usefull after updating the points given
         by an exercise.
         """
-        for userinfo in UserInfo.objects.all():
-            userinfo.recompute_points()
+        points = self.compute_points()
+        to_update = []
+        for userinfo in self.only("pk", "user_id", "points"):
+            new_points = points.get(userinfo.user_id, 0.0)
+            if userinfo.points != new_points:
+                userinfo.points = new_points
+                to_update.append(userinfo)
+        UserInfo.objects.bulk_update(to_update, ["points"], batch_size=batch_size)
+        self.recompute_ranks(batch_size)
+
+    def points_drift(self, tolerance=1e-6):
+        """Yield (userinfo, expected_points) for each user whose
+        incrementally maintained points differ from the full formula
+        (see UserInfo.compute_points).
+        """
+        for userinfo in self.select_related("user"):
+            expected = userinfo.compute_points()
+            if abs(userinfo.points - expected) > tolerance:
+                yield userinfo, expected
+
+    def recompute_ranks(self, batch_size=1000):  # pylint: disable=no-self-use
+        """Rebuild the materialized UserInfo.rank of all users at once,
+        using the with_computed_rank window function.
+
+        Returns the number of updated users.
+        """
+        with transaction.atomic():
+            lock_ranks()
+            ranks = dict(
+                UserInfo.with_rank.with_computed_rank().values_list(
+                    "pk", "computed_rank"
+                )
+            )
+            to_update = []
+            for userinfo in UserInfo.objects.only("pk", "rank"):
+                if userinfo.rank != ranks.get(userinfo.pk):
+                    userinfo.rank = ranks.get(userinfo.pk)
+                    to_update.append(userinfo)
+            UserInfo.objects.bulk_update(to_update, ["rank"], batch_size=batch_size)
+        return len(to_update)
 
 
 class UserInfoManager(CTEManager):
@@ -84,7 +178,11 @@ class UserInfoManager(CTEManager):
     """
 
     def get_queryset(self):
-        return UserInfoCTEQuerySet(self.model, using=self._db).with_rank()
+        return (
+            UserInfoCTEQuerySet(self.model, using=self._db)
+            .filter(rank__isnull=False)
+            .select_related("user")
+        )
 
 
 class UserInfo(models.Model):
@@ -92,6 +190,7 @@ class UserInfo(models.Model):
         indexes = [
             models.Index(fields=["-points"]),
             models.Index(fields=["show_in_leaderboard", "-points"]),
+            models.Index(fields=["rank"]),
         ]
 
     objects = UserInfoQuerySet.as_manager()
@@ -100,15 +199,81 @@ class UserInfo(models.Model):
     points = models.FloatField(default=0)  # Computed sum of solved exercise positions.
     public_profile = models.BooleanField(default=True)
     show_in_leaderboard = models.BooleanField(default=True)
+    # Materialized DENSE_RANK() of points, incrementally maintained by
+    # update_rank, NULL for users not shown in the leaderboard.
+    # Can be rebuilt using `./manage.py recompute_ranks`.
+    rank = models.IntegerField(blank=True, null=True, editable=False)
+
+    # Points as seen by the leaderboard when loaded from the database,
+    # None if not in the leaderboard, used to maintain ranks on save.
+    _ranked_points: Optional[float] = None
 
     def __str__(self):
         return f"{self.user.username} {self.points}"
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._ranked_points = instance.ranked_points()
+        return instance
+
+    def save(self, *args, **kwargs):
+        if self.ranked_points() == self._ranked_points and (
+            self.rank is not None or not self.show_in_leaderboard
+        ):
+            super().save(*args, **kwargs)
+            return
+        with transaction.atomic():
+            lock_ranks()  # Before locking our own row.
+            super().save(*args, **kwargs)
+            self.update_rank(self._ranked_points)
+
+    def ranked_points(self) -> Optional[float]:
+        """Points as seen by the leaderboard (None if not in it)."""
+        if "points" not in self.__dict__ or "show_in_leaderboard" not in self.__dict__:
+            return self._ranked_points  # Deferred fields, assume unchanged.
+        return self.points if self.show_in_leaderboard else None
+
+    def update_rank(self, old_points: Optional[float]) -> None:
+        """Maintain the materialized ranks after this user moved in the
+        leaderboard from old_points to its current points (None
+        meaning "not in the leaderboard").
+
+        Only users ranked below the old or new position are touched,
+        using at most two UPDATE, under lock_ranks.
+        """
+        if self.rank is None:
+            old_points = None  # Was not ranked yet.
+        new_points = self.ranked_points()
+        with transaction.atomic():
+            lock_ranks()
+            shift_ranks(old_points, new_points, exclude_pk=self.pk)
+            others = UserInfo.objects.filter(rank__isnull=False).exclude(pk=self.pk)
+            if new_points is None:
+                rank = None
+            else:
+                rank = (
+                    others.filter(points=new_points)
+                    .values_list("rank", flat=True)
+                    .first()
+                )
+                if rank is None:
+                    above = (
+                        others.filter(points__gt=new_points)
+                        .order_by("points")
+                        .values_list("rank", flat=True)
+                        .first()
+                    )
+                    rank = 1 if above is None else above + 1
+            UserInfo.objects.filter(pk=self.pk).update(rank=rank)
+        self.rank = rank
+        self._ranked_points = new_points
+
     def public_teams(self):
         return self.user.teams.filter(is_public=True)
 
-    def recompute_points(self) -> None:
-        """Reconpute the number of points for this user.
+    def compute_points(self) -> float:
+        """Compute the number of points for this user, from scratch.
 
         Points for one exercise done:
 
@@ -122,18 +287,124 @@ class UserInfo(models.Model):
           won't appear visually when ceil()ed, but make 1st solver 1st
           in the leaderboard.
         """
-        points = 0
+        points = 0.0
         for exercise in Exercise.objects.with_user_stats(user=self.user).only(
             "points", "created_at"
         ):
             if exercise.user_successes:
-                time_to_solve = (
-                    exercise.solved_at - exercise.created_at
-                ).total_seconds()
-                points += exercise.points - (time_to_solve**0.001 - 1)
-        self.points = points
+                points += exercise.points_for(exercise.solved_at)
+        return points
+
+    def recompute_points(self) -> None:
+        """Reconpute the number of points for this user."""
+        self.points = self.compute_points()
         self.save()
 
+    def add_solve(self, exercise, sign: int = 1) -> None:
+        """Incrementally grant the points of a freshly solved exercise.
+
+        The caller is responsible to call this only once per (user,
+        exercise), see Answer.update_solve.
+        """
+        first_try_at = Answer.objects.filter(
+            user_id=self.user_id, exercise=exercise
+        ).aggregate(Min("created_at"))["created_at__min"]
+        UserInfo.objects.filter(pk=self.pk).update(
+            points=F("points") + sign * exercise.points_for(first_try_at)
+        )
+        self.refresh_from_db(fields=["points"])
+        self.update_rank(self._ranked_points)
+
+    def remove_solve(self, exercise) -> None:
+        """Take back the points of an exercise not solved anymore."""
+        self.add_solve(exercise, sign=-1)
+
+
+# Identify our locks among PostgreSQL advisory locks (see advisory_lock).
+RANKS_LOCK_ID = 0x686B6973
+ROLLUP_LOCK_ID = 0x686B6974
+
+
+def advisory_lock(lock_id: int) -> None:
+    """Hold a lock until the end of the current transaction.
+
+    SQLite serializes writing transactions by itself.
+    """
+    assert connection.in_atomic_block
+    if connection.vendor == "postgresql":
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT pg_advisory_xact_lock(%s)", [lock_id])
+
+
+def lock_ranks() -> None:
+    """Serialize rank maintenance until the end of the current
+    transaction.
+
+    Moving a user in the leaderboard updates the ranks of whole ranges
+    of other users: concurrently, two transactions would lock
+    overlapping rows in different orders (deadlocking), or both see
+    a score as not taken yet (shifting ranks twice).
+
+    Take it before locking any UserInfo row, so no transaction holds
+    a row while waiting for it.
+    """
+    advisory_lock(RANKS_LOCK_ID)
+
+
+def shift_ranks(
+    old_points: Optional[float], new_points: Optional[float], exclude_pk=None
+) -> None:
+    """Shift the dense rank of other users after a user moved from
+    old_points to new_points (None meaning out of the leaderboard).
+
+    The rank of a user having x points changes by:
+
+        added * (x < new_points) - removed * (x < old_points)
+
+    with added (resp. removed) meaning no other user have exactly
+    new_points (resp. old_points).
+    """
+    others = UserInfo.objects.filter(rank__isnull=False).exclude(pk=exclude_pk)
+    added = new_points is not None and not others.filter(points=new_points).exists()
+    removed = old_points is not None and not others.filter(points=old_points).exists()
+
+    def shift(queryset, delta):
+        if delta:
+            queryset.update(rank=F("rank") + delta)
+
+    if old_points is None or new_points is None:
+        if added:
+            shift(others.filter(points__lt=new_points), 1)
+        if removed:
+            shift(others.filter(points__lt=old_points), -1)
+        return
+    if old_points == new_points:
+        return
+    low, high = sorted((old_points, new_points))
+    shift(others.filter(points__lt=low), added - removed)
+    shift(
+        others.filter(points__gte=low, points__lt=high),
+        added if new_points > old_points else -removed,
+    )
+
+
+@receiver(pre_delete, sender=UserInfo)
+def lock_ranks_on_delete(sender, instance, **kwargs):  # pylint: disable=unused-argument
+    if instance.rank is not None:
+        lock_ranks()  # Sent in the deletion transaction, before deleting.
+
+
+@receiver(post_delete, sender=UserInfo)
+def update_ranks_on_delete(
+    sender, instance, **kwargs
+):  # pylint: disable=unused-argument
+    if instance.rank is not None:
+        shift_ranks(
+            instance._ranked_points,  # pylint: disable=protected-access
+            None,
+            exclude_pk=instance.pk,
+        )
+
 
 class Page(models.Model):
     slug = models.CharField(max_length=64)
@@ -171,7 +442,8 @@ class ExerciseQuerySet(models.QuerySet):
             exercise.position = (
                 1 + max_solves - exercise.successes + i / number_of_exercises
             )
-            exercise.save()
+        Exercise.objects.bulk_update(all_exercises, ["position"], batch_size=1000)
+        transaction.on_commit(navigation.invalidate)
 
     def with_global_stats(self):
         return self.annotate(
@@ -194,50 +466,74 @@ class ExerciseQuerySet(models.QuerySet):
             ),
         )
 
-    def with_monthly_stats(self):
+    def with_check_costs(self, days=30):
+        """Annotate the cost of the checks of the last days (see
+        CorrectionTimingQuerySet.check_costs), check_timeouts being a
+        count, not a rate.
+        """
+        checks = (
+            CorrectionTiming.objects.filter(
+                exercise=OuterRef("pk"),
+                check_time__isnull=False,
+                recorded_at__gt=now() - timedelta(days=days),
+            )
+            .order_by()
+            .values("exercise")
+        )
+
+        def aggregate(expression):
+            return Subquery(checks.annotate(value=expression).values("value"))
+
         return self.annotate(
-            last_month_tries=Count(
-                "answers__user",
-                filter=Q(
-                    answers__created_at__gt=now() - timedelta(days=30),
-                    answers__user__is_staff=False,
-                ),
-                distinct=True,
-            ),
-            prev_month_tries=Count(
-                "answers__user",
-                filter=Q(
-                    answers__created_at__gt=now() - timedelta(days=60),
-                    answers__created_at__lt=now() - timedelta(days=30),
-                    answers__user__is_staff=False,
-                ),
-                distinct=True,
-            ),
-            last_month_successes=Count(
-                "answers__user",
-                filter=Q(
-                    answers__is_valid=True,
-                    answers__user__is_staff=False,
-                    answers__created_at__gt=now() - timedelta(days=30),
-                ),
-                distinct=True,
-            ),
-            prev_month_successes=Count(
-                "answers__user",
-                filter=Q(
-                    answers__is_valid=True,
-                    answers__user__is_staff=False,
-                    answers__created_at__gt=now() - timedelta(days=60),
-                    answers__created_at__lt=now() - timedelta(days=30),
+            check_runs=aggregate(Count("pk")),
+            check_wall_time=aggregate(Avg("check_time")),
+            check_cpu_time=aggregate(Avg("check_cpu_time")),
+            check_max_rss=aggregate(Avg("check_max_rss")),
+            check_timeouts=aggregate(Count("pk", filter=Q(timed_out=True))),
+        )
+
+    def with_monthly_stats(self):
+        """Annotate tries and successes of the last 30 days, and of the
+        30 days before, in user-days, from the ExerciseDailyStats
+        rollup (so as of its last run).
+        """
+        today = localdate()
+
+        def total(field, days_ago_from, days_ago_to):
+            return Coalesce(
+                Subquery(
+                    ExerciseDailyStats.objects.filter(
+                        exercise=OuterRef("pk"),
+                        date__gt=today - timedelta(days=days_ago_from),
+                        date__lte=today - timedelta(days=days_ago_to),
+                    )
+                    .order_by()
+                    .values("exercise")
+                    .annotate(total=Sum(field))
+                    .values("total")
                 ),
-                distinct=True,
-            ),
+                0,
+            )
+
+        return self.annotate(
+            last_month_user_days_tried=total("tries", 30, 0),
+            prev_month_user_days_tried=total("tries", 60, 30),
+            last_month_user_days_solved=total("successes", 30, 0),
+            prev_month_user_days_solved=total("successes", 60, 30),
         )
 
-    def recompute_solved_by(self):
-        for exercise in self.with_global_stats():
-            exercise.solved_by = exercise.successes
-            exercise.save()
+    def compute_solved_by(self):
+        """Returns a {exercise_id: solved_by} dict, in a single query."""
+        return dict(self.with_global_stats().values_list("pk", "successes"))
+
+    def recompute_solved_by(self, batch_size=1000):
+        solved_by = self.compute_solved_by()
+        to_update = []
+        for exercise in self.only("pk", "solved_by"):
+            if exercise.solved_by != solved_by[exercise.pk]:
+                exercise.solved_by = solved_by[exercise.pk]
+                to_update.append(exercise)
+        Exercise.objects.bulk_update(to_update, ["solved_by"], batch_size=batch_size)
 
 
 class Exercise(models.Model):
@@ -253,12 +549,17 @@ class Exercise(models.Model):
     # check is ran inside the sandbox, in a `check.py` file, near a
     # `solution` file containing the student code.
     check_py = models.TextField(blank=True, default="")
+    # A deterministic check always gives the same result for the same
+    # answer, so its results can be cached (see hkis.tasks.cached_check_answer).
+    check_is_deterministic = models.BooleanField(default=False)
     is_published = models.BooleanField(default=False)
     wording = models.TextField(blank=True, default="")
     initial_solution = models.TextField(blank=True, default="")
     position = models.FloatField(default=0)
     objects = ExerciseQuerySet.as_manager()
     created_at = models.DateTimeField(auto_now_add=True)
+    # Not touched by queryset updates, like solved_by or position ones.
+    updated_at = models.DateTimeField(auto_now=True)
     # Number of points are granted for solving this exercise
     points = models.IntegerField(default=1)
     category = models.ForeignKey(
@@ -269,14 +570,78 @@ class Exercise(models.Model):
     # This could, or not, count solves by non-logged users
     # I did not made my mind yet.
     solved_by = models.IntegerField(default=0)
+    # Set when check_py or pre_check_py change, to compare the cost of
+    # the checks before and after (see check_cost_regression).
+    check_edited_at = models.DateTimeField(blank=True, null=True, editable=False)
+    # What got costlier since check_edited_at, empty if nothing did.
+    check_cost_regression = models.CharField(
+        max_length=255, blank=True, default="", editable=False
+    )
+
+    # (check_py, pre_check_py) as loaded from the database.
+    _saved_check: Optional[tuple] = None
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        if "check_py" in instance.__dict__ and "pre_check_py" in instance.__dict__:
+            instance._saved_check = (instance.check_py, instance.pre_check_py)
+        return instance
+
+    def save(self, *args, **kwargs):
+        check = (self.check_py, self.pre_check_py)
+        if self._saved_check is not None and self._saved_check != check:
+            self.check_edited_at = now()
+            self.check_cost_regression = ""
+        self._saved_check = check
+        super().save(*args, **kwargs)
+
+    def find_check_cost_regression(self, min_runs: int = 20) -> str:
+        """Compare the cost of the checks since check_edited_at to the
+        ones before, describe what got costlier, if anything.
+        """
+        if not self.check_edited_at:
+            return ""
+        timings = CorrectionTiming.objects.filter(exercise=self)
+        before = timings.filter(recorded_at__lt=self.check_edited_at).check_costs()
+        after = timings.filter(recorded_at__gte=self.check_edited_at).check_costs()
+        if before["runs"] < min_runs or after["runs"] < min_runs:
+            return ""
+        ratio = getattr(settings, "HKIS_CHECK_COST_REGRESSION_RATIO", 1.5)
+        regressions = []
+        for name, key, minimum, unit in (
+            ("CPU time", "cpu_time", 0.1, "{:.2f}s"),
+            ("wall time", "wall_time", 0.1, "{:.2f}s"),
+            ("peak RSS", "max_rss", 10_240, "{:.0f}KiB"),
+        ):
+            if before[key] is None or after[key] is None:
+                continue
+            if after[key] > before[key] * ratio and after[key] - before[key] > minimum:
+                regressions.append(
+                    f"{name} {unit.format(before[key])} → {unit.format(after[key])}"
+                )
+        if after["timeout_rate"] - before["timeout_rate"] > 0.05:
+            regressions.append(
+                f"timeouts {before['timeout_rate']:.0%} → {after['timeout_rate']:.0%}"
+            )
+        return ", ".join(regressions)
 
     def shared_solutions(self):
-        return Answer.objects.filter(
-            exercise=self, is_valid=True, is_shared=True
-        ).order_by("-user__hkis__points")
+        return (
+            Answer.objects.filter(exercise=self, is_valid=True, is_shared=True)
+            .order_by("-user__hkis__points")
+            .select_related("user")
+        )
 
     def is_solved_by(self, user):
-        return self.answers.filter(user=user, is_valid=True).exists()
+        return self.statuses.filter(user=user, solved=True).exists()
+
+    def points_for(self, first_try_at) -> float:
+        """Points granted to a user solving this exercise, given the
+        date of its first try (see UserInfo.compute_points).
+        """
+        time_to_solve = (first_try_at - self.created_at).total_seconds()
+        return self.points - (time_to_solve**0.001 - 1)
 
     def clean(self):
         """Clean windows-style newlines, maybe inserted by Ace editor, or
@@ -307,6 +672,102 @@ class Exercise(models.Model):
         return self.title
 
 
+@receiver(post_save, sender=Exercise)
+@receiver(post_delete, sender=Exercise)
+@receiver(post_save, sender=Page)
+@receiver(post_delete, sender=Page)
+def invalidate_navigation(sender, **kwargs):  # pylint: disable=unused-argument
+    # Once committed, so other processes can't rebuild from old data.
+    transaction.on_commit(navigation.invalidate)
+
+
+class RenderedMarkdownQuerySet(models.QuerySet):
+    def render(self, texts: List[str]) -> List[str]:
+        """Render texts (see hkis.utils.render_markdown), reusing stored
+        renders, rendering the others in memory.
+
+        Doesn't write: it's used by page views, renders are stored when
+        texts are saved, or by `./manage.py render_markdown`.
+        """
+        digests = [markdown_digest(text) for text in texts]
+        stored = dict(self.filter(digest__in=digests).values_list("digest", "html"))
+        return [
+            stored[digest] if digest in stored else render_markdown(text)
+            for digest, text in zip(digests, texts)
+        ]
+
+    def store(self, texts: List[str]) -> int:
+        """Render and store the texts not stored yet.
+
+        Returns the number of texts rendered.
+        """
+        digests = {markdown_digest(text): text for text in texts}
+        missing = digests.keys() - set(
+            self.filter(digest__in=digests).values_list("digest", flat=True)
+        )
+        created = self.bulk_create(
+            [
+                RenderedMarkdown(digest=digest, html=render_markdown(digests[digest]))
+                for digest in missing
+            ],
+            ignore_conflicts=True,
+        )
+        return len(created)
+
+    def current_texts(self) -> List[str]:
+        """All translations of the wordings and page bodies."""
+        texts: List[str] = []
+        for model, field in (Exercise, "wording"), (Page, "body"):
+            fields = [f"{field}_{language}" for language, _ in settings.LANGUAGES]
+            for row in model.objects.values_list(*fields):
+                texts.extend(text for text in row if text)
+        return texts
+
+    def unreferenced(self):
+        """Renders of no current wording or page body: of edited
+        texts, or by another version of the renderer.
+        """
+        return self.exclude(
+            digest__in={markdown_digest(text) for text in self.current_texts()}
+        )
+
+
+class RenderedMarkdown(models.Model):
+    """HTML render of a markdown text, by the sha256 of the text and
+    of the renderer version (see hkis.utils.markdown_digest).
+
+    Renders don't depend on the language, only on the text, so a
+    single entry is shared by identical translations.
+
+    Texts are rendered when saved, and by `./manage.py render_markdown`
+    after a change of the renderer version: until then, views render
+    them in memory. Renders of edited texts are left behind,
+    `./manage.py prune_rendered_markdown` deletes them.
+    """
+
+    digest = models.CharField(max_length=64, primary_key=True)
+    html = models.TextField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    objects = RenderedMarkdownQuerySet.as_manager()
+
+
+@receiver(post_save, sender=Exercise)
+@receiver(post_save, sender=Page)
+def render_markdown_on_save(
+    sender, instance, raw=False, **kwargs
+):  # pylint: disable=unused-argument
+    """Render all translations of wordings and page bodies in advance."""
+    if raw:  # Loading fixtures
+        return
+    field = "wording" if sender is Exercise else "body"
+    texts = [
+        getattr(instance, f"{field}_{language}", None)
+        for language, _ in settings.LANGUAGES
+    ]
+    RenderedMarkdown.objects.store([text for text in texts if text])
+
+
 class Answer(models.Model):
     class Meta:
         indexes = [
@@ -327,6 +788,8 @@ class Answer(models.Model):
     is_valid = models.BooleanField(default=False, verbose_name="Valid")
     is_shared = models.BooleanField(default=False, verbose_name="Shared")
     correction_message = models.TextField(default="", blank=True)
+    # Rendered once, when the correction message is saved.
+    correction_message_html = models.TextField(default="", blank=True, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
     corrected_at = models.DateTimeField(blank=True, null=True)
     is_unhelpfull = models.BooleanField(
@@ -337,6 +800,9 @@ class Answer(models.Model):
         default=False, blank=True
     )  # If answer can be used without sandboxing for test purposes. To be set manually.
 
+    # correction_message at the time of the last render.
+    _rendered_message: Optional[str] = ""
+
     def short_correction_message(self):
         return truncatechars(self.correction_message.strip().split("\n")[0], 100)
 
@@ -347,28 +813,475 @@ class Answer(models.Model):
     def get_absolute_url(self):
         return self.exercise.get_absolute_url() + "?view_as=" + str(self.user.id)
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._rendered_message = instance.__dict__.get("correction_message")
+        return instance
+
+    def render_correction_message(self) -> bool:
+        """Render correction_message if it changed since last render, or
+        was never rendered (answers corrected before
+        correction_message_html existed).
+
+        Returns True if it had to be rendered.
+        """
+        if self.correction_message == self._rendered_message and (
+            self.correction_message_html or not self.correction_message
+        ):
+            return False
+        self.correction_message_html = render_correction_message(
+            self.correction_message
+        )
+        self._rendered_message = self.correction_message
+        return True
+
     def save(self, *args, **kwargs):
         if self.correction_message and self.correction_message.startswith("Traceback"):
             self.is_unhelpfull = True
+        self.render_correction_message()
+        created = self._state.adding
         super().save(*args, **kwargs)
+        if created:
+            ExerciseStatus.objects.record_attempt(self)
 
-    def send_to_correction_bot(self, lang="en"):
-        from hkis.tasks import check_answer  # pylint: disable=import-outside-toplevel
-
-        sync_check_answer = async_to_sync(check_answer)
-        is_valid, message = sync_check_answer(
-            {
-                "check": self.exercise.check_py,
-                "pre_check": self.exercise.pre_check_py,
-                "source_code": self.source_code,
-                "language": lang,
-            }
-        )
-        self.correction_message = message
+    def set_correction(self, is_valid: bool, correction_message: str):
+        """Set the correction fields, without saving them."""
+        self.correction_message = correction_message
         self.is_corrected = True
         self.is_valid = is_valid
         self.corrected_at = now()
-        self.save()
+        if correction_message.startswith("Traceback"):
+            self.is_unhelpfull = True
+        self.render_correction_message()
+
+    def save_correction(self, is_valid: bool, correction_message: str) -> bool:
+        """Store the result of a correction.
+
+        On the first valid answer of a user for an exercise, the
+        exercise points are added to the user points, and the
+        exercise solved_by counter is incremented, each using a single
+        UPDATE. They're taken back if the only valid answer of the user
+        turns invalid (see update_solve).
+
+        Returns True if this answer is the first solve.
+        """
+        with transaction.atomic():
+            userinfo = self.lock_author(is_valid)
+            self.set_correction(is_valid, correction_message)
+            self.save()
+            return self.update_solve(userinfo)
+
+    def lock_author(self, is_valid: bool) -> Optional["UserInfo"]:
+        """Before storing a correction, in a transaction, lock the
+        UserInfo of the author, if the correction can change whether
+        the exercise is solved (see update_solve).
+
+        Returns the locked UserInfo, None if the correction can't
+        change anything, like invalid answers of unsolved exercises.
+        """
+        if not self.user_id:
+            return None
+        solved = ExerciseStatus.objects.filter(
+            user_id=self.user_id, exercise_id=self.exercise_id, solved=True
+        ).exists()
+        if not is_valid and not solved:
+            return None
+        if is_valid != solved:
+            # May be solved or unsolved, moving the user in the
+            # leaderboard (see lock_ranks).
+            lock_ranks()
+        UserInfo.objects.get_or_create(user_id=self.user_id)
+        # Locking the UserInfo row serializes concurrent corrections
+        # for this user, so only one of them can be seen as the first
+        # solve.
+        return UserInfo.objects.select_for_update().get(user_id=self.user_id)
+
+    def update_solve(self, userinfo: Optional["UserInfo"]) -> bool:
+        """Once a correction is saved, mark the exercise solved, or not
+        solved anymore, for the author of this answer, granting or
+        taking back the exercise points and the solved_by count.
+
+        This is the only way ExerciseStatus.solved changes: saving an
+        answer otherwise (API, admin) doesn't grant points.
+
+        userinfo is the author UserInfo, locked by lock_author.
+
+        Returns True if this answer is the first solve.
+        """
+        if userinfo is None:
+            return False
+        if self.is_valid:
+            if not ExerciseStatus.objects.solve(self):
+                return False
+            change = 1
+            userinfo.add_solve(self.exercise)
+        else:
+            if not ExerciseStatus.objects.unsolve(self):
+                return False
+            change = -1
+            userinfo.remove_solve(self.exercise)
+        Exercise.objects.filter(pk=self.exercise_id).update(
+            solved_by=F("solved_by") + change
+        )
+        return change > 0
+
+
+class ExerciseStatusQuerySet(models.QuerySet):
+    def record_attempt(self, answer: "Answer") -> None:
+        """Count a new answer in the status of its author on its exercise."""
+        if not answer.user_id:
+            return
+        _, created = self.get_or_create(
+            user_id=answer.user_id,
+            exercise_id=answer.exercise_id,
+            defaults={"attempts": 1, "last_answer_id": answer.id},
+        )
+        if not created:
+            self.filter(user_id=answer.user_id, exercise_id=answer.exercise_id).update(
+                attempts=F("attempts") + 1, last_answer_id=answer.id
+            )
+
+    def solve(self, answer: "Answer") -> bool:
+        """Mark the exercise of a valid answer solved by its author.
+
+        Returns True if it was not solved yet: as it's a single UPDATE,
+        only one answer can switch it to solved.
+        """
+        return bool(
+            self.filter(
+                user_id=answer.user_id, exercise_id=answer.exercise_id, solved=False
+            ).update(solved=True, first_solved_at=answer.created_at)
+        )
+
+    def unsolve(self, answer: "Answer") -> bool:
+        """Mark the exercise of an answer found invalid not solved by
+        its author anymore, unless another answer of the author is
+        valid.
+
+        Returns True if it was solved.
+        """
+        if Answer.objects.filter(
+            user_id=answer.user_id, exercise_id=answer.exercise_id, is_valid=True
+        ).exists():
+            return False
+        return bool(
+            self.filter(
+                user_id=answer.user_id, exercise_id=answer.exercise_id, solved=True
+            ).update(solved=False, first_solved_at=None)
+        )
+
+
+class ExerciseStatus(models.Model):
+    """Summary of the answers of a user on an exercise, so we don't
+    have to scan all of them.
+
+    A status is created with the first answer, so there's no "tried"
+    field: all statuses are tried ones.
+
+    An exercise is solved once a correction finds an answer valid, and
+    not anymore once a correction finds the last valid answer invalid,
+    along with the points (see Answer.update_solve).
+    """
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="+")
+    exercise = models.ForeignKey(
+        Exercise, on_delete=models.CASCADE, related_name="statuses"
+    )
+    solved = models.BooleanField(default=False)
+    first_solved_at = models.DateTimeField(blank=True, null=True)
+    attempts = models.PositiveIntegerField(default=0)
+    last_answer = models.ForeignKey(
+        "Answer", on_delete=models.SET_NULL, blank=True, null=True, related_name="+"
+    )
+
+    objects = ExerciseStatusQuerySet.as_manager()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["user", "exercise"], name="unique_exercise_status"
+            )
+        ]
+
+    def __str__(self):
+        return f"{self.user} on {self.exercise}"
+
+
+class ExerciseDailyStatsQuerySet(models.QuerySet):
+    def rollup(self, since=None, exercise_ids=None) -> int:
+        """Count the tries and successes of each day from `since`
+        (defaults to HKIS_ROLLUP_DAYS days ago) to today, of all
+        exercises or of the given ones.
+
+        Whole days are counted again, replacing their rows, so answers
+        corrected late are counted, and a user is counted once a day.
+        Only answers after the last one of the previous days are read.
+
+        Returns the number of (exercise, day) rows written.
+        """
+        if since is None:
+            since = localdate() - timedelta(
+                days=getattr(settings, "HKIS_ROLLUP_DAYS", 3) - 1
+            )
+        with transaction.atomic():
+            # Concurrent rollups would both insert the rows of a day.
+            advisory_lock(ROLLUP_LOCK_ID)
+            read_after = self.filter(date__lt=since).aggregate(Max("last_answer_id"))
+            answers = Answer.objects.filter(
+                id__gt=read_after["last_answer_id__max"] or 0,
+                created_at__gte=make_aware(
+                    datetime.datetime.combine(since, datetime.time.min)
+                ),
+                user__is_staff=False,
+            )
+            replaced = self.filter(date__gte=since)
+            if exercise_ids is not None:
+                answers = answers.filter(exercise_id__in=exercise_ids)
+                replaced = replaced.filter(exercise_id__in=exercise_ids)
+            rows = [
+                ExerciseDailyStats(**row)
+                for row in answers.annotate(date=TruncDate("created_at"))
+                .values("exercise_id", "date")
+                .annotate(
+                    tries=Count("user", distinct=True),
+                    successes=Count("user", filter=Q(is_valid=True), distinct=True),
+                    last_answer_id=Max("id"),
+                )
+                .order_by()
+            ]
+            replaced.delete()
+            self.bulk_create(rows, batch_size=1000)
+        return len(rows)
+
+    def series(self, exercise_ids, period: str, count: int) -> Dict[int, List[int]]:
+        """Tries of each exercise per "week" or "quarter" (period), over
+        the last `count` ones, oldest first, in a single query.
+        """
+        today = localdate()
+        if period == "week":
+            trunc, start = TruncWeek("date"), today - timedelta(weeks=count - 1)
+            start -= timedelta(days=start.weekday())
+        else:
+            trunc = TruncQuarter("date")
+            first = today.year * 4 + (today.month - 1) // 3 - (count - 1)
+            start = datetime.date(first // 4, first % 4 * 3 + 1, 1)
+        series = {exercise_id: [0] * count for exercise_id in exercise_ids}
+        for exercise_id, period_start, tries in (
+            self.filter(exercise_id__in=exercise_ids, date__gte=start)
+            .annotate(period=trunc)
+            .values("exercise_id", "period")
+            .annotate(tries=Sum("tries"))
+            .values_list("exercise_id", "period", "tries")
+            .order_by()
+        ):
+            if period == "week":
+                index = (period_start - start).days // 7
+            else:
+                index = (period_start.year - start.year) * 4 + (
+                    period_start.month - start.month
+                ) // 3
+            series[exercise_id][index] = tries
+        return series
+
+
+class ExerciseDailyStats(models.Model):
+    """Tries and successes on an exercise during a day: how many
+    distinct users (staff aside) answered it, and answered it right.
+
+    Filled by rollup (see hkis.tasks.rollup_exercise_stats_task), so
+    the admin doesn't have to count distinct users over all answers.
+    Summed over several days, they count user-days: a user trying on
+    two days counts twice.
+    """
+
+    exercise = models.ForeignKey(
+        Exercise, on_delete=models.CASCADE, related_name="daily_stats"
+    )
+    date = models.DateField()
+    tries = models.PositiveIntegerField(default=0)
+    successes = models.PositiveIntegerField(default=0)
+    # Last answer of the day, rollups of the next days read answers after it.
+    last_answer_id = models.BigIntegerField(default=0)
+
+    objects = ExerciseDailyStatsQuerySet.as_manager()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["exercise", "date"], name="unique_exercise_date"
+            )
+        ]
+
+    def __str__(self):
+        return f"{self.exercise_id} on {self.date}"
+
+
+# Durations, in seconds, shown as columns in CorrectionTiming histograms.
+TIMING_BUCKETS = (0.01, 0.05, 0.1, 0.5, 1, 5, 20)
+
+
+class CorrectionTimingQuerySet(models.QuerySet):
+    def histograms(self, limit: int = 1_000) -> Dict[str, dict]:
+        """Per stage, and in total, over the last `limit` corrections:
+        the count of durations below each of TIMING_BUCKETS (the last
+        count being above all of them), the median, and the 90th
+        percentile.
+        """
+        fields = [f"{stage}_time" for stage in CorrectionTiming.STAGES]
+        rows = list(self.order_by("-recorded_at").values_list(*fields)[:limit])
+        columns = list(zip(*rows)) or [()] * len(fields)
+        totals = [sum(filter(None, row)) for row in rows]
+        histograms = {}
+        for stage, column in zip(
+            CorrectionTiming.STAGES + ("total",), columns + [totals]
+        ):
+            durations = sorted(value for value in column if value is not None)
+            buckets = [0] * (len(TIMING_BUCKETS) + 1)
+            for duration in durations:
+                buckets[bisect_left(TIMING_BUCKETS, duration)] += 1
+            histograms[stage] = {
+                "buckets": buckets,
+                "p50": durations[len(durations) // 2] if durations else None,
+                "p90": durations[len(durations) * 9 // 10] if durations else None,
+            }
+        return histograms
+
+    def check_costs(self, limit: int = 1_000) -> dict:
+        """Over the last `limit` checks (correction cache hits aside):
+        mean wall time, CPU time, and peak RSS (in KiB), and the rate
+        of timeouts.
+        """
+        costs = (
+            self.filter(check_time__isnull=False)
+            .order_by("-recorded_at")[:limit]
+            .aggregate(
+                runs=Count("pk"),
+                wall_time=Avg("check_time"),
+                cpu_time=Avg("check_cpu_time"),
+                max_rss=Avg("check_max_rss"),
+                timeouts=Count("pk", filter=Q(timed_out=True)),
+            )
+        )
+        costs["timeout_rate"] = (
+            costs["timeouts"] / costs["runs"] if costs["runs"] else 0
+        )
+        return costs
+
+
+class CorrectionTiming(models.Model):
+    """Seconds spent in each stage of the correction of an answer (see
+    hkis.tasks.span), to tell why a correction was slow.
+
+    A stage that didn't run is null, like the check on a correction
+    cache hit, or the answer creation when recorrecting.
+    """
+
+    STAGES = (
+        "create",  # Storing the answer, consumer side.
+        "queue",  # Waiting for a correction worker.
+        "pre_check",
+        "sandbox",  # Preparing (or starting) the sandbox.
+        "check",
+        "render",  # Rendering the correction message.
+        "save",  # Saving it, with points and ranks.
+        "send",  # Sending it over the channel layer.
+    )
+
+    answer = models.OneToOneField(
+        Answer, on_delete=models.CASCADE, primary_key=True, related_name="timing"
+    )
+    exercise = models.ForeignKey(Exercise, on_delete=models.CASCADE, related_name="+")
+    recorded_at = models.DateTimeField(auto_now_add=True)
+    create_time = models.FloatField(blank=True, null=True)
+    queue_time = models.FloatField(blank=True, null=True)
+    pre_check_time = models.FloatField(blank=True, null=True)
+    sandbox_time = models.FloatField(blank=True, null=True)
+    check_time = models.FloatField(blank=True, null=True)
+    render_time = models.FloatField(blank=True, null=True)
+    save_time = models.FloatField(blank=True, null=True)
+    send_time = models.FloatField(blank=True, null=True)
+    # Resource usage of the check, and its children.
+    check_cpu_time = models.FloatField(blank=True, null=True)
+    check_max_rss = models.PositiveIntegerField(blank=True, null=True)  # In KiB
+    timed_out = models.BooleanField(default=False)
+
+    objects = CorrectionTimingQuerySet.as_manager()
+
+    class Meta:
+        indexes = [models.Index(fields=["exercise", "-recorded_at"])]
+
+    @classmethod
+    def record(cls, answer: Answer, spans: Dict[str, float]):
+        """Store spans, and the check resource usage (see
+        hkis.tasks.record_usage), unless already stored: timings are
+        those of the first correction of an answer, so recorrecting old
+        answers doesn't pass them for checks ran after an edit of the
+        check (see Exercise.find_check_cost_regression).
+        """
+        cls.objects.bulk_create(
+            [
+                cls(
+                    answer=answer,
+                    exercise_id=answer.exercise_id,
+                    check_cpu_time=spans.get("cpu_time"),
+                    check_max_rss=spans.get("max_rss"),
+                    timed_out=bool(spans.get("timed_out")),
+                    **{f"{stage}_time": spans.get(stage) for stage in cls.STAGES},
+                )
+            ],
+            ignore_conflicts=True,
+        )
+
+
+class CorrectionJob(models.Model):
+    """Answers sent to the correction bot from the admin, checked on
+    the bulk lane (see hkis.tasks.recorrect_answers_task).
+    """
+
+    created_by = models.ForeignKey(
+        User, on_delete=models.SET_NULL, null=True, blank=True
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(blank=True, null=True)
+    total = models.PositiveIntegerField(default=0)
+    done = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return f"Correction of {self.total} answers"
+
+    @classmethod
+    def start(cls, answer_ids: List[int], user=None, lang="en") -> "CorrectionJob":
+        """Split answers between HKIS_RECORRECTION_CONCURRENCY tasks,
+        sent once committed, so workers can't miss the job.
+        """
+        from hkis.tasks import (  # pylint: disable=import-outside-toplevel
+            recorrect_answers_task,
+        )
+
+        job = cls.objects.create(created_by=user, total=len(answer_ids))
+        concurrency = getattr(settings, "HKIS_RECORRECTION_CONCURRENCY", 8)
+
+        def send():
+            for i in range(min(concurrency, len(answer_ids))):
+                recorrect_answers_task.apply_async(
+                    (job.id, answer_ids[i::concurrency], lang),
+                    {"sent_at": time.time()},
+                    queue="bulk",
+                    ignore_result=True,
+                )
+
+        transaction.on_commit(send)
+        return job
+
+    def add_done(self, count: int):
+        CorrectionJob.objects.filter(pk=self.pk).update(done=F("done") + count)
+        CorrectionJob.objects.filter(
+            pk=self.pk, done__gte=F("total"), finished_at__isnull=True
+        ).update(finished_at=now())
+
+    def progress(self) -> str:
+        return f"{self.done} / {self.total}"
 
 
 class Vote(models.Model):
@@ -392,9 +1305,63 @@ class TeamQuerySet(models.QuerySet):
             Q(membership__role=Membership.Role.STAFF) & Q(membership__user=user)
         )
 
-    def recompute_ranks(self):  # pylint: disable=no-self-use
-        for team in Team.objects.all():
-            team.recompute_rank()
+    def compute_points(self, user_points=None):
+        """Compute the points of all teams (as Team.recompute_rank) in
+        a single query over memberships.
+
+        user_points can be given as a {user_id: points} dict to
+        override the stored user points.
+
+        Returns a {team_id: points} dict.
+        """
+        members_points: Dict[int, List[float]] = {team.pk: [] for team in self}
+        for team_id, user_id, points in Membership.objects.filter(
+            team__in=self,
+            role__in=(Membership.Role.STAFF, Membership.Role.MEMBER),
+            user__hkis__isnull=False,
+        ).values_list("team_id", "user_id", "user__hkis__points"):
+            if user_points is not None:
+                points = user_points.get(user_id, 0.0)
+            members_points[team_id].append(points)
+        return {
+            team_id: team_points(sorted(points))
+            for team_id, points in members_points.items()
+        }
+
+    def recompute_ranks(self, batch_size=1000):
+        points = self.compute_points()
+        to_update = []
+        for team in self.only("pk", "points"):
+            if team.points != points[team.pk]:
+                team.points = points[team.pk]
+                to_update.append(team)
+        Team.objects.bulk_update(to_update, ["points"], batch_size=batch_size)
+
+
+def team_points(members_points: Iterable[float]) -> float:
+    """Try to mix member score to get a representative team score.
+
+    members_points have to be sorted in ascending order.
+    """
+    values = 0.0
+    weights = 1  # Won't change much big teams, but penalize too-small teams.
+    i = 1
+    for points in members_points:
+        values += points * i
+        weights += i
+        i += i
+    return values / weights
+
+
+class ExerciseStat(NamedTuple):
+    """A cell of Team.exercise_stats."""
+
+    is_tried: bool
+    is_valid: bool
+    last_answer: Optional[int]
+
+
+NOT_TRIED = ExerciseStat(False, False, None)
 
 
 class Team(models.Model):
@@ -408,24 +1375,14 @@ class Team(models.Model):
 
     def recompute_rank(self):
         """Try to mix member score to get a representative team score."""
-        values = 0
-        weights = 1  # Won't change much big teams, but penalize too-small teams.
-        i = 1
-        for member in (
+        self.points = team_points(
             self.membership_set.filter(
                 Q(role=Membership.Role.STAFF) | Q(role=Membership.Role.MEMBER)
             )
             .filter(user__hkis__isnull=False)
-            .select_related("user__hkis")
             .order_by("user__hkis__points")
-        ):
-            values += member.user.hkis.points * i
-            weights += i
-            i += i
-        try:
-            self.points = values / weights
-        except ZeroDivisionError:
-            self.points = 0
+            .values_list("user__hkis__points", flat=True)
+        )
         self.save()
 
     def is_staff(self, user):
@@ -488,6 +1445,33 @@ class Team(models.Model):
             .select_related("user__hkis")
         )
 
+    def exercise_stats(self):
+        """Members x exercises matrix, from a single query on statuses.
+
+        Returns the exercises, and the list of cells of each member,
+        by username.
+        """
+        exercises = list(Exercise.objects.order_by("position").only("id", "slug"))
+        columns = {exercise.id: i for i, exercise in enumerate(exercises)}
+        members = list(
+            User.objects.filter(teams=self)
+            .order_by("-hkis__points")
+            .values_list("id", "username")
+        )
+        rows = {user_id: [NOT_TRIED] * len(exercises) for user_id, _ in members}
+        for (
+            user_id,
+            exercise_id,
+            solved,
+            last_answer_id,
+        ) in ExerciseStatus.objects.filter(user__teams=self).values_list(
+            "user_id", "exercise_id", "solved", "last_answer_id"
+        ):
+            rows[user_id][columns[exercise_id]] = ExerciseStat(
+                True, solved, last_answer_id
+            )
+        return exercises, {username: rows[user_id] for user_id, username in members}
+
     def __str__(self):
         return self.name
 
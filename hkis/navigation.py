@@ -0,0 +1,67 @@
+"""Previous and next links between published exercises of a page.
+
+The index is kept in memory by each process, and rebuilt when the
+version stored in the Django cache changes, so saving an exercise in
+one process invalidates the index of all of them (the cache being
+shared by all processes, see CACHES).
+"""
+
+from typing import Dict, NamedTuple, Optional, Tuple
+from uuid import uuid4
+
+from django.core.cache import cache
+from django.urls import reverse
+
+VERSION_KEY = "hkis:navigation:version"
+
+
+class ExerciseLink(NamedTuple):
+    slug: str
+    url: str
+
+    def get_absolute_url(self):
+        return self.url
+
+
+Neighbours = Tuple[Optional[ExerciseLink], Optional[ExerciseLink]]
+
+_index: Dict[int, Neighbours] = {}
+_index_version: Optional[str] = None
+
+
+def build_index() -> Dict[int, Neighbours]:
+    """Build the {exercise_id: (previous, next)} index, in a single query."""
+    from hkis.models import Exercise  # pylint: disable=import-outside-toplevel
+
+    index: Dict[int, Neighbours] = {}
+    previous: Optional[Tuple[int, int, ExerciseLink]] = None
+    for exercise_id, page_id, slug, page_slug in (
+        Exercise.objects.filter(is_published=True)
+        .order_by("page_id", "position")
+        .values_list("id", "page_id", "slug", "page__slug")
+    ):
+        link = ExerciseLink(slug, reverse("exercise", args=[page_slug, slug]))
+        index[exercise_id] = (None, None)
+        if previous and previous[1] == page_id:
+            index[exercise_id] = (previous[2], None)
+            index[previous[0]] = (index[previous[0]][0], link)
+        previous = (exercise_id, page_id, link)
+    return index
+
+
+def neighbours(exercise_id: int) -> Neighbours:
+    """Previous and next published exercises of the same page, if any."""
+    global _index, _index_version  # pylint: disable=global-statement
+    version = cache.get(VERSION_KEY)
+    if version is None or version != _index_version:
+        if version is None:
+            version = uuid4().hex
+            cache.add(VERSION_KEY, version, timeout=None)
+        _index = build_index()
+        _index_version = version
+    return _index.get(exercise_id, (None, None))
+
+
+def invalidate():
+    """Rebuild the index of all processes on their next lookup."""
+    cache.set(VERSION_KEY, uuid4().hex, timeout=None)
@@ -5,4 +5,5 @@ websocket_urlpatterns = [
     re_path(
         r"^ws/exercises/(?P<exercise_id>[0-9]+)/", consumers.ExerciseConsumer.as_asgi()
     ),
+    re_path(r"^ws/answers/", consumers.MultiplexConsumer.as_asgi()),
 ]
@@ -47,6 +47,7 @@ function fill_answer(answer) {
     if (!answer.is_corrected) {
         answer_box.className = "hkis-callout hkis-callout-info";
         answer_box.innerHTML = gettext("Waiting for correction...")
+        answer_box.dataset.answerId = answer.id;
         return;
     }
     var div = hkis.createElement("div", {innerHTML: answer.correction_message_html});
@@ -94,6 +95,19 @@ function fill_answer(answer) {
     unlock_button("submit_answer")
 }
 
+function fill_progress(progress) {
+    /* Checker output while the answer is being checked. */
+    var answer_box = document.getElementById("answer-box");
+    if (answer_box.dataset.answerId != progress.id)
+        return;
+    var pre = document.getElementById("answer-progress");
+    if (!pre) {
+        pre = hkis.createElement("pre", {id: "answer-progress"});
+        answer_box.appendChild(pre);
+    }
+    pre.textContent += progress.output;
+}
+
 function fill_message(message, type) {
     /* type in {"success", "danger", "warning", "info" } */
     console.log("[" + type + "]" + message);
@@ -120,6 +134,8 @@ function websocket_connect(ws_location) {
         console.log("WebSocket recv:", data);
         if (data.type == "answer.update")
             fill_answer(data);
+        if (data.type == "answer.progress")
+            fill_progress(data);
     };
     window.ws.onerror = function(event) {
         console.error("WebSocket error observed:", event);
@@ -129,6 +145,7 @@ function websocket_connect(ws_location) {
         connected = true;
         fill_message(gettext("Connected to correction server."), "success");
         window.ws.send(JSON.stringify({type: "settings", value: {LANGUAGE_CODE: settings.languageCode}}));
+        window.ws.send(JSON.stringify({type: "subscribe", exercise: Number(settings.exerciseId)}));
         document.querySelectorAll("td.answer-cell").forEach(function(answer) {
             if (answer.dataset.isCorrected == "True") return ;
             console.log("Need to correct answer number", answer.dataset.answerId);
@@ -148,7 +165,7 @@ function websocket_connect(ws_location) {
 }
 
 function ws_submit_answer(form) {
-    var message = {"type": "answer", "source_code": form["source_code"].value};
+    var message = {"type": "answer", "exercise": Number(settings.exerciseId), "source_code": form["source_code"].value};
     lock_button("submit_answer", 1);
     console.log("WebSocket send answer", message);
     window.ws.send(JSON.stringify(message));
@@ -195,7 +212,7 @@ var ws_protocol = window.location.protocol == "http:" ? "ws:" : "wss:";
 
 if (settings.isImpersonating == "false") {
     window.addEventListener("DOMContentLoaded", function (event) {
-        websocket_connect(ws_protocol + "//" + window.location.host + "/ws/exercises/" + settings.exerciseId + "/");
+        websocket_connect(ws_protocol + "//" + window.location.host + "/ws/answers/");
         document.addEventListener("keydown", shortcuts_handler);
     });
 }
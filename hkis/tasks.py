@@ -3,14 +3,34 @@ celery -A hkis.tasks worker
 """
 
 import asyncio
+import atexit
+import codecs
+import hashlib
+import json
+from collections import defaultdict, deque
+from contextlib import contextmanager, suppress
 from functools import partial
 from random import choice
 import os
+import resource
+import secrets
+import select
+import shutil
+import signal
 import tempfile
+import threading
+import time
 from subprocess import Popen, PIPE, run, STDOUT, TimeoutExpired, DEVNULL
 from logging import getLogger
+from typing import Callable, Deque, Dict, List, Optional, Tuple
 
+from asgiref.sync import async_to_sync
 from celery import Celery
+from channels.layers import get_channel_layer
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils.timezone import localdate
 
 app = Celery("hackinscience_org")
 app.config_from_object("django.conf:settings", namespace="CELERY")
@@ -18,6 +38,9 @@ app.autodiscover_tasks()
 
 logger = getLogger(__name__)
 
+# Seconds of CPU time a check can use before being killed.
+CHECK_CPU_LIMIT = 20
+
 FIREJAIL_OPTIONS = [
     "--quiet",
     "--net=none",
@@ -39,7 +62,7 @@ FIREJAIL_OPTIONS = [
     "--rlimit-fsize=32768",
     "--rlimit-nofile=100",
     "--rlimit-nproc=2000",
-    "--rlimit-cpu=20",
+    f"--rlimit-cpu={CHECK_CPU_LIMIT}",
     "--rlimit-as=1610612736",  # 1.5GB. correction_helper will cap
     # student code at 1GB, leaving some space for check.py to report
     # errors.
@@ -127,67 +150,901 @@ def run_pre_check(tmpdir, pre_check: str, env=None):
         )
 
 
-@app.task
-def check_answer_task(answer: dict):
-    """Executed on Celery workers.
-    answer should contain: check, source_code, and language.
+def firejail_command(tmpdir, *command):
+    """Build the command line running command in a sandbox."""
+    return ["firejail"] + FIREJAIL_OPTIONS + ["--private=" + tmpdir, *command]
+
+
+def clean_output(output: bytes) -> str:
+    return (
+        output.decode("UTF-8", "backslashreplace")
+        .replace("\u0000", r"\x00")
+        .replace(  # Simplify tracebacks by hiding the temporary directory
+            'File "' + os.path.expanduser("~/"), 'File "'
+        )
+    )[:65_536]
+
+
+def hit_cpu_limit(cpu_time: float) -> bool:
+    """Whether a check used all its CPU time, so was killed by the
+    kernel (see CHECK_CPU_LIMIT): it's how checks time out, their exit
+    code tells nothing as a check can exit with any code.
+
+    The kernel accounts CPU time by ticks, so a check killed at the
+    limit can show some milliseconds less.
+    """
+    return cpu_time >= CHECK_CPU_LIMIT - 0.1
+
+
+def check_result(returncode: int, output: bytes, language: str, timed_out=False):
+    """Build the (is_valid, message) result of a check from its exit
+    code and output."""
+    stdout = clean_output(output)
+    if timed_out:
+        return False, "Checker timed out, look for infinite loops maybe?"
+    if returncode == 0:
+        return True, stdout or congrats(language)
+    return False, stdout
+
+
+def write_answer(tmpdir, answer: dict):
+    with open(os.path.join(tmpdir, "check.py"), "w", encoding="UTF-8") as check_file:
+        check_file.write(answer["check"])
+    with open(os.path.join(tmpdir, "solution"), "w", encoding="UTF-8") as answer_file:
+        answer_file.write(answer["source_code"])
+
+
+# Ran (via python3 -c) in pre-spawned sandboxes: once correction_helper
+# is imported, wait for a token on stdin, fork a child running check.py
+# as if it were ran by `python3 -u ./check.py`, and once it's done
+# print the token followed by the child exit code (minus the signal
+# number if killed), CPU time, and peak RSS (in KiB).
+SANDBOX_RUNNER = """
+import atexit, os, sys, traceback
+try:
+    import correction_helper
+except ImportError:
+    pass
+
+def run_check():
+    try:
+        with open("check.py", encoding="UTF-8") as check_file:
+            code = compile(check_file.read(), "./check.py", "exec")
+        exec(code, {"__name__": "__main__", "__file__": "./check.py"})
+    except SystemExit as err:
+        if err.code is None or isinstance(err.code, int):
+            return err.code or 0
+        print(err.code, file=sys.stderr)
+        return 1
+    except BaseException:
+        etype, value, tb = sys.exc_info()
+        traceback.print_exception(etype, value, tb.tb_next)
+        return 1
+    return 0
+
+while True:
+    token = sys.stdin.readline().strip()
+    if not token:
+        break
+    pid = os.fork()
+    if pid == 0:
+        del token
+        os.dup2(os.open(os.devnull, os.O_RDONLY), 0)
+        sys.argv = ["./check.py"]
+        exit_code = run_check()
+        atexit._run_exitfuncs()
+        sys.stdout.flush()
+        sys.stderr.flush()
+        os._exit(exit_code)
+    _, status, usage = os.wait4(pid, 0)
+    code = os.WEXITSTATUS(status) if os.WIFEXITED(status) else -os.WTERMSIG(status)
+    cpu_time = usage.ru_utime + usage.ru_stime
+    sys.stdout.write(token + "%d %f %d\\n" % (code, cpu_time, usage.ru_maxrss))
+    sys.stdout.flush()
+"""
+
+
+OutputCallback = Optional[Callable[[bytes], None]]
+Spans = Optional[Dict[str, float]]
+
+
+@contextmanager
+def span(spans: Spans, stage: str):
+    """Add the seconds spent in the block to spans[stage], if spans is
+    given (see CorrectionTiming.STAGES).
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        if spans is not None:
+            spans[stage] = spans.get(stage, 0) + time.perf_counter() - start
+
+
+def record_usage(spans: Spans, **usage):
+    """Store the resource usage of a check (cpu_time, max_rss in KiB,
+    and timed_out) in spans, if given.
+    """
+    if spans is not None:
+        spans.update(usage)
+
+
+def partial_token_length(output: bytearray, token: bytes) -> int:
+    """Length of the longest end of output being a start of token."""
+    for length in range(min(len(token) - 1, len(output)), 0, -1):
+        if output.endswith(token[:length]):
+            return length
+    return 0
+
+
+class SandboxError(Exception):
+    """A pre-spawned sandbox died or misbehaved, it should not be reused."""
+
+
+class WarmSandbox:
+    """A sandbox spawned in advance, with correction_helper already
+    imported, waiting for an answer to check.
+
+    Each answer is checked in a freshly forked process, in the
+    sandbox private directory.
+    """
+
+    def __init__(self, language: str):
+        self.language = language
+        self.uses = 0
+        self.tmpdir = tempfile.mkdtemp(prefix="hkis")
+        env = os.environ.copy()
+        env["LANGUAGE"] = language
+        self.proc = Popen(  # pylint: disable=consider-using-with
+            firejail_command(self.tmpdir, "python3", "-u", "-c", SANDBOX_RUNNER),
+            stdin=PIPE,
+            stdout=PIPE,
+            stderr=STDOUT,
+            cwd=self.tmpdir,
+            env=env,
+            start_new_session=True,
+        )
+        assert self.proc.stdin and self.proc.stdout  # Both are PIPEs.
+        self.stdin, self.stdout = self.proc.stdin, self.proc.stdout
+
+    def is_alive(self) -> bool:
+        return self.proc.poll() is None
+
+    def clear(self):
+        """Remove files left by a previous answer."""
+        for entry in os.scandir(self.tmpdir):
+            if entry.is_dir(follow_symlinks=False):
+                shutil.rmtree(entry.path, ignore_errors=True)
+            else:
+                os.unlink(entry.path)
+
+    def check(
+        self,
+        answer: dict,
+        timeout=40,
+        on_output: OutputCallback = None,
+        spans: Spans = None,
+    ):
+        """Check an answer, returns a (returncode, output, timed_out) tuple.
+
+        Raises TimeoutExpired, or SandboxError if the sandbox died.
+        """
+        self.uses += 1
+        with span(spans, "sandbox"):
+            if self.uses > 1:
+                self.clear()
+            write_answer(self.tmpdir, answer)
+        if answer.get("pre_check"):
+            env = os.environ.copy()
+            env["LANGUAGE"] = self.language
+            with span(spans, "pre_check"):
+                run_pre_check(self.tmpdir, answer["pre_check"], env=env)
+        token = secrets.token_hex(16)
+        with span(spans, "check"):
+            try:
+                self.stdin.write(token.encode() + b"\n")
+                self.stdin.flush()
+            except OSError as err:
+                raise SandboxError("Sandbox died before the check.") from err
+            return self.read_result(token.encode(), timeout, on_output, spans)
+
+    def read_result(
+        self,
+        token: bytes,
+        timeout,
+        on_output: OutputCallback = None,
+        spans: Spans = None,
+    ):
+        """Read output until token and an exit code are found, returns
+        a (returncode, output, timed_out) tuple.
+
+        Only the beginning of huge outputs is kept. Output is also
+        given to on_output as it comes, and the check resource usage
+        stored in spans.
+        """
+        deadline = time.monotonic() + timeout
+        output = bytearray()
+        seen = 0  # Output length up to which the token has been searched for.
+        streamed = 0  # Output length already given to on_output.
+        fd = self.stdout.fileno()
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0 or not select.select([fd], [], [], remaining)[0]:
+                raise TimeoutExpired(self.proc.args, timeout)
+            chunk = os.read(fd, 65_536)
+            if not chunk:
+                raise SandboxError("Sandbox died during the check.")
+            output += chunk
+            found = output.find(token, max(0, seen - len(token)))
+            if on_output:
+                safe = found
+                if found == -1:  # Hold back what may be a partial token.
+                    safe = len(output) - partial_token_length(output, token)
+                if safe > streamed:
+                    on_output(bytes(output[streamed:safe]))
+                    streamed = safe
+            if found != -1:
+                end = output.find(b"\n", found)
+                if end != -1:
+                    start = found + len(token)
+                    returncode, cpu_time, max_rss = output[start:end].split()
+                    timed_out = hit_cpu_limit(float(cpu_time))
+                    record_usage(
+                        spans,
+                        cpu_time=float(cpu_time),
+                        max_rss=int(max_rss),
+                        timed_out=timed_out,
+                    )
+                    return int(returncode), bytes(output[:found]), timed_out
+            else:
+                seen = len(output)
+                if len(output) > 4 * 65_536:
+                    # Keep the beginning, and enough to find the token.
+                    keep_from = len(output) - len(token)
+                    del output[65_536:keep_from]
+                    seen = streamed = len(output)
+
+    def close(self):
+        try:
+            self.stdin.close()
+            self.proc.wait(timeout=1)
+        except (OSError, TimeoutExpired):
+            with suppress(ProcessLookupError):
+                os.killpg(self.proc.pid, signal.SIGKILL)
+            self.proc.wait()
+        self.stdout.close()
+        shutil.rmtree(self.tmpdir, ignore_errors=True)
+
+
+class SandboxPool:
+    """Keep, per language, `size` sandboxes spawned in advance, so
+    interpreter and firejail startup are not paid while the student
+    waits.
+
+    A sandbox is discarded after `max_uses` checks (default 1, keeping
+    one sandbox per answer, like cold checks) or on any failure.
+    """
+
+    def __init__(self, size=2, max_uses=1, timeout=40):
+        self.size = size
+        self.max_uses = max_uses
+        self.timeout = timeout
+        self.idle: Dict[str, Deque[WarmSandbox]] = defaultdict(deque)
+        self.lock = threading.Lock()
+
+    def acquire(self, language: str) -> WarmSandbox:
+        with self.lock:
+            idle = self.idle[language]
+            sandbox = None
+            while idle and sandbox is None:
+                candidate = idle.popleft()
+                if candidate.is_alive():
+                    sandbox = candidate
+                else:
+                    candidate.close()
+            while len(idle) < self.size:  # Warm up the next ones.
+                idle.append(WarmSandbox(language))
+        return sandbox or WarmSandbox(language)
+
+    def release(self, sandbox: WarmSandbox, failed=False):
+        with self.lock:
+            if (
+                not failed
+                and sandbox.uses < self.max_uses
+                and sandbox.is_alive()
+                and len(self.idle[sandbox.language]) < self.size
+            ):
+                self.idle[sandbox.language].appendleft(sandbox)
+                return
+        # Don't make the student wait for the sandbox shutdown.
+        threading.Thread(target=sandbox.close, daemon=True).start()
+
+    def check(
+        self, answer: dict, on_output: OutputCallback = None, spans: Spans = None
+    ):
+        language = answer.get("language", "en")
+        with span(spans, "sandbox"):  # Only long if none was warm.
+            sandbox = self.acquire(language)
+        failed = True
+        try:
+            returncode, output, timed_out = sandbox.check(
+                answer, self.timeout, on_output, spans
+            )
+            failed = False
+            return check_result(returncode, output, language, timed_out)
+        except TimeoutExpired:
+            record_usage(spans, timed_out=True)
+            return False, "Checker timed out."
+        except SandboxError:
+            logger.exception("Sandbox failure, falling back to a cold check.")
+            return cold_check(answer, on_output, spans)
+        finally:
+            self.release(sandbox, failed=failed)
+
+    def close(self):
+        with self.lock:
+            for idle in self.idle.values():
+                while idle:
+                    idle.popleft().close()
+
+
+_sandbox_pool: Optional[SandboxPool] = None
+_sandbox_pool_pid: Optional[int] = None
+
+
+def get_sandbox_pool() -> Optional[SandboxPool]:
+    """Get the sandbox pool of this worker process, None if disabled
+    (HKIS_SANDBOX_POOL_SIZE = 0).
+
+    Pools are per-process as Celery workers fork.
+    """
+    global _sandbox_pool, _sandbox_pool_pid  # pylint: disable=global-statement
+    size = getattr(settings, "HKIS_SANDBOX_POOL_SIZE", 2)
+    if not size:
+        return None
+    if _sandbox_pool_pid != os.getpid():
+        _sandbox_pool = SandboxPool(
+            size, max_uses=getattr(settings, "HKIS_SANDBOX_MAX_USES", 1)
+        )
+        _sandbox_pool_pid = os.getpid()
+        atexit.register(_sandbox_pool.close)
+    return _sandbox_pool
+
+
+def read_output(proc: Popen, timeout, on_output: OutputCallback = None) -> bytes:
+    """Read the output of proc until it closes it, giving it to
+    on_output as it comes, if given.
+    """
+    deadline = time.monotonic() + timeout
+    assert proc.stdout  # It's a PIPE.
+    fd = proc.stdout.fileno()
+    output = bytearray()
+    while True:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0 or not select.select([fd], [], [], remaining)[0]:
+            raise TimeoutExpired(proc.args, timeout)
+        chunk = os.read(fd, 65_536)
+        if not chunk:
+            return bytes(output)
+        if on_output:
+            on_output(chunk)
+        output += chunk
+
+
+def wait_with_usage(proc: Popen, timeout) -> resource.struct_rusage:
+    """Like proc.wait(timeout), returning the resource usage of proc
+    and of the descendants it waited for.
+    """
+    deadline = time.monotonic() + timeout
+    while True:
+        pid, status, usage = os.wait4(proc.pid, os.WNOHANG)
+        if pid:
+            proc.returncode = (
+                -os.WTERMSIG(status)
+                if os.WIFSIGNALED(status)
+                else os.WEXITSTATUS(status)
+            )
+            return usage
+        if time.monotonic() > deadline:
+            raise TimeoutExpired(proc.args, timeout)
+        time.sleep(0.005)
+
+
+def cold_check(answer: dict, on_output: OutputCallback = None, spans: Spans = None):
+    """Check an answer in a sandbox started just for it.
+
+    The sandbox startup happens during the "check" span, as it runs
+    concurrently with the check itself.
     """
     with tempfile.TemporaryDirectory(prefix="hkis") as tmpdir:
         logger.debug("Checking an answer in %s.", tmpdir)
-        with open(
-            os.path.join(tmpdir, "check.py"), "w", encoding="UTF-8"
-        ) as check_file:
-            check_file.write(answer["check"])
-        with open(
-            os.path.join(tmpdir, "solution"), "w", encoding="UTF-8"
-        ) as answer_file:
-            answer_file.write(answer["source_code"])
+        with span(spans, "sandbox"):
+            write_answer(tmpdir, answer)
         firejail_env = os.environ.copy()
         if "language" in answer:
             firejail_env["LANGUAGE"] = answer["language"]
         if "pre_check" in answer and answer["pre_check"]:
-            run_pre_check(tmpdir, answer["pre_check"], env=firejail_env)
-        prof_proc = Popen(  # pylint: disable=consider-using-with
-            ["firejail"]
-            + FIREJAIL_OPTIONS
-            + ["--private=" + tmpdir, "python3", "-u", "./check.py"],
-            stdin=DEVNULL,
-            stdout=PIPE,
-            stderr=STDOUT,
-            cwd=tmpdir,
-            env=firejail_env,
-        )
+            with span(spans, "pre_check"):
+                run_pre_check(tmpdir, answer["pre_check"], env=firejail_env)
+        with span(spans, "sandbox"):
+            prof_proc = Popen(  # pylint: disable=consider-using-with
+                firejail_command(tmpdir, "python3", "-u", "./check.py"),
+                stdin=DEVNULL,
+                stdout=PIPE,
+                stderr=STDOUT,
+                cwd=tmpdir,
+                env=firejail_env,
+            )
+        deadline = time.monotonic() + 40
         try:
-            stdout = (
-                prof_proc.communicate(timeout=40)[0]
-                .decode("UTF-8", "backslashreplace")
-                .replace("\u0000", r"\x00")
-                .replace(  # Simplify tracebacks by hiding the temporary directory
-                    'File "' + os.path.expanduser("~/"), 'File "'
-                )
-            )[:65_536]
-            if prof_proc.returncode == 0:
-                return True, stdout or congrats(answer.get("language", "en"))
-            if prof_proc.returncode == 255:
-                return False, "Checker timed out, look for infinite loops maybe?"
-            return False, stdout
+            with span(spans, "check"):
+                output = read_output(prof_proc, 40, on_output)
+                usage = wait_with_usage(prof_proc, deadline - time.monotonic())
+            cpu_time = usage.ru_utime + usage.ru_stime
+            timed_out = hit_cpu_limit(cpu_time)
+            record_usage(
+                spans, cpu_time=cpu_time, max_rss=usage.ru_maxrss, timed_out=timed_out
+            )
+            return check_result(
+                prof_proc.returncode, output, answer.get("language", "en"), timed_out
+            )
         except TimeoutExpired:
             prof_proc.kill()
             prof_proc.wait()
+            record_usage(spans, timed_out=True)
             return False, "Checker timed out."
         except MemoryError:
             return False, "Not enough memory to run your code."
 
 
-async def check_answer(answer: dict):
-    """Executed Django side.
+# Correction lanes, each one is a Celery queue:
+# - fast: exercises whose check usually runs in less than
+#   HKIS_FAST_LANE_MAX_DURATION seconds,
+# - default,
+# - overflow: answers from users (or teams) having already too many
+#   answers in the queue, so they can't starve others,
+# - bulk: batches sent from the admin.
+LANES = ("fast", "default", "overflow", "bulk")
+LANES_PREFIX = "hkis:lanes:"
+
+
+def update_average(key: str, value: float, weight: float = 0.2):
+    """Exponential moving average of value, stored in the cache."""
+    average = cache.get(key)
+    if average is not None:
+        value = average + weight * (value - average)
+    cache.set(key, value, timeout=None)
 
-    TODO with Celery 5: should no longer need run_in_executor.
+
+def record_wait(lane: str, sent_at: Optional[float]):
+    """Executed on Celery workers, to measure time spent in the queue."""
+    if sent_at is not None:
+        update_average(f"{LANES_PREFIX}{lane}:wait", time.time() - sent_at)
+
+
+def check_duration_key(exercise_id: int) -> str:
+    return f"{LANES_PREFIX}duration:{exercise_id}"
+
+
+def in_flight_counters(user_id=None, team_ids=()) -> List[Tuple[str, int]]:
+    """Keys of the in-flight counters of an answer, with their limits."""
+    counters = []
+    if user_id:
+        counters.append(
+            (
+                f"{LANES_PREFIX}in_flight:user:{user_id}",
+                getattr(settings, "HKIS_MAX_IN_FLIGHT_PER_USER", 2),
+            )
+        )
+    for team_id in team_ids:
+        counters.append(
+            (
+                f"{LANES_PREFIX}in_flight:team:{team_id}",
+                getattr(settings, "HKIS_MAX_IN_FLIGHT_PER_TEAM", 10),
+            )
+        )
+    return counters
+
+
+async def choose_lane(exercise_id: int, counters: List[Tuple[str, int]]) -> str:
+    for key, limit in counters:
+        if await cache.aget(key, 0) >= limit:
+            return "overflow"
+    duration = await cache.aget(check_duration_key(exercise_id))
+    if duration is not None and duration < getattr(
+        settings, "HKIS_FAST_LANE_MAX_DURATION", 2
+    ):
+        return "fast"
+    return "default"
+
+
+def lanes_stats() -> Dict[str, Dict[str, Optional[float]]]:
+    """Number of waiting answers, and average wait time, per lane."""
+    stats: Dict[str, Dict[str, Optional[float]]] = {}
+    with app.connection_for_read() as connection:
+        channel = connection.default_channel
+        for lane in LANES:
+            try:
+                depth = channel.queue_declare(lane, passive=True).message_count
+            except connection.channel_errors:  # Empty queues may not exist.
+                depth = 0
+                channel = connection.default_channel
+            stats[lane] = {
+                "depth": depth,
+                "wait": cache.get(f"{LANES_PREFIX}{lane}:wait"),
+            }
+    return stats
+
+
+def stand_in_check(answer: dict, on_output: OutputCallback = None, spans: Spans = None):
+    """Pretend to check an answer, without any sandbox, taking
+    HKIS_STAND_IN_CHECKER seconds, for load tests.
+    """
+    if on_output:
+        on_output(b"Checking with the stand-in checker...\n")
+    with span(spans, "check"):
+        time.sleep(settings.HKIS_STAND_IN_CHECKER)
+    return True, f"Stand-in checker: {len(answer['source_code'])} characters, OK."
+
+
+def run_check_answer(
+    answer: dict, on_output: OutputCallback = None, spans: Spans = None
+):
+    """Check an answer in this process, using the sandbox pool if enabled.
+
+    The checker output is given to on_output as it comes, if given,
+    the time spent in each stage is added to spans, if given.
+    """
+    if getattr(settings, "HKIS_STAND_IN_CHECKER", None) is not None:
+        return stand_in_check(answer, on_output, spans)
+    pool = get_sandbox_pool()
+    if pool is None:
+        return cold_check(answer, on_output, spans)
+    return pool.check(answer, on_output, spans)
+
+
+CORRECTION_CACHE_PREFIX = "hkis:correction:"
+
+
+def correction_cache_key(answer: dict) -> str:
+    """Content-addressed key of a correction: editing the check gives
+    new keys, leaving old entries to expire.
+    """
+    content = json.dumps(
+        [
+            answer["check"],
+            answer.get("pre_check") or "",
+            answer["source_code"],
+            answer.get("language", "en"),
+        ]
+    )
+    return CORRECTION_CACHE_PREFIX + hashlib.sha256(content.encode()).hexdigest()
+
+
+def count_correction_cache(event: str):
+    """Count correction cache hits and misses (see correction_cache_stats)."""
+    key = CORRECTION_CACHE_PREFIX + event
+    cache.add(key, 0, timeout=None)
+    cache.incr(key)
+
+
+def correction_cache_stats() -> Dict[str, int]:
+    return {
+        event: cache.get(CORRECTION_CACHE_PREFIX + event, 0)
+        for event in ("hits", "misses")
+    }
+
+
+CORRECTING_PREFIX = "hkis:correcting:"
+
+CHECK_FAILED_MESSAGE = (
+    "Sorry, something went wrong while checking your answer, please retry."
+)
+
+
+class ProgressSender:
+    """Forward checker output to a group as answer.progress messages,
+    while the answer is being checked.
+
+    Output is coalesced to send at most a message every
+    HKIS_PROGRESS_INTERVAL seconds, so a chatty checker does not flood
+    the channel layer, and is cut after HKIS_PROGRESS_MAX_SIZE bytes.
+    The answer.update message, sent after, holds the whole output.
+    """
+
+    def __init__(self, answer_id: int, group: str):
+        self.answer_id = answer_id
+        self.group = group
+        self.interval = getattr(settings, "HKIS_PROGRESS_INTERVAL", 0.5)
+        self.remaining = getattr(settings, "HKIS_PROGRESS_MAX_SIZE", 16_384)
+        self.buffer = bytearray()
+        self.last_sent = 0.0
+        self.decoder = codecs.getincrementaldecoder("UTF-8")("backslashreplace")
+        self.group_send = async_to_sync(get_channel_layer().group_send)
+
+    def __call__(self, chunk: bytes):
+        chunk = chunk[: self.remaining]
+        self.remaining -= len(chunk)
+        self.buffer += chunk
+        if time.monotonic() - self.last_sent >= self.interval:
+            self.flush()
+
+    def flush(self):
+        output = self.decoder.decode(bytes(self.buffer))
+        self.buffer.clear()
+        if not output:
+            return
+        self.last_sent = time.monotonic()
+        self.group_send(
+            self.group,
+            {
+                "type": "answer.progress",
+                "id": self.answer_id,
+                "output": output.replace("\u0000", r"\x00"),
+            },
+        )
+
+
+def cached_check_answer(
+    answer: dict, on_output: OutputCallback = None, spans: Spans = None
+):
+    """Check an answer, results of deterministic checks being cached
+    for HKIS_CORRECTION_CACHE_TIMEOUT seconds (but not the results of
+    the stand-in checker, they would be served once it's off).
     """
+    key = None
+    stand_in = getattr(settings, "HKIS_STAND_IN_CHECKER", None) is not None
+    if answer.get("deterministic") and not stand_in:
+        key = correction_cache_key(answer)
+        cached = cache.get(key)
+        count_correction_cache("misses" if cached is None else "hits")
+        if cached is not None:
+            return tuple(cached)
+    result = run_check_answer(answer, on_output, spans)
+    if key:
+        cache.set(
+            key,
+            result,
+            timeout=getattr(settings, "HKIS_CORRECTION_CACHE_TIMEOUT", 86_400),
+        )
+    return result
+
+
+@app.task
+def correct_answer_task(  # pylint: disable=too-many-arguments
+    answer_id: int,
+    language: str,
+    group: str,
+    lane: str = "default",
+    sent_at: Optional[float] = None,
+    counters=(),
+    spans: Spans = None,
+):
+    """Executed on Celery workers.
 
-    def sync_celery_check_answer(answer: dict):
-        return check_answer_task.apply_async((answer,), expires=60).get()
+    Correct a stored answer, save the result, and send it to group on
+    the channel layer, so it reaches every tab following this answer.
 
-    return await asyncio.get_running_loop().run_in_executor(
-        None, partial(sync_celery_check_answer, answer=answer)
+    counters are the in-flight counters to decrement once done with
+    the answer, even if checking it failed (see in_flight_counters).
+
+    spans are the stages timed before, by the consumer, the stages
+    timed here are added before storing them as a CorrectionTiming.
+    """
+    # Django is not set up yet when Celery imports this module.
+    # pylint: disable=import-outside-toplevel
+    from hkis.consumers import answer_message
+    from hkis.models import Answer, CorrectionTiming, UserInfo
+
+    spans = dict(spans or {})
+    if sent_at:
+        spans["queue"] = max(0, time.time() - sent_at)
+    record_wait(lane, sent_at)
+    # Deleted once done, expiring in case this worker dies meanwhile.
+    cache.touch(
+        CORRECTING_PREFIX + str(answer_id),
+        getattr(settings, "HKIS_CORRECTION_TIMEOUT", 120),
     )
+    try:
+        try:
+            answer = Answer.objects.select_related("exercise", "user").get(id=answer_id)
+        except Answer.DoesNotExist:
+            return
+        start = time.perf_counter()
+        progress = ProgressSender(answer_id, group)
+        try:
+            is_valid, message = cached_check_answer(
+                {
+                    "check": answer.exercise.check_py,
+                    "pre_check": answer.exercise.pre_check_py,
+                    "source_code": answer.source_code,
+                    "language": language,
+                    "deterministic": answer.exercise.check_is_deterministic,
+                },
+                on_output=progress,
+                spans=spans,
+            )
+        except Exception:  # pylint: disable=broad-except
+            logger.exception("Can't check answer %s", answer_id)
+            # Not saved, so the answer is checked again on recorrect.
+            answer.set_correction(False, CHECK_FAILED_MESSAGE)
+            async_to_sync(get_channel_layer().group_send)(group, answer_message(answer))
+            return
+        progress.flush()
+        update_average(
+            check_duration_key(answer.exercise_id), time.perf_counter() - start
+        )
+        with span(spans, "render"):
+            # So save_correction, below, doesn't have to.
+            answer.correction_message = message
+            answer.render_correction_message()
+        with span(spans, "save"):
+            is_first_solve = answer.save_correction(is_valid, message)
+            rank = None
+            if answer.is_valid and answer.user_id:
+                # None in case of show_in_leaderboard=False
+                rank = (
+                    UserInfo.objects.filter(user_id=answer.user_id)
+                    .values_list("rank", flat=True)
+                    .first()
+                )
+            if is_first_solve:
+                for team in answer.user.teams.all():
+                    team.recompute_rank()
+    finally:
+        release_in_flight(counters)
+        cache.delete(CORRECTING_PREFIX + str(answer_id))
+    with span(spans, "send"):
+        async_to_sync(get_channel_layer().group_send)(
+            group, answer_message(answer, rank)
+        )
+    CorrectionTiming.record(answer, spans)
+    flag_check_cost_regression(answer.exercise)
+
+
+CHECK_COST_PREFIX = "hkis:check_cost:"
+
+
+def flag_check_cost_regression(exercise):
+    """Every HKIS_CHECK_COST_MIN_RUNS corrections since its check was
+    edited, ten times, look whether it got costlier.
+    """
+    if not exercise.check_edited_at:
+        return
+    min_runs = getattr(settings, "HKIS_CHECK_COST_MIN_RUNS", 20)
+    key = f"{CHECK_COST_PREFIX}{exercise.id}:{exercise.check_edited_at.timestamp()}"
+    cache.add(key, 0, timeout=30 * 86_400)
+    runs = cache.incr(key)
+    if runs % min_runs or runs > 10 * min_runs:
+        return
+    regression = exercise.find_check_cost_regression(min_runs)
+    if regression != exercise.check_cost_regression:
+        if regression:
+            logger.warning("Check of %s got costlier: %s", exercise, regression)
+        # Not using save: it's not an edit of the exercise.
+        type(exercise).objects.filter(pk=exercise.pk).update(
+            check_cost_regression=regression
+        )
+
+
+def release_in_flight(counters):
+    for key in counters:
+        with suppress(ValueError):  # Expired
+            cache.decr(key)
+
+
+async def send_to_correction(  # pylint: disable=too-many-arguments
+    answer_id: int,
+    exercise_id: int,
+    language: str,
+    group: str,
+    user_id: Optional[int] = None,
+    team_ids=(),
+    spans: Spans = None,
+) -> bool:
+    """Send a stored answer to the correction workers, the result will
+    be sent to group (see correct_answer_task, also for spans).
+
+    Returns False if the answer is already being corrected.
+    """
+    # Not expiring while queued, however long the queue is: the worker
+    # gives it a timeout once it picks the answer (see
+    # correct_answer_task).
+    if not await cache.aadd(CORRECTING_PREFIX + str(answer_id), True, None):
+        return False
+    counters = in_flight_counters(user_id, team_ids)
+    lane = await choose_lane(exercise_id, counters)
+    for key, _ in counters:
+        await cache.aadd(key, 0, None)
+        await cache.aincr(key)
+    await asyncio.get_running_loop().run_in_executor(
+        None,
+        partial(
+            correct_answer_task.apply_async,
+            (answer_id, language, group),
+            {
+                "lane": lane,
+                "sent_at": time.time(),
+                "counters": [key for key, _ in counters],
+                "spans": spans or {},
+            },
+            queue=lane,
+            # Not expiring: under load, answers wait longer in the
+            # queue, and an expired task is never corrected.
+            ignore_result=True,
+        ),
+    )
+    return True
+
+
+@app.task
+def recorrect_answers_task(
+    job_id: int,
+    answer_ids: List[int],
+    language: str = "en",
+    sent_at: Optional[float] = None,
+):
+    """Executed on Celery workers, see CorrectionJob.start.
+
+    Results are saved, and the job progress updated, every
+    HKIS_RECORRECTION_BATCH_SIZE answers.
+    """
+    # pylint: disable=import-outside-toplevel
+    from hkis.models import Answer, CorrectionJob, ExerciseDailyStats
+
+    record_wait("bulk", sent_at)
+    job = CorrectionJob(pk=job_id)
+    batch_size = getattr(settings, "HKIS_RECORRECTION_BATCH_SIZE", 100)
+    since, exercise_ids = None, set()
+    for start in range(0, len(answer_ids), batch_size):
+        end = start + batch_size
+        batch = answer_ids[start:end]
+        answers = []
+        for answer in Answer.objects.select_related("exercise").filter(id__in=batch):
+            try:
+                result = cached_check_answer(
+                    {
+                        "check": answer.exercise.check_py,
+                        "pre_check": answer.exercise.pre_check_py,
+                        "source_code": answer.source_code,
+                        "language": language,
+                        "deterministic": answer.exercise.check_is_deterministic,
+                    }
+                )
+            except Exception:  # pylint: disable=broad-except
+                # Left as it was, not to stop the job.
+                logger.exception("Can't recheck answer %s", answer.id)
+                continue
+            answer.set_correction(*result)
+            answers.append(answer)
+        Answer.objects.bulk_update(
+            answers,
+            [
+                "correction_message",
+                "is_corrected",
+                "is_valid",
+                "corrected_at",
+                "is_unhelpfull",
+                "correction_message_html",
+            ],
+        )
+        for answer in answers:  # bulk_update does not call save.
+            with transaction.atomic():  # Like Answer.save_correction.
+                answer.update_solve(answer.lock_author(answer.is_valid))
+            exercise_ids.add(answer.exercise_id)
+            day = localdate(answer.created_at)
+            since = day if since is None else min(since, day)
+        job.add_done(len(batch))  # Deleted and failed answers are done too.
+    if since is not None:
+        # Successes of the days of these answers changed.
+        ExerciseDailyStats.objects.rollup(since, exercise_ids)
+
+
+@app.task
+def rollup_exercise_stats_task():
+    """Executed periodically by Celery beat (see CELERY_BEAT_SCHEDULE)."""
+    from hkis.models import (  # pylint: disable=import-outside-toplevel
+        ExerciseDailyStats,
+    )
+
+    ExerciseDailyStats.objects.rollup()
@@ -2,14 +2,14 @@ from django import template
 from django.utils.safestring import mark_safe
 import markdown
 
-from hkis.utils import markdown_to_bootstrap
+from hkis.utils import stored_markdown_to_bootstrap
 
 register = template.Library()
 
 
 @register.filter("markdown_to_bootstrap", is_safe=True)
 def _markdown_to_bootstrap(value):
-    return mark_safe(markdown_to_bootstrap(value))
+    return mark_safe(stored_markdown_to_bootstrap(value))
 
 
 @register.tag(name="md")
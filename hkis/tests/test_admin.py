@@ -1,6 +1,20 @@
-from django.test import TestCase
+from datetime import timedelta
+from unittest import mock
+
+from django.test import TestCase, override_settings
 
 from django.contrib.auth.models import User
+from django.utils.timezone import localdate, now
+
+from hkis.models import (
+    Answer,
+    CorrectionJob,
+    CorrectionTiming,
+    Exercise,
+    ExerciseDailyStats,
+    UserInfo,
+)
+from hkis.tasks import recorrect_answers_task
 
 
 class TestAdminSuperUser(TestCase):
@@ -16,3 +30,125 @@ class TestAdminSuperUser(TestCase):
     def test_get_admin_exercises_1(self):
         response = self.client.get("/admin/hkis/exercise/1/change/")
         assert b"Hello World" in response.content
+
+    def test_correction_timings(self):
+        exercise = Exercise.objects.get(id=1)
+        for duration in 0.005, 0.2, 3:
+            CorrectionTiming.record(
+                exercise.answers.create(source_code=""),
+                {"queue": duration, "check": duration},
+            )
+        histograms = CorrectionTiming.objects.filter(exercise=exercise).histograms()
+        assert histograms["check"]["buckets"] == [1, 0, 0, 1, 0, 1, 0, 0]
+        assert histograms["total"]["p50"] == 0.4
+        assert histograms["pre_check"]["p50"] is None
+        response = self.client.get("/admin/hkis/exercise/1/change/")
+        assert "<th>pre_check</th>" in response.content.decode()
+        response = self.client.get("/admin/hkis/exercise/")
+        assert "0% timeouts" in response.content.decode()
+
+    def test_monthly_stats(self):
+        exercise = Exercise.objects.get(id=1)
+        bart = User.objects.get(username="Bart")
+        for is_valid in False, True, True:
+            exercise.answers.create(user=bart, is_valid=is_valid)
+        Answer.objects.update(created_at=now() - timedelta(days=2))
+        rows = ExerciseDailyStats.objects.rollup()
+        assert rows and ExerciseDailyStats.objects.rollup() == rows  # Idempotent
+        exercise = Exercise.objects.with_monthly_stats().get(id=1)
+        assert (
+            exercise.last_month_user_days_tried
+            == exercise.last_month_user_days_solved
+            == 1
+        )
+        assert exercise.prev_month_user_days_tried == 0
+        # Corrected late, and tried again on another day:
+        exercise.answers.create(user=bart, is_valid=False)
+        Answer.objects.filter(user=bart, exercise=exercise).update(is_valid=False)
+        ExerciseDailyStats.objects.rollup()
+        exercise = Exercise.objects.with_monthly_stats().get(id=1)
+        assert exercise.last_month_user_days_tried == 2
+        assert exercise.last_month_user_days_solved == 0
+        for period, count in ("week", 13), ("quarter", 8):
+            series = ExerciseDailyStats.objects.series([1], period, count)[1]
+            assert len(series) == count and sum(series) == 2
+        response = self.client.get("/admin/hkis/exercise/")
+        assert "█" in response.content.decode()
+
+    @override_settings(HKIS_RECORRECTION_CONCURRENCY=2, HKIS_RECORRECTION_BATCH_SIZE=2)
+    @mock.patch("hkis.tasks.run_check_answer", return_value=(False, "Nope"))
+    @mock.patch("hkis.tasks.recorrect_answers_task.apply_async")
+    def test_send_to_correction_bot(self, apply_async, _):
+        exercise = Exercise.objects.first()
+        bart = User.objects.get(username="Bart")
+        ids = [
+            exercise.answers.create(user=bart, source_code=str(i)).id for i in range(5)
+        ]
+        ten_days_ago = now() - timedelta(days=10)
+        Answer.objects.filter(id__in=ids).update(created_at=ten_days_ago)
+        with self.captureOnCommitCallbacks() as callbacks:
+            response = self.client.post(
+                "/admin/hkis/answer/",
+                {"action": "send_to_correction_bot", "_selected_action": ids},
+                follow=True,
+            )
+        assert b"Sent 5 answers" in response.content
+        assert not apply_async.called  # Not before the job is committed.
+        for callback in callbacks:
+            callback()
+        assert apply_async.call_count == 2
+        for call in apply_async.call_args_list:
+            recorrect_answers_task(*call.args[0])
+        job = CorrectionJob.objects.get()
+        assert job.done == 5 and job.finished_at
+        assert Answer.objects.filter(id__in=ids, correction_message="Nope").count() == 5
+        # Out of the hourly rollup window, but counted again:
+        stats = ExerciseDailyStats.objects.get(
+            exercise=exercise, date=localdate(ten_days_ago)
+        )
+        assert stats.tries == 1 and stats.successes == 0
+
+    @mock.patch("hkis.tasks.run_check_answer", return_value=(True, "Bravo"))
+    def test_recorrection_grants_points(self, _):
+        exercise = Exercise.objects.first()
+        user = User.objects.create(username="Temporary")
+        answer = exercise.answers.create(user=user, source_code="")
+        answer.save_correction(False, "Nope")
+        userinfo = UserInfo.objects.get_or_create(user=user)[0]
+        # Users with no points, ranked along with this one.
+        tied = UserInfo.objects.filter(points=0).exclude(pk=userinfo.pk)
+        assert tied.filter(rank=userinfo.rank).exists()
+        job = CorrectionJob.objects.create(total=1)
+        recorrect_answers_task(job.id, [answer.id])
+        userinfo.refresh_from_db()
+        assert userinfo.points == userinfo.compute_points() > 0
+        assert not tied.filter(rank__lte=userinfo.rank).exists()
+        assert userinfo.rank == (
+            UserInfo.with_rank.with_computed_rank().get(pk=userinfo.pk).computed_rank
+        )
+        assert Exercise.objects.get(pk=exercise.pk).solved_by == exercise.solved_by + 1
+
+    def test_recorrection_failure(self):
+        exercise = Exercise.objects.first()
+        bart = User.objects.get(username="Bart")
+        ids = [
+            exercise.answers.create(user=bart, source_code=str(i)).id for i in range(3)
+        ]
+        job = CorrectionJob.objects.create(total=3)
+
+        def check(answer, on_output=None, spans=None):
+            if answer["source_code"] == "1":
+                raise OSError("Sandbox failure")
+            return False, "Nope"
+
+        with mock.patch("hkis.tasks.run_check_answer", side_effect=check):
+            with self.assertLogs("hkis.tasks", "ERROR"):
+                recorrect_answers_task(job.id, ids)
+        job.refresh_from_db()
+        assert job.done == 3 and job.finished_at
+        messages = Answer.objects.filter(id__in=ids).order_by("id")
+        assert list(messages.values_list("correction_message", flat=True)) == [
+            "Nope",
+            "",
+            "Nope",
+        ]
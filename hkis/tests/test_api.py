@@ -1,7 +1,10 @@
 from django.contrib.auth.models import Permission, User, Group
+from django.db.models import F
 from django.test import TestCase
 from rest_framework.test import APITestCase
 
+from hkis.models import Exercise
+
 
 class TestAPIAnswerAnonymous(APITestCase):
     fixtures = ["initial"]
@@ -22,3 +25,153 @@ class TestAPIAnswerAuthed(APITestCase):
         response = self.client.get("/api/answers/")
         assert response.status_code == 200
         assert response.json()["results"]
+
+
+class TestAPIExercises(APITestCase):
+    fixtures = ["initial"]
+
+    def get(self, url):
+        response = self.client.get(url)
+        assert response.status_code == 200
+        return response.json()
+
+    def test_list(self):
+        exercises = self.get("/api/exercises/")
+        assert [exercise["id"] for exercise in exercises["results"]] == list(
+            Exercise.objects.order_by("id").values_list("id", flat=True)
+        )
+        assert exercises["next"] is None
+        assert "check_py" not in exercises["results"][0]
+
+    def test_pagination(self):
+        seen = []
+        url = "/api/exercises/?limit=2"
+        while url:
+            page = self.get(url)
+            assert page["count"] == Exercise.objects.count()
+            assert len(page["results"]) <= 2
+            seen.extend(exercise["id"] for exercise in page["results"])
+            url = page["next"]
+        assert seen == list(
+            Exercise.objects.order_by("id").values_list("id", flat=True)
+        )
+
+    def test_fields(self):
+        exercises = self.get("/api/exercises/?fields=id,title")
+        assert set(exercises["results"][0]) == {"id", "title"}
+
+    def test_ids(self):
+        exercises = self.get("/api/exercises/?ids=2,1,1000")
+        assert [exercise["id"] for exercise in exercises["results"]] == [1, 2]
+
+    def test_bad_ids(self):
+        assert self.client.get("/api/exercises/?ids=1,a").status_code == 400
+        assert self.client.get("/api/exercises/?after=-1").status_code == 400
+        assert self.client.get("/api/exercises/?limit=0").status_code == 400
+
+    def test_author_gets_all_fields(self):
+        self.client.force_authenticate(user=User.objects.get(username="a-teacher"))
+        exercises = {
+            exercise["id"]: exercise
+            for exercise in self.get("/api/exercises/")["results"]
+        }
+        assert "check_py" not in exercises[1]
+        assert "check_py" in exercises[2]
+
+    def test_modified_since(self):
+        Exercise.objects.filter(id=1).update(updated_at="2020-01-01T00:00:00Z")
+        Exercise.objects.filter(id=2).update(updated_at="2022-01-01T00:00:00Z")
+        exercises = self.get("/api/exercises/?modified_since=2021-01-01T00:00:00")
+        assert [exercise["id"] for exercise in exercises["results"]] == [2]
+        response = self.client.get("/api/exercises/?modified_since=yesterday")
+        assert response.status_code == 400
+
+    def test_conditional_list(self):
+        etag = self.client.get("/api/exercises/")["ETag"]
+        response = self.client.get("/api/exercises/", HTTP_IF_NONE_MATCH=etag)
+        assert response.status_code == 304
+        Exercise.objects.get(id=1).save()
+        response = self.client.get("/api/exercises/", HTTP_IF_NONE_MATCH=etag)
+        assert response.status_code == 200
+
+    def test_browsable_list(self):
+        response = self.client.get("/api/exercises/?format=api")
+        assert response.status_code == 200
+        assert response["Content-Type"].startswith("text/html")
+
+    def test_etag_depends_on_language(self):
+        english = self.client.get("/api/exercises/", HTTP_ACCEPT_LANGUAGE="en")
+        french = self.client.get("/api/exercises/", HTTP_ACCEPT_LANGUAGE="fr")
+        assert english["ETag"] != french["ETag"]
+        assert "Accept-Language" in english["Vary"]
+        response = self.client.get(
+            "/api/exercises/",
+            HTTP_ACCEPT_LANGUAGE="fr",
+            HTTP_IF_NONE_MATCH=english["ETag"],
+        )
+        assert response.status_code == 200
+
+    def test_private_fields(self):
+        exercises = self.get("/api/exercises/?fields=id,check_py")
+        assert exercises["results"][0] == {"id": 1}
+
+    def test_non_author_cant_select_private_fields(self):
+        self.client.force_authenticate(user=User.objects.get(username="a-teacher"))
+        exercises = {
+            exercise["id"]: exercise
+            for exercise in self.get("/api/exercises/?fields=id,check_py,pre_check_py")[
+                "results"
+            ]
+        }
+        assert exercises[1] == {"id": 1}
+        assert set(exercises[2]) == {"id", "check_py", "pre_check_py"}
+
+    def test_conditional_detail(self):
+        self.client.force_authenticate(user=User.objects.get(username="a-superuser"))
+        response = self.client.get("/api/exercises/1/")
+        assert response.json()["updated_at"]
+        etag, last_modified = response["ETag"], response["Last-Modified"]
+        response = self.client.get("/api/exercises/1/", HTTP_IF_NONE_MATCH=etag)
+        assert response.status_code == 304
+        response = self.client.get(
+            "/api/exercises/1/", HTTP_IF_MODIFIED_SINCE=last_modified
+        )
+        assert response.status_code == 304
+        Exercise.objects.filter(id=1).update(solved_by=F("solved_by") + 1)
+        response = self.client.get("/api/exercises/1/", HTTP_IF_NONE_MATCH=etag)
+        assert response.status_code == 200
+
+    def test_bulk(self):
+        teacher = User.objects.get(username="a-teacher")
+        teacher.user_permissions.add(Permission.objects.get(codename="add_exercise"))
+        self.client.force_authenticate(user=teacher)
+        exercise = self.get("/api/exercises/?ids=2")["results"][0]
+        exercise["title_en"] = "Print 43"
+        new = {"title": "New one", "page": exercise["page"]}
+        response = self.client.post(
+            "/api/exercises/bulk/", [exercise, new], format="json"
+        )
+        assert response.status_code == 200, response.json()
+        created = response.json()[1]
+        assert Exercise.objects.get(id=2).title_en == "Print 43"
+        assert Exercise.objects.get(id=created["id"]).author == teacher
+
+    def test_bulk_is_atomic(self):
+        self.client.force_authenticate(user=User.objects.get(username="a-superuser"))
+        page = "http://testserver/api/pages/1/"
+        response = self.client.post(
+            "/api/exercises/bulk/",
+            [{"title": "Valid", "page": page}, {"title": "", "page": page}],
+            format="json",
+        )
+        assert response.status_code == 400
+        assert response.json()[0] == {}
+        assert not Exercise.objects.filter(title="Valid").exists()
+
+    def test_bulk_permissions(self):
+        self.client.force_authenticate(user=User.objects.get(username="a-teacher"))
+        response = self.client.post(
+            "/api/exercises/bulk/", [{"id": 1, "title": "Mine now"}], format="json"
+        )
+        assert response.status_code == 403
+        assert Exercise.objects.get(id=1).title == "Hello World"
@@ -0,0 +1,19 @@
+from django.test import SimpleTestCase, override_settings
+
+from hkis.checks import check_shared_cache
+
+
+class TestChecks(SimpleTestCase):
+    def test_process_local_cache(self):
+        assert [warning.id for warning in check_shared_cache()] == ["hkis.W001"]
+
+    @override_settings(
+        CACHES={
+            "default": {
+                "BACKEND": "django.core.cache.backends.redis.RedisCache",
+                "LOCATION": "redis://127.0.0.1:6379/1",
+            }
+        }
+    )
+    def test_shared_cache(self):
+        assert check_shared_cache() == []
@@ -0,0 +1,85 @@
+from unittest import mock
+
+from asgiref.sync import async_to_sync
+from channels.routing import URLRouter
+from channels.testing import WebsocketCommunicator
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.test import TransactionTestCase, override_settings
+
+from hkis.consumers import (
+    answers_group,
+    consumers_stats,
+    publish_consumers_stats,
+    published_consumers_stats,
+)
+from hkis.routing import websocket_urlpatterns
+
+IN_MEMORY_CHANNEL_LAYERS = {
+    "default": {"BACKEND": "channels.layers.InMemoryChannelLayer"}
+}
+
+
+@override_settings(CHANNEL_LAYERS=IN_MEMORY_CHANNEL_LAYERS)
+@mock.patch("hkis.consumers.send_to_correction", return_value=True)
+class TestMultiplexConsumer(TransactionTestCase):
+    fixtures = ["initial"]
+    serialized_rollback = True  # Fixtures need the permissions of migrations.
+
+    def setUp(self):
+        self.user = User.objects.get(username="Bart")
+
+    def communicator(self, path="/ws/answers/"):
+        communicator = WebsocketCommunicator(URLRouter(websocket_urlpatterns), path)
+        communicator.scope["user"] = self.user
+        return communicator
+
+    def test_answers(self, send_to_correction):
+        async def scenario():
+            communicator = self.communicator()
+            assert (await communicator.connect())[0]
+            await communicator.send_json_to({"type": "subscribe", "exercise": 1})
+            assert await communicator.receive_json_from() == {
+                "type": "subscribed",
+                "exercise": 1,
+            }
+            for exercise_id in 1, 2:
+                await communicator.send_json_to(
+                    {"type": "answer", "exercise": exercise_id, "source_code": "1"}
+                )
+            error = await communicator.receive_json_from()
+            answer = await communicator.receive_json_from()
+            stats = consumers_stats()["MultiplexConsumer"]
+            await publish_consumers_stats()
+            await communicator.disconnect()
+            return error, answer, stats
+
+        cache.clear()
+        error, answer, stats = async_to_sync(scenario)()
+        assert error == {"type": "error", "message": "Not subscribed to exercise 2."}
+        assert answer["type"] == "answer.update"
+        assert answer["exercise"] == 1
+        assert send_to_correction.call_args.args[3] == answers_group(self.user.id, 1)
+        assert stats["connections"] == 1
+        assert stats["groups"] == 1
+        assert stats["bytes"] > 0
+        [published] = published_consumers_stats()
+        assert published["stats"]["MultiplexConsumer"] == stats
+
+    def test_unknown_exercise(self, _):
+        async def scenario():
+            communicator = self.communicator()
+            await communicator.connect()
+            await communicator.send_json_to({"type": "subscribe", "exercise": 404})
+            messages = [await communicator.receive_json_from()]
+            for invalid in {"type": "subscribe"}, {"type": "subscribe", "exercise": []}:
+                await communicator.send_json_to(invalid)
+                messages.append(await communicator.receive_json_from())
+            await communicator.disconnect()
+            refused = self.communicator("/ws/exercises/404/")
+            return messages, (await refused.connect())[0]
+
+        messages, connected = async_to_sync(scenario)()
+        assert [message["type"] for message in messages] == ["error"] * 3
+        assert messages[1]["message"] == "Invalid exercise None."
+        assert not connected
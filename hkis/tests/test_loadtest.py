@@ -0,0 +1,33 @@
+from django.test import SimpleTestCase, TransactionTestCase
+
+from hkis.loadtest import Histogram, load_test_in_process
+from hkis.models import Answer
+
+
+class TestHistogram(SimpleTestCase):
+    def test_buckets(self):
+        histogram = Histogram()
+        for seconds in 0.005, 0.01, 0.2, 0.2, 60:
+            histogram.add(seconds)
+        assert histogram.buckets() == [2, 0, 0, 0, 2, 0, 0, 0, 0, 0, 1]
+        assert histogram.percentile(50) == 0.2
+        assert "corrected: 5 (1.0/s)" in histogram.render(duration=5)
+
+
+class TestLoadTest(TransactionTestCase):
+    fixtures = ["initial"]
+    serialized_rollback = True  # Fixtures need the permissions of migrations.
+
+    def test_in_process(self):
+        histogram = load_test_in_process(
+            connections=2,
+            rate=20,
+            duration=0.2,
+            exercise_id=1,
+            workers=2,
+            checker_duration=0,
+            timeout=10,
+        )
+        assert len(histogram.latencies) == 4
+        assert histogram.timeouts == histogram.skipped == 0
+        assert Answer.objects.filter(source_code="print(0)", is_valid=True).exists()
@@ -1,6 +1,11 @@
+from io import StringIO
+from unittest import mock
+
+from django.core.management import call_command
 from django.test import TestCase
 
-from hkis.models import Page
+from hkis.models import Page, RenderedMarkdown
+from hkis.utils import markdown_digest, render_correction_message, render_markdown
 
 
 class TestPages(TestCase):
@@ -9,3 +14,66 @@ class TestPages(TestCase):
     def test_page(self):
         p1 = Page.objects.first()
         assert p1.slug in p1.get_absolute_url()
+
+
+class TestRenderedMarkdown(TestCase):
+    fixtures = ["initial"]
+
+    def test_rendered_on_save(self):
+        page = Page.objects.first()
+        page.body = "# Hello\n\n!!! note\n    Hi"
+        page.save()
+        rendered = RenderedMarkdown.objects.get(digest=markdown_digest(page.body))
+        assert '<h1>Hello</h1>\n<div class="alert alert-info">' in rendered.html
+        with self.assertNumQueries(0):
+            RenderedMarkdown.objects.render([])
+        with self.assertNumQueries(1):
+            assert RenderedMarkdown.objects.render([page.body]) == [rendered.html]
+
+    def test_views_dont_store(self):
+        page = Page.objects.first()
+        Page.objects.filter(pk=page.pk).update(body="# Not stored")
+        response = self.client.get(page.get_absolute_url())
+        assert "<h1>Not stored</h1>" in response.content.decode()
+        assert not RenderedMarkdown.objects.filter(
+            digest=markdown_digest("# Not stored")
+        ).exists()
+        call_command("render_markdown", stdout=StringIO())
+        assert RenderedMarkdown.objects.filter(
+            digest=markdown_digest("# Not stored")
+        ).exists()
+
+    def test_renderer_version(self):
+        digest = markdown_digest("# Hello")
+        with mock.patch("hkis.utils.renderer_version", return_value="bleach 42"):
+            assert markdown_digest("# Hello") != digest
+
+    def test_prune(self):
+        page = Page.objects.first()
+        page.body = "Old"
+        page.save()
+        old = markdown_digest(page.body)
+        page.body = "New"
+        page.save()
+        assert list(RenderedMarkdown.objects.unreferenced()) == [
+            RenderedMarkdown.objects.get(digest=old)
+        ]
+        call_command("prune_rendered_markdown", stdout=StringIO())
+        assert not RenderedMarkdown.objects.filter(digest=old).exists()
+        assert RenderedMarkdown.objects.filter(
+            digest=markdown_digest(page.body)
+        ).exists()
+
+    def test_render(self):
+        html = render_markdown("```python\nprint(42)\n```\n<script>alert(1)</script>")
+        assert '<div class="codehilite">' in html
+        assert "<script>" not in html
+        assert render_markdown("<script>") == render_markdown("<script>")
+
+    def test_render_correction_message(self):
+        fenced = "```text\n" + "x\n" * 10_000 + "```\n"
+        html = render_correction_message(fenced)
+        assert html.count("<pre>") > 1  # Rendered by chunks,
+        assert html.count("x") == 10_000  # but all of it,
+        assert "```" not in html  # keeping code blocks.
+        assert render_correction_message("**Hi**") == "<p><strong>Hi</strong></p>"
@@ -0,0 +1,23 @@
+from django.test import TestCase
+
+from hkis import navigation
+from hkis.benchmark import load_budgets, measure_all, over_budget, seed
+
+
+class TestQueryBudget(TestCase):
+    """Views doing a query per row would exceed their budget, as every
+    list they display has a few rows here.
+    """
+
+    fixtures = ["initial"]
+
+    def setUp(self):
+        navigation.invalidate()
+        seed(users=100, exercises=30, answers=2000, teams=2, log=lambda _: None)
+
+    def test_budgets(self):
+        results = measure_all(self.client)
+        assert all(result.status_code == 200 for result in results.values())
+        regressions = over_budget(results, load_budgets())
+        assert not regressions, regressions
+        assert set(results) == set(load_budgets())
@@ -1,7 +1,11 @@
+from io import StringIO
+
 from django.contrib.auth.models import User
+from django.core.management import call_command
 from django.test import TestCase
 
-from hkis.models import UserInfo
+from hkis.models import Exercise, ExerciseStatus, Team, UserInfo
+from hkis.views import RankPaginator
 
 
 class TestRankUserWithInfo(TestCase):
@@ -29,3 +33,164 @@ class TestRankUserWithNoInfo(TestCase):
 
     def test_recompute_ranks(self):
         UserInfo.objects.recompute_points()
+
+
+class TestIncrementalPoints(TestCase):
+    fixtures = ["initial"]
+
+    def setUp(self):
+        self.user = User.objects.create(username="Temporary")
+        self.exercise = Exercise.objects.first()
+
+    def test_first_solve_grants_points(self):
+        solved_by = self.exercise.solved_by
+        answer = self.exercise.answers.create(user=self.user, source_code="")
+        assert answer.save_correction(True, "")
+        userinfo = UserInfo.objects.get(user=self.user)
+        assert userinfo.points == userinfo.compute_points()
+        assert userinfo.points > 0
+        self.exercise.refresh_from_db()
+        assert self.exercise.solved_by == solved_by + 1
+
+    def test_resolve_is_noop(self):
+        self.exercise.answers.create(user=self.user).save_correction(True, "")
+        points = UserInfo.objects.get(user=self.user).points
+        answer = self.exercise.answers.create(user=self.user, source_code="")
+        assert not answer.save_correction(True, "")
+        assert UserInfo.objects.get(user=self.user).points == points
+
+    def test_invalid_answer_grants_nothing(self):
+        answer = self.exercise.answers.create(user=self.user, source_code="")
+        assert not answer.save_correction(False, "Nope")
+        assert not UserInfo.objects.filter(user=self.user, points__gt=0).exists()
+
+    def status(self):
+        return ExerciseStatus.objects.get(user=self.user, exercise=self.exercise)
+
+    def test_only_corrections_solve(self):
+        answer = self.exercise.answers.create(user=self.user, source_code="")
+        answer.is_valid = True
+        answer.save()  # Like an API PATCH, or the admin.
+        assert not self.status().solved
+        assert answer.save_correction(True, "")
+        assert self.status().solved
+        assert UserInfo.objects.get(user=self.user).points > 0
+
+    def test_invalidated_solve(self):
+        solved_by = self.exercise.solved_by
+        answers = [
+            self.exercise.answers.create(user=self.user, source_code="")
+            for _ in range(2)
+        ]
+        for answer in answers:
+            answer.save_correction(True, "")
+        points = UserInfo.objects.get(user=self.user).points
+        assert not answers[0].save_correction(False, "Nope")
+        assert self.status().solved  # Another answer is valid.
+        assert UserInfo.objects.get(user=self.user).points == points
+        answers[1].save_correction(False, "Nope")
+        assert not self.status().solved
+        userinfo = UserInfo.objects.get(user=self.user)
+        assert userinfo.points == userinfo.compute_points() == 0
+        self.exercise.refresh_from_db()
+        assert self.exercise.solved_by == solved_by
+        assert answers[0].save_correction(True, "")  # Solved again.
+
+    def test_points_drift(self):
+        self.exercise.answers.create(user=self.user).save_correction(True, "")
+        UserInfo.objects.recompute_points()
+        assert not list(UserInfo.objects.points_drift())
+        UserInfo.objects.filter(user=self.user).update(points=42)
+        assert [userinfo.user for userinfo, _ in UserInfo.objects.points_drift()] == [
+            self.user
+        ]
+
+
+class TestMaterializedRank(TestCase):
+    fixtures = ["initial"]
+
+    def assert_ranks_are_consistent(self):
+        computed = dict(
+            UserInfo.with_rank.with_computed_rank().values_list("pk", "computed_rank")
+        )
+        stored = dict(UserInfo.objects.values_list("pk", "rank"))
+        assert stored == {pk: computed.get(pk) for pk in stored}
+
+    def test_incremental_ranks(self):
+        exercises = list(Exercise.objects.all())
+        users = [User.objects.create(username=f"user{i}") for i in range(4)]
+        for i, user in enumerate(users):
+            for exercise in exercises[: i % 3]:
+                exercise.answers.create(user=user).save_correction(True, "")
+            UserInfo.objects.get_or_create(user=user)
+            self.assert_ranks_are_consistent()
+        hidden = UserInfo.objects.get(user=users[-1])
+        hidden.show_in_leaderboard = False
+        hidden.save()
+        self.assert_ranks_are_consistent()
+        UserInfo.objects.get(user=users[1]).delete()
+        self.assert_ranks_are_consistent()
+
+    def test_recompute_ranks(self):
+        UserInfo.objects.update(rank=None)
+        assert UserInfo.objects.recompute_ranks()
+        self.assert_ranks_are_consistent()
+
+    def test_leaderboard(self):
+        response = self.client.get("/leaderboard/")
+        assert [player.rank for player in response.context["page_obj"]] == [
+            1,
+            2,
+            2,
+            2,
+        ]
+
+
+class TestBulkRecompute(TestCase):
+    fixtures = ["initial"]
+
+    def setUp(self):
+        self.user = User.objects.create(username="Temporary")
+        for exercise in Exercise.objects.all():
+            exercise.answers.create(user=self.user)
+            exercise.answers.create(user=self.user).save_correction(True, "")
+
+    def test_bulk_points_match_full_formula(self):
+        points = UserInfo.objects.compute_points()
+        for userinfo in UserInfo.objects.all():
+            assert (
+                abs(points.get(userinfo.user_id, 0) - userinfo.compute_points()) < 1e-6
+            )
+
+    def test_bulk_team_points_match(self):
+        points = Team.objects.compute_points()
+        for team in Team.objects.all():
+            team.recompute_rank()
+            assert abs(points[team.pk] - team.points) < 1e-6
+
+    def test_recompute_stats_dry_run(self):
+        UserInfo.objects.update(points=0)
+        call_command("recompute_stats", "--dry-run", stdout=StringIO())
+        assert not UserInfo.objects.filter(points__gt=0).exists()
+        call_command("recompute_stats", stdout=StringIO())
+        assert not list(UserInfo.objects.points_drift())
+
+
+class TestRankPaginator(TestCase):
+    fixtures = ["initial"]
+
+    def test_pages_are_rank_ranges(self):
+        for i in range(5):  # All tied at 0 points.
+            UserInfo.objects.create(user=User.objects.create(username=f"tied{i}"))
+        ranked = UserInfo.with_rank.filter(rank__isnull=False).order_by("rank", "pk")
+        paginator = RankPaginator(ranked, 2)
+        assert paginator.count == ranked.last().rank
+        seen = []
+        for number in paginator.page_range:
+            page = paginator.page(number)
+            assert "OFFSET" not in str(page.object_list.query)
+            assert all(
+                number * 2 - 2 < userinfo.rank <= number * 2 for userinfo in page
+            )
+            seen.extend(userinfo.pk for userinfo in page)
+        assert seen == [userinfo.pk for userinfo in ranked]
@@ -0,0 +1,121 @@
+from unittest import mock
+
+from django.test import SimpleTestCase
+
+from hkis.tasks import SandboxPool, cold_check
+
+
+def no_firejail(tmpdir, *command):  # pylint: disable=unused-argument
+    return list(command)
+
+
+@mock.patch("hkis.tasks.firejail_command", no_firejail)
+class TestSandboxPool(SimpleTestCase):
+    def setUp(self):
+        self.pool = SandboxPool(size=1)
+
+    def tearDown(self):
+        self.pool.close()
+
+    def check(self, check_py, source_code="", **kwargs):
+        answer = {"check": check_py, "source_code": source_code, "language": "en"}
+        answer.update(kwargs)
+        return self.pool.check(answer)
+
+    def test_valid(self):
+        assert self.check("print(open('solution').read())", "42") == (True, "42\n")
+
+    def test_congrats(self):
+        is_valid, message = self.check("")
+        assert is_valid and message
+
+    def test_invalid(self):
+        assert self.check("import sys\nsys.exit('Nope')") == (False, "Nope\n")
+
+    def test_traceback(self):
+        is_valid, message = self.check("1 / 0")
+        assert not is_valid
+        assert message.startswith("Traceback")
+        assert 'File "./check.py", line 1' in message
+        assert "exec" not in message
+
+    def test_pre_check(self):
+        assert self.check(
+            "print(open('data').read())",
+            pre_check="open('data', 'w').write('from pre-check')",
+        ) == (True, "from pre-check\n")
+
+    def test_same_result_as_cold_check(self):
+        answer = {"check": "print(__name__)\nexit(2)", "source_code": ""}
+        assert self.pool.check(answer) == cold_check(answer) == (False, "__main__\n")
+
+    def test_sandboxes_are_not_reused(self):
+        self.check("open('leftover', 'w')")
+        assert self.check("import os\nprint(os.listdir())") == (
+            True,
+            "['check.py', 'solution']\n",
+        )
+
+    def test_reuse(self):
+        self.pool.max_uses = 2
+        self.check("open('leftover', 'w')")
+        assert self.check("import os\nprint(sorted(os.listdir()))") == (
+            True,
+            "['check.py', 'solution']\n",
+        )
+
+    def test_huge_output(self):
+        is_valid, message = self.check("print('x' * 10_000_000)")
+        assert is_valid
+        assert len(message) == 65_536
+
+    def test_timeout(self):
+        self.pool.timeout = 1
+        spans = {}
+        assert self.pool.check(
+            {"check": "while True: pass", "source_code": ""}, spans=spans
+        ) == (False, "Checker timed out.")
+        assert spans["timed_out"]
+        assert self.check("print('still working')") == (True, "still working\n")
+
+    def test_exit_255_is_not_a_timeout(self):
+        answer = {"check": "print('Nope')\nexit(255)", "source_code": ""}
+        for check in self.pool.check, cold_check:
+            spans = {}
+            assert check(answer, spans=spans) == (False, "Nope\n")
+            assert not spans["timed_out"]
+
+    @mock.patch("hkis.tasks.CHECK_CPU_LIMIT", 1)
+    def test_cpu_limit(self):
+        answer = {
+            "check": "import resource\n"
+            "resource.setrlimit(resource.RLIMIT_CPU, (1, 1))\n"
+            "while True: pass",
+            "source_code": "",
+        }
+        for check in self.pool.check, cold_check:
+            spans = {}
+            is_valid, message = check(answer, spans=spans)
+            assert not is_valid
+            assert message.startswith("Checker timed out")
+            assert spans["timed_out"]
+
+    def test_usage(self):
+        answer = {"check": "x = bytearray(50_000_000)", "source_code": ""}
+        for check in self.pool.check, cold_check:
+            spans = {}
+            assert check(answer, spans=spans)[0]
+            assert spans["max_rss"] > 50_000  # KiB
+            assert spans["cpu_time"] >= 0
+            assert not spans["timed_out"]
+
+    def test_streaming(self):
+        answer = {
+            "check": "import time\nfor i in 0, 1, 2:\n    print(i)\n    time.sleep(.1)",
+            "source_code": "",
+        }
+        for check in self.pool.check, cold_check:
+            chunks = []
+            assert check(answer, chunks.append) == (True, "0\n1\n2\n")
+            assert len(chunks) > 1
+            assert b"".join(chunks) == b"0\n1\n2\n"
@@ -0,0 +1,210 @@
+import time
+from unittest import mock
+
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.test import SimpleTestCase, TestCase, override_settings
+
+from hkis.consumers import answers_group
+from hkis.models import CorrectionTiming, Exercise
+from hkis.tasks import (
+    CHECK_FAILED_MESSAGE,
+    ProgressSender,
+    cached_check_answer,
+    correct_answer_task,
+    correction_cache_stats,
+    flag_check_cost_regression,
+    send_to_correction,
+)
+
+
+def fake_check(answer, on_output=None, spans=None):
+    return True, answer["source_code"]
+
+
+@mock.patch("hkis.tasks.run_check_answer", side_effect=fake_check)
+class TestCorrectionCache(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+
+    def answer(self, **kwargs):
+        answer = {
+            "check": "pass",
+            "pre_check": None,
+            "source_code": "print(42)",
+            "language": "en",
+            "deterministic": True,
+        }
+        answer.update(kwargs)
+        return cached_check_answer(answer)
+
+    def test_hit(self, uncached):
+        assert self.answer() == self.answer() == (True, "print(42)")
+        assert uncached.call_count == 1
+        assert correction_cache_stats() == {"hits": 1, "misses": 1}
+
+    def test_non_deterministic(self, uncached):
+        self.answer(deterministic=False)
+        self.answer(deterministic=False)
+        assert uncached.call_count == 2
+        assert correction_cache_stats() == {"hits": 0, "misses": 0}
+
+    def test_key(self, uncached):
+        self.answer()
+        self.answer(check="pass  # Edited")
+        self.answer(language="fr")
+        self.answer(source_code="print(43)")
+        assert uncached.call_count == 4
+
+    def test_stand_in_not_cached(self, uncached):
+        with override_settings(HKIS_STAND_IN_CHECKER=0):
+            self.answer()
+        self.answer()
+        assert uncached.call_count == 2
+        assert correction_cache_stats() == {"hits": 0, "misses": 1}
+
+
+IN_MEMORY_CHANNEL_LAYERS = {
+    "default": {"BACKEND": "channels.layers.InMemoryChannelLayer"}
+}
+
+
+@override_settings(CHANNEL_LAYERS=IN_MEMORY_CHANNEL_LAYERS)
+@mock.patch("hkis.tasks.run_check_answer", return_value=(True, "Bravo"))
+class TestCorrectAnswer(TestCase):
+    fixtures = ["initial"]
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create(username="Temporary")
+        self.exercise = Exercise.objects.first()
+        self.answer = self.exercise.answers.create(user=self.user, source_code="")
+        self.group = answers_group(self.user.id, self.exercise.id)
+
+    def test_result_sent_to_group(self, _):
+        channel_layer = get_channel_layer()
+        tabs = [async_to_sync(channel_layer.new_channel)() for _ in range(2)]
+        for tab in tabs:
+            async_to_sync(channel_layer.group_add)(self.group, tab)
+        correct_answer_task(self.answer.id, "en", self.group)
+        for tab in tabs:
+            message = async_to_sync(channel_layer.receive)(tab)
+            assert message["type"] == "answer.update"
+            assert message["id"] == self.answer.id
+            assert message["is_valid"]
+            assert message["user_rank"]
+            assert message["correction_message_html"] == "<p>Bravo</p>"
+        self.answer.refresh_from_db()
+        assert self.answer.is_corrected and self.answer.is_valid
+
+    def test_timings_recorded(self, _):
+        correct_answer_task(
+            self.answer.id,
+            "en",
+            self.group,
+            sent_at=time.time() - 1,
+            spans={"create": 0.01},
+        )
+        timing = CorrectionTiming.objects.get(answer=self.answer)
+        assert timing.exercise == self.exercise
+        assert timing.create_time == 0.01
+        assert timing.queue_time >= 1
+        assert timing.save_time > 0
+        assert timing.check_time is None  # run_check_answer is mocked.
+
+    @override_settings(HKIS_CHECK_COST_MIN_RUNS=2)
+    def test_check_cost_regression(self, _):
+        def correct(cpu_time, answer=None):
+            if answer is None:
+                answer = self.exercise.answers.create(user=self.user, source_code="")
+            CorrectionTiming.record(answer, {"check": 1, "cpu_time": cpu_time})
+            flag_check_cost_regression(self.exercise)
+            return answer
+
+        old_answers = [correct(cpu_time=0.5) for _ in range(2)]
+        self.exercise.check_py += "\nimport time; time.sleep(1)"
+        self.exercise.save()
+        assert self.exercise.check_edited_at
+        for answer in old_answers:  # Recorrected, they still count before.
+            correct(cpu_time=2, answer=answer)
+        assert CorrectionTiming.objects.get(answer=answer).check_cpu_time == 0.5
+        for _ in range(2):
+            correct(cpu_time=2)
+        self.exercise.refresh_from_db()
+        assert self.exercise.check_cost_regression == "CPU time 0.50s → 2.00s"
+
+    def send(self):
+        return async_to_sync(send_to_correction)(
+            self.answer.id, self.exercise.id, "en", self.group, self.user.id
+        )
+
+    @mock.patch("hkis.tasks.correct_answer_task.apply_async")
+    def test_sent_only_once(self, apply_async, _):
+        assert [self.send(), self.send()] == [True, False]
+        assert apply_async.call_count == 1
+        correct_answer_task(self.answer.id, "en", self.group)
+        assert self.send()
+
+    @override_settings(HKIS_CORRECTION_TIMEOUT=0.1)
+    @mock.patch("hkis.tasks.correct_answer_task.apply_async")
+    def test_sent_only_once_however_long_queued(self, apply_async, _):
+        assert self.send()
+        time.sleep(0.2)
+        assert not self.send()
+        assert apply_async.call_count == 1
+
+    @mock.patch("hkis.tasks.correct_answer_task.apply_async")
+    def test_lanes(self, apply_async, _):
+        self.send()
+        assert apply_async.call_args.kwargs["queue"] == "default"
+        # Known to be fast:
+        correct_answer_task(self.answer.id, "en", self.group)
+        self.send()
+        assert apply_async.call_args.kwargs["queue"] == "fast"
+        # Too many answers in flight for this user:
+        for _ in range(2):
+            self.answer = self.exercise.answers.create(user=self.user)
+            self.send()
+        assert apply_async.call_args.kwargs["queue"] == "overflow"
+        counters = apply_async.call_args.args[1]["counters"]
+        in_flight = cache.get(counters[0])
+        correct_answer_task(self.answer.id, "en", self.group, counters=counters)
+        assert cache.get(counters[0]) == in_flight - 1
+
+    @mock.patch("hkis.tasks.correct_answer_task.apply_async")
+    def test_check_failure(self, apply_async, run_check_answer):
+        run_check_answer.side_effect = OSError("No sandbox")
+        tab = async_to_sync(get_channel_layer().new_channel)()
+        async_to_sync(get_channel_layer().group_add)(self.group, tab)
+        self.send()
+        counters = apply_async.call_args.args[1]["counters"]
+        with self.assertLogs("hkis.tasks", "ERROR"):
+            correct_answer_task(self.answer.id, "en", self.group, counters=counters)
+        message = async_to_sync(get_channel_layer().receive)(tab)
+        assert message["is_corrected"] and not message["is_valid"]
+        assert message["correction_message"] == CHECK_FAILED_MESSAGE
+        assert cache.get(counters[0]) == 0
+        self.answer.refresh_from_db()
+        assert not self.answer.is_corrected
+        assert self.send()  # Can be sent again.
+
+
+@override_settings(
+    CHANNEL_LAYERS=IN_MEMORY_CHANNEL_LAYERS,
+    HKIS_PROGRESS_INTERVAL=60,
+    HKIS_PROGRESS_MAX_SIZE=14,
+)
+class TestProgress(SimpleTestCase):
+    def test_progress(self):
+        channel_layer = get_channel_layer()
+        tab = async_to_sync(channel_layer.new_channel)()
+        async_to_sync(channel_layer.group_add)("answers.1.1", tab)
+        progress = ProgressSender(42, "answers.1.1")
+        for chunk in b"first", b"sec", b"ond \xc3", b"\xa9", b"too much":
+            progress(chunk)
+        progress.flush()
+        messages = [async_to_sync(channel_layer.receive)(tab) for _ in range(2)]
+        assert [message["output"] for message in messages] == ["first", "second é"]
+        assert messages[0] == {"type": "answer.progress", "id": 42, "output": "first"}
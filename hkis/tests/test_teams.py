@@ -12,3 +12,39 @@ class TestTeams(TestCase):
 
     def test_team_by_rank(self):
         assert len(list(Team.objects.first().members_by_rank()))
+
+
+class TestTeamStats(TestCase):
+    fixtures = ["initial"]
+
+    def setUp(self):
+        self.client.force_login(User.objects.get(username="a-superuser"))
+        self.team = Team.objects.get(slug="team-mdk")
+        self.team.add_member("Bart")
+
+    def test_exercise_stats(self):
+        with self.assertNumQueries(3):
+            exercises, stats = self.team.exercise_stats()
+        assert [exercise.slug for exercise in exercises] == ["hello-world", "print-42"]
+        assert [stat.is_valid for stat in stats["a-superuser"]] == [True, True]
+        assert not any(stat.is_tried for stat in stats["Bart"])
+
+    def test_html(self):
+        response = self.client.get("/teams/team-mdk/stats")
+        assert response.content.count(b"\xe2\x9c\x93") == 2  # ✓
+
+    def test_csv(self):
+        response = self.client.get("/teams/team-mdk/stats?format=csv")
+        assert response.content.decode().splitlines() == [
+            "username,hello-world,print-42",
+            "a-superuser,solved,solved",
+            "Bart,,",
+        ]
+
+    def test_json(self):
+        response = self.client.get("/teams/team-mdk/stats?format=json")
+        assert response.json()["stats"]["a-superuser"][1] == {
+            "is_tried": True,
+            "is_valid": True,
+            "last_answer": 7,
+        }
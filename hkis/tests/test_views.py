@@ -1,6 +1,9 @@
 from django.test import TestCase
 from django.contrib.auth.models import User
 
+from hkis import navigation
+from hkis.models import Exercise, ExerciseStatus
+
 
 class TestViews(TestCase):
     fixtures = ["initial"]
@@ -26,3 +29,64 @@ class TestViews(TestCase):
 
     def test_get_solution(self):
         self.client.get("/exercises/hello-world/solutions")
+
+
+class TestExerciseStatus(TestCase):
+    fixtures = ["initial"]
+
+    def setUp(self):
+        self.user = User.objects.get(username="Bart")
+        self.client.force_login(self.user)
+        self.exercise = Exercise.objects.get(slug="hello-world")
+
+    def test_page(self):
+        answer = self.exercise.answers.create(user=self.user)
+        answer.save_correction(False, "Nope")
+        response = self.client.get("/exercises/")
+        assert response.context["exercises_failed"] == {self.exercise.id}
+        assert not response.context["exercises_done"]
+        answer = self.exercise.answers.create(user=self.user)
+        answer.save_correction(True, "Bravo")
+        response = self.client.get("/exercises/")
+        assert response.context["exercises_done"] == {self.exercise.id}
+        assert not response.context["exercises_failed"]
+
+    def test_status(self):
+        for is_valid in (False, True, True):
+            self.exercise.answers.create(user=self.user).save_correction(is_valid, "")
+        status = ExerciseStatus.objects.get(user=self.user, exercise=self.exercise)
+        assert status.solved and status.first_solved_at
+        assert status.attempts == 3
+        assert status.last_answer == self.exercise.answers.latest("id")
+        response = self.client.get(f"/profile/{self.user.id}")
+        assert response.context["done_qty"] == 1
+        assert response.context["submit_qty"] == 3
+
+
+class TestNavigation(TestCase):
+    fixtures = ["initial"]
+
+    def setUp(self):
+        navigation.invalidate()
+
+    def test_neighbours(self):
+        hello, print_42 = Exercise.objects.order_by("position")
+        navigation.neighbours(hello.id)
+        with self.assertNumQueries(0):
+            previous, next_exercise = navigation.neighbours(hello.id)
+        assert previous is None
+        assert next_exercise.get_absolute_url() == print_42.get_absolute_url()
+        assert navigation.neighbours(print_42.id)[0].slug == "hello-world"
+
+    def test_invalidation(self):
+        hello, print_42 = Exercise.objects.order_by("position")
+        assert navigation.neighbours(hello.id)[1]
+        print_42.is_published = False
+        with self.captureOnCommitCallbacks(execute=True):
+            print_42.save()
+        assert navigation.neighbours(hello.id) == (None, None)
+
+    def test_exercise_view(self):
+        response = self.client.get("/exercises/print-42")
+        assert response.context["previous"].slug == "hello-world"
+        assert response.context["next"] is None
@@ -1,10 +1,14 @@
 from functools import partial, lru_cache
+import hashlib
+import json
+import threading
 from urllib.parse import urlparse
 from typing import List
 import bleach
 from django.conf import settings
 import markdown
 from markdown.extensions.codehilite import CodeHiliteExtension
+import pygments
 
 
 ALLOWED_TAGS = [
@@ -90,15 +94,13 @@ def _set_target(attrs, new=False):
     return attrs
 
 
-@lru_cache(maxsize=8192)
-def markdown_to_bootstrap(text):
-    """This convert markdown text to html, with two things:
-    - Uses bleach.clean to remove unsafe things.
-    - Use custom replacements to adapt classes to bootstrap 4
-    """
+_local = threading.local()
 
-    return (
-        bleach.sanitizer.Cleaner(
+
+def _renderers():
+    """Markdown and Cleaner instances are reusable, but not thread-safe."""
+    if not hasattr(_local, "cleaner"):
+        _local.cleaner = bleach.sanitizer.Cleaner(
             tags=getattr(settings, "ALLOWED_TAGS", ALLOWED_TAGS),
             attributes=getattr(settings, "ALLOWED_ATTRIBUTES", ALLOWED_ATTRIBUTES),
             filters=[
@@ -110,17 +112,119 @@ def markdown_to_bootstrap(text):
                 ),
             ],
         )
-        .clean(
-            markdown.markdown(
-                text,
-                extensions=[
-                    "fenced_code",
-                    CodeHiliteExtension(guess_lang=False),
-                    "admonition",
-                ],
-            ),
+        _local.markdown = markdown.Markdown(
+            extensions=[
+                "fenced_code",
+                CodeHiliteExtension(guess_lang=False),
+                "admonition",
+            ],
         )
+    return _local.markdown, _local.cleaner
+
+
+def render_markdown(text):
+    """This convert markdown text to html, with two things:
+    - Uses bleach.clean to remove unsafe things.
+    - Use custom replacements to adapt classes to bootstrap 4
+    """
+    md, cleaner = _renderers()
+    try:
+        html = md.convert(text)
+    finally:
+        md.reset()
+    return (
+        cleaner.clean(html)
         .replace('class="admonition warning"', 'class="alert alert-warning"')
         .replace('class="admonition note"', 'class="alert alert-info"')
         .replace("admonition-title", "alert-heading")
     )
+
+
+@lru_cache(maxsize=8192)
+def markdown_to_bootstrap(text):
+    return render_markdown(text)
+
+
+CORRECTION_CHUNK_SIZE = 4096
+
+
+def markdown_chunks(text, size=CORRECTION_CHUNK_SIZE):
+    """Split a markdown text in chunks of about size characters.
+
+    Chunks are cut at blank lines if possible, else at any line after
+    2 * size characters. Fenced code blocks cut in two are closed and
+    reopened.
+    """
+    chunk: List[str] = []
+    length = 0
+    fence = None  # Opening line of the fenced code block we're in.
+    for line in text.splitlines(keepends=True):
+        chunk.append(line)
+        length += len(line)
+        stripped = line.lstrip()
+        if fence is None and stripped.startswith(("```", "~~~")):
+            fence = line
+        elif fence is not None and stripped.startswith(fence.lstrip()[:3]):
+            fence = None
+        if length < size or (line.strip() and length < 2 * size):
+            continue
+        if fence is None:
+            yield "".join(chunk)
+            chunk, length = [], 0
+        else:
+            yield "".join(chunk) + fence.lstrip()[:3] + "\n"
+            chunk, length = [fence], len(fence)
+    if chunk:
+        yield "".join(chunk)
+
+
+def render_correction_message(text):
+    """Render checker outputs, up to 64KB.
+
+    Rendering is superlinear with the size of markdown blocks (a
+    64KB traceback takes seconds), so large messages are rendered by
+    chunks.
+    """
+    if len(text) <= CORRECTION_CHUNK_SIZE:
+        return render_markdown(text)
+    return "".join(render_markdown(chunk) for chunk in markdown_chunks(text))
+
+
+# To bump on changes of render_markdown changing its output.
+RENDERER_REVISION = 1
+
+
+@lru_cache(maxsize=None)
+def renderer_version() -> str:
+    """What renders depend on, besides the text."""
+    return json.dumps(
+        [
+            RENDERER_REVISION,
+            bleach.__version__,
+            markdown.__version__,
+            pygments.__version__,
+            getattr(settings, "ALLOWED_TAGS", ALLOWED_TAGS),
+            getattr(settings, "ALLOWED_ATTRIBUTES", ALLOWED_ATTRIBUTES),
+            settings.ALLOWED_HOSTS,
+        ],
+        sort_keys=True,
+    )
+
+
+def markdown_digest(text) -> str:
+    """Digest of a text and of the renderer, so a new version of it
+    (or new allowed tags) doesn't reuse stored renders.
+    """
+    return hashlib.sha256(f"{renderer_version()}\n{text}".encode()).hexdigest()
+
+
+@lru_cache(maxsize=1024)
+def stored_markdown_to_bootstrap(text):
+    """Like markdown_to_bootstrap, for large and long-lived texts like
+    exercise wordings and page bodies: renders are stored in the
+    database when the texts are saved, so they survive restarts and
+    are shared by all processes (see RenderedMarkdown).
+    """
+    from hkis.models import RenderedMarkdown  # pylint: disable=import-outside-toplevel
+
+    return RenderedMarkdown.objects.render([text])[0]
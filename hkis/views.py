@@ -1,4 +1,4 @@
-from collections import OrderedDict
+import csv
 from contextlib import suppress
 from itertools import groupby
 
@@ -6,18 +6,29 @@ from django.conf import settings
 from django.contrib import messages
 from django.contrib.auth.mixins import LoginRequiredMixin
 from django.core.exceptions import PermissionDenied
-from django.db.models import Count, Max, Q
-from django.http import Http404, HttpResponseRedirect
+from django.core.paginator import Paginator
+from django.db.models import Count, Max, Q, Sum
+from django.http import Http404, HttpResponse, HttpResponseRedirect, JsonResponse
 from django.shortcuts import redirect, render
 from django.urls import reverse
+from django.utils.functional import cached_property
 from django.utils.translation import gettext
 from django.views.decorators.http import require_http_methods
 from django.views.generic.detail import DetailView
 from django.views.generic.edit import UpdateView
 from django.views.generic.list import ListView
 
+from hkis import navigation
 from hkis.forms import AnswerForm
-from hkis.models import Exercise, Membership, Page, Team, User, UserInfo, Answer
+from hkis.models import (
+    Exercise,
+    ExerciseStatus,
+    Membership,
+    Page,
+    Team,
+    User,
+    UserInfo,
+)
 
 
 def index(request):
@@ -40,17 +51,15 @@ class ProfileView(LoginRequiredMixin, UpdateView):
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         try:
-            context["user_info"] = UserInfo.with_rank.get(user_id=self.request.user.pk)
+            context["user_info"] = UserInfo.objects.get(user_id=self.request.user.pk)
         except UserInfo.DoesNotExist:
             context["user_info"] = None
         context["memberships"] = context["object"].membership_set.all()
-        context["done_qty"] = (
-            Answer.objects.filter(user=self.request.user, is_valid=True)
-            .values_list("exercise_id")
-            .distinct()
-            .count()
+        stats = ExerciseStatus.objects.filter(user=self.request.user).aggregate(
+            done_qty=Count("pk", filter=Q(solved=True)), submit_qty=Sum("attempts")
         )
-        context["submit_qty"] = Answer.objects.filter(user=self.request.user).count()
+        context["done_qty"] = stats["done_qty"]
+        context["submit_qty"] = stats["submit_qty"] or 0
         context["participants"] = User.objects.count()
         context["languages"] = settings.LANGUAGES
 
@@ -66,11 +75,34 @@ class ProfileView(LoginRequiredMixin, UpdateView):
         return reverse("profile", kwargs={"pk": self.request.user.id})
 
 
+class RankPaginator(Paginator):
+    """Paginate a UserInfo queryset ordered by rank, per_page ranks per
+    page, tied users being on the same page.
+
+    Pages are found by their rank range, using the rank index, instead
+    of an OFFSET scanning all the previous rows.
+    """
+
+    @cached_property
+    def count(self):
+        """Number of ranks, so pages are counted in ranks."""
+        return self.object_list.aggregate(Max("rank"))["rank__max"] or 0
+
+    def page(self, number):
+        number = self.validate_number(number)
+        bottom = (number - 1) * self.per_page
+        top = bottom + self.per_page
+        return self._get_page(
+            self.object_list.filter(rank__gt=bottom, rank__lte=top), number, self
+        )
+
+
 class Leaderboard(ListView):
     queryset = UserInfo.with_rank.all().prefetch_related("user__teams")
     paginate_by = 100
+    paginator_class = RankPaginator
     template_name = "hkis/leaderboard.html"
-    ordering = ["-points"]
+    ordering = ["rank", "pk"]
 
 
 class PageView(DetailView):
@@ -80,22 +112,16 @@ class PageView(DetailView):
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
+        context["exercises_done"] = set()
+        context["exercises_failed"] = set()
         if not self.request.user.is_anonymous:
-            context["exercises_done"] = {
-                row[0]
-                for row in Answer.objects.filter(user=self.request.user, is_valid=True)
-                .distinct()
-                .values_list("exercise_id")
-            }
-            context["exercises_failed"] = {
-                row[0]
-                for row in Answer.objects.filter(user=self.request.user, is_valid=False)
-                .distinct()
-                .values_list("exercise_id")
-            }
-        else:
-            context["exercises_done"] = set()
-            context["exercises_failed"] = set()
+            for exercise_id, solved in ExerciseStatus.objects.filter(
+                user=self.request.user, exercise__page=context["object"]
+            ).values_list("exercise_id", "solved"):
+                if solved:
+                    context["exercises_done"].add(exercise_id)
+                else:
+                    context["exercises_failed"].add(exercise_id)
         exercises = (
             context["object"]
             .exercises.filter(is_published=True)
@@ -156,30 +182,18 @@ class ExerciseView(DetailView):
             }
         )
         context["object"].wording = gettext(context["object"].wording)
-        try:
-            context["current_rank"] = UserInfo.with_rank.get(user=user).rank
-        except (UserInfo.DoesNotExist, TypeError):
-            context["current_rank"] = 999_999
+        context["current_rank"] = 999_999
+        if not user.is_anonymous:
+            context["current_rank"] = (
+                UserInfo.objects.filter(user=user, rank__isnull=False)
+                .values_list("rank", flat=True)
+                .first()
+            ) or 999_999
         if user.is_anonymous:
             context["is_valid"] = False
         else:
-            context["is_valid"] = bool(
-                self.object.answers.filter(user=user, is_valid=True)
-            )
-        try:
-            context["next"] = (
-                Exercise.objects.filter(position__gt=self.object.position)
-                .filter(is_published=True)
-                .order_by("position")[0]
-            )
-        except IndexError:
-            context["next"] = None
-        try:
-            context["previous"] = Exercise.objects.filter(
-                position__lt=self.object.position
-            ).order_by("-position")[0]
-        except IndexError:
-            context["previous"] = None
+            context["is_valid"] = self.object.is_solved_by(user)
+        context["previous"], context["next"] = navigation.neighbours(self.object.id)
         return context
 
 
@@ -213,14 +227,8 @@ class SolutionView(LoginRequiredMixin, DetailView):
         else:
             context["is_solved"] = False
             context["solutions"] = []
-        try:
-            context["next"] = (
-                Exercise.objects.filter(position__gt=self.object.position)
-                .order_by("position")[0]
-                .slug
-            )
-        except IndexError:
-            context["next"] = None
+        _, next_exercise = navigation.neighbours(self.object.id)
+        context["next"] = next_exercise.slug if next_exercise else None
         return context
 
 
@@ -239,38 +247,33 @@ def team_stats(request, slug):
     if requester_membership.role != Membership.Role.STAFF:
         raise Http404("Team does not exist")
 
-    context = {
-        "stats": OrderedDict(
-            [
-                (
-                    user.username,
-                    [
-                        {
-                            "is_tried": exercice.nb_anwser > 0,
-                            "is_valid": exercice.nb_valid_anwser > 0,
-                            "last_answer": exercice.last_answer,
-                            "slug": exercice.slug,
-                        }
-                        for exercice in Exercise.objects.annotate(
-                            last_answer=Max(
-                                "answers__pk", filter=Q(answers__user_id=user.id)
-                            ),
-                            nb_anwser=Count(
-                                "answers", filter=Q(answers__user_id=user.id)
-                            ),
-                            nb_valid_anwser=Count(
-                                "answers",
-                                filter=Q(answers__is_valid=True)
-                                & Q(answers__user_id=user.id),
-                            ),
-                        ).order_by("position")
-                    ],
-                )
-                for user in User.objects.filter(teams=team).order_by("-hkis__points")
-            ]
-        ),
-        "exercises": Exercise.objects.order_by("position"),
-    }
+    exercises, stats = team.exercise_stats()
+    export = request.GET.get("format")
+    if export == "json":
+        return JsonResponse(
+            {
+                "exercises": [exercise.slug for exercise in exercises],
+                "stats": {
+                    username: [stat._asdict() for stat in row]
+                    for username, row in stats.items()
+                },
+            }
+        )
+    if export == "csv":
+        response = HttpResponse(content_type="text/csv")
+        response["Content-Disposition"] = f'attachment; filename="{team.slug}.csv"'
+        writer = csv.writer(response)
+        writer.writerow(["username"] + [exercise.slug for exercise in exercises])
+        for username, row in stats.items():
+            writer.writerow(
+                [username]
+                + [
+                    ("solved" if stat.is_valid else "tried") if stat.is_tried else ""
+                    for stat in row
+                ]
+            )
+        return response
+    context = {"object": team, "stats": stats, "exercises": exercises}
     return render(request, "hkis/stats_detail.html", context)
 
 
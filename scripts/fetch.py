@@ -2,14 +2,22 @@
 """
 
 import argparse
+from concurrent.futures import ThreadPoolExecutor
 from contextlib import suppress
+import hashlib
 import json
-from functools import lru_cache
 from pathlib import Path
+from urllib.parse import urljoin
 
 import requests
 
-from utils import common_parse_args
+from utils import (
+    EXERCISE_FILES,
+    common_parse_args,
+    exercise_digest,
+    load_state,
+    save_state,
+)
 
 
 def parse_args():
@@ -19,6 +27,16 @@ def parse_args():
     parser.add_argument(
         "--page", help="Only download exercises for the given page slug."
     )
+    parser.add_argument(
+        "--since",
+        help="Only download exercises modified after this ISO 8601 datetime.",
+    )
+    parser.add_argument(
+        "--batch-size", type=int, default=100, help="Exercises per request."
+    )
+    parser.add_argument(
+        "--jobs", type=int, default=8, help="Number of concurrent downloads."
+    )
     return parser.parse_args(remaining, args)
 
 
@@ -30,11 +48,60 @@ def fix_newline_at_end_of_file(text):
     return text
 
 
-def get_exercises(endpoint, session):
+def paginate(endpoint, session, **params):
     while endpoint:
-        response = session.get(endpoint).json()
+        response = session.get(endpoint, params=params)
+        response.raise_for_status()
+        response = response.json()
         yield from response["results"]
         endpoint = response.get("next")
+        params = {}  # Already in the next link.
+
+
+def get_exercises(session, endpoint, ids, etag=None):
+    """Get exercises by ids, or None if none changed since etag."""
+    headers = {"If-None-Match": etag} if etag else {}
+    params = {"ids": ",".join(str(exercise_id) for exercise_id in ids)}
+    params["limit"] = len(ids)
+    response = session.get(endpoint, params=params, headers=headers)
+    if response.status_code == 304:
+        return None, etag
+    response.raise_for_status()
+    return response.json()["results"], response.headers.get("ETag")
+
+
+def write_if_changed(path, text):
+    """Don't touch unchanged files, so their mtime stays meaningful."""
+    with suppress(FileNotFoundError):
+        old_digest = hashlib.sha256(path.read_bytes()).digest()
+        if old_digest == hashlib.sha256(text.encode("UTF-8")).digest():
+            return False
+    path.write_text(text, encoding="UTF-8")
+    return True
+
+
+def save_exercise(exercise, page):
+    path = Path(page) / exercise["slug"]
+    path.mkdir(exist_ok=True, parents=True)
+    del exercise["wording"]  # Only use _en and _fr.
+    del exercise["solved_by"]  # Change everytime :D
+    with suppress(FileNotFoundError):
+        old_meta = json.loads((path / "meta").read_text(encoding="UTF-8"))
+        if old_meta["url"] != exercise["url"]:
+            raise RuntimeError(
+                f"Exercise {old_meta['url']} and exercise {exercise['url']} "
+                "have the same slug and are the same page.",
+            )
+    changed = False
+    for file, field in EXERCISE_FILES.items():
+        changed |= write_if_changed(
+            path / file,
+            fix_newline_at_end_of_file(exercise.pop(field)).replace("\r\n", "\n"),
+        )
+    changed |= write_if_changed(path / "meta", json.dumps(exercise, indent=4))
+    if changed:
+        print("Downloaded", exercise["title"], "in", page)
+    return path
 
 
 def main():
@@ -42,45 +109,52 @@ def main():
 
     session = requests.session()
     session.auth = (args.username, args.password)
-
-    @lru_cache()
-    def get(url):
-        return session.get(url).json()
-
-    for exercise in get_exercises(args.endpoint, session):
-        exercise = get(exercise["url"])
-        if exercise.get("page"):
-            page = get(exercise["page"])["slug"]
-        else:
-            page = "exercises"
-        if args.page and page != args.page:
-            continue
-        path = Path(page) / exercise["slug"]
-        path.mkdir(exist_ok=True, parents=True)
-        del exercise["wording"]  # Only use _en and _fr.
-        del exercise["solved_by"]  # Change everytime :D
-        print("Downloading", exercise["title"], "in", page)
-        with suppress(FileNotFoundError):
-            old_meta = json.loads((path / "meta").read_text(encoding="UTF-8"))
-            if old_meta["url"] != exercise["url"]:
-                raise RuntimeError(
-                    f"Exercise {old_meta['url']} and exercise {exercise['url']} "
-                    "have the same slug and are the same page.",
-                )
-        for file in (
-            "check.py",
-            "pre_check.py",
-            "wording_en.md",
-            "wording_fr.md",
-            "initial_solution.py",
-        ):
-            (path / file).write_text(
-                fix_newline_at_end_of_file(
-                    exercise[file.split(".", maxsplit=1)[0]]
-                ).replace("\r\n", "\n")
-            )
-            del exercise[file.split(".", maxsplit=1)[0]]
-        (path / "meta").write_text(json.dumps(exercise, indent=4))
+    adapter = requests.adapters.HTTPAdapter(pool_maxsize=args.jobs)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+
+    state = load_state()
+
+    def etag_for(url):
+        """Only trust the ETag if we still have the exercise on disk."""
+        if url in state and (Path(state[url]["path"]) / "meta").exists():
+            return state[url].get("etag")
+        return None
+
+    def batch_etag(batch):
+        """The ETag of the batch, if all its exercises were fetched together."""
+        etags = {etag_for(exercise["url"]) for exercise in batch}
+        return etags.pop() if len(etags) == 1 else None
+
+    def fetch(batch):
+        ids = [exercise["id"] for exercise in batch]
+        return get_exercises(session, args.endpoint, ids, batch_etag(batch))
+
+    pages = {
+        page["url"]: page["slug"]
+        for page in paginate(urljoin(args.endpoint, "../pages/"), session)
+    }
+    params = {"fields": "id,url", "limit": 1000}
+    if args.since:
+        params["modified_since"] = args.since
+    index = list(paginate(args.endpoint, session, **params))
+    batches = []
+    for start in range(0, len(index), args.batch_size):
+        end = start + args.batch_size
+        batches.append(index[start:end])
+    with ThreadPoolExecutor(max_workers=args.jobs) as executor:
+        for exercises, etag in executor.map(fetch, batches):
+            for exercise in exercises or ():  # None if not modified.
+                page = pages.get(exercise["page"], "exercises")
+                if args.page and page != args.page:
+                    continue
+                path = save_exercise(exercise, page)
+                state[exercise["url"]] = {
+                    "etag": etag,
+                    "path": str(path),
+                    "digest": exercise_digest(path),
+                }
+    save_state(state)
 
 
 if __name__ == "__main__":
@@ -1,41 +1,106 @@
 """Push back exercises via hackinscience API.
+
+Only exercises modified since the last fetch or push are sent, in
+batches, each batch being saved in a single transaction.
 """
 import argparse
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 import json
+from urllib.parse import urljoin
 
 import requests
 
-from utils import common_parse_args
+from utils import (
+    EXERCISE_FILES,
+    common_parse_args,
+    exercise_digest,
+    load_state,
+    save_state,
+)
 
 
 def parse_args():
     args, remaining = common_parse_args(__doc__)
     parser = argparse.ArgumentParser()
     parser.add_argument("--only")
+    parser.add_argument(
+        "--force", action="store_true", help="Push even unmodified exercises."
+    )
+    parser.add_argument(
+        "--batch-size", type=int, default=50, help="Exercises per request."
+    )
+    parser.add_argument(
+        "--jobs", type=int, default=4, help="Number of concurrent uploads."
+    )
     return parser.parse_args(remaining, args)
 
 
+def read_exercise(path):
+    meta = json.loads((path / "meta").read_text(encoding="UTF-8"))
+    if "url" in meta and "id" not in meta:  # Fetched by an older fetch.py
+        meta["id"] = int(meta["url"].rstrip("/").rsplit("/", maxsplit=1)[-1])
+    for file, field in EXERCISE_FILES.items():
+        meta[field] = (path / file).read_text(encoding="UTF-8")
+    return meta
+
+
+def find_modified(only, force, state):
+    """Exercises (path, data) modified since the last fetch or push."""
+    known_digests = {item["path"]: item.get("digest") for item in state.values()}
+    for meta in Path(".").glob("*/*/meta"):
+        path = meta.parent
+        if only and only not in path.name:
+            continue
+        if not force and known_digests.get(str(path)) == exercise_digest(path):
+            continue
+        yield path, read_exercise(path)
+
+
+def remember_pushed(state, path, exercise, server_side):
+    if "id" not in exercise:  # Just created, remember where it is.
+        meta = json.loads((path / "meta").read_text(encoding="UTF-8"))
+        meta.update(server_side)
+        (path / "meta").write_text(json.dumps(meta, indent=4), encoding="UTF-8")
+    state.setdefault(server_side["url"], {}).update(
+        path=str(path), digest=exercise_digest(path)
+    )
+
+
 def main():
     args = parse_args()
-    for exercise in Path(".").glob("*/*/meta"):
-        meta = json.loads(exercise.read_text())
-        if args.only:
-            if args.only not in meta["slug"]:
-                continue
-        for file in (
-            "pre_check.py",
-            "check.py",
-            "wording_fr.md",
-            "wording_en.md",
-            "initial_solution.py",
-        ):
-            meta[file.split(".", maxsplit=1)[0]] = (exercise.parent / file).read_text()
-        print("Uploading ", meta["title"])
-        response = requests.put(
-            meta["url"], json=meta, auth=(args.username, args.password)
-        )
+    state = load_state()
+    to_push = list(find_modified(args.only, args.force, state))
+    for _, exercise in to_push:
+        print("Uploading", exercise["title"])
+
+    session = requests.session()
+    session.auth = (args.username, args.password)
+    adapter = requests.adapters.HTTPAdapter(pool_maxsize=args.jobs)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    endpoint = urljoin(args.endpoint, "bulk/")
+
+    def push(batch):
+        response = session.post(endpoint, json=[exercise for _, exercise in batch])
+        if response.status_code == 400:
+            for (path, _), errors in zip(batch, response.json()):
+                if errors:
+                    print(f"Can't push {path}: {errors}")
         response.raise_for_status()
+        return response.json()
+
+    batches = []
+    for start in range(0, len(to_push), args.batch_size):
+        end = start + args.batch_size
+        batches.append(to_push[start:end])
+    try:
+        with ThreadPoolExecutor(max_workers=args.jobs) as executor:
+            for batch, saved in zip(batches, executor.map(push, batches)):
+                for (path, exercise), server_side in zip(batch, saved):
+                    remember_pushed(state, path, exercise, server_side)
+    finally:
+        save_state(state)
 
 
 if __name__ == "__main__":
@@ -2,8 +2,43 @@
 """
 
 import argparse
+from contextlib import suppress
+import hashlib
+import json
 from pathlib import Path
 
+# Files of an exercise directory, and the API field they hold.
+EXERCISE_FILES = {
+    "check.py": "check_py",
+    "pre_check.py": "pre_check_py",
+    "wording_en.md": "wording_en",
+    "wording_fr.md": "wording_fr",
+    "initial_solution.py": "initial_solution",
+}
+
+# {exercise url: {"etag": ..., "path": ..., "digest": ...}}, as seen
+# on the server on the last fetch or push.
+STATE_FILE = Path(".hkis-state.json")
+
+
+def load_state():
+    with suppress(FileNotFoundError):
+        return json.loads(STATE_FILE.read_text(encoding="UTF-8"))
+    return {}
+
+
+def save_state(state):
+    STATE_FILE.write_text(json.dumps(state, indent=4), encoding="UTF-8")
+
+
+def exercise_digest(path):
+    """Hash of the files of an exercise directory."""
+    digest = hashlib.sha256()
+    for file in (*EXERCISE_FILES, "meta"):
+        with suppress(FileNotFoundError):
+            digest.update(file.encode() + b"\0" + (path / file).read_bytes() + b"\0")
+    return digest.hexdigest()
+
 
 def common_parse_args(doc=__doc__):
     parser = argparse.ArgumentParser(description=doc)